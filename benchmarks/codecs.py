@@ -0,0 +1,98 @@
+"""Codec benchmark: serialize + deserialize time of one message with every available codec.
+
+        $ python benchmarks/codecs.py --module proto_py.greeter_pb2 --message HelloReply \\
+              --json '{"message": "hello"}' --number 100000
+
+    Raw codec only copies bytes, json codec uses google.protobuf.json_format, msgpack codec is measured
+    when msgpack is installed (it packs the message as python dict).
+
+"""
+import os
+import sys
+import json
+import timeit
+import argparse
+from importlib import import_module
+
+from google.protobuf import json_format
+from google.protobuf.internal import api_implementation
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.getcwd())
+
+from easygrpc.codec import PROTOBUF, RAW, Codec, FunctionCodec  # noqa: E402
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class JsonCodec(Codec):
+    """Proto json codec."""
+
+    name = "json"
+
+    def serializer(self, message_class):
+        return lambda message: json_format.MessageToJson(message).encode("utf-8")
+
+    def deserializer(self, message_class):
+        return lambda data: json_format.Parse(data, message_class())
+
+
+def measure(codec, message_class, message, number):
+    """Measure codec round trip.
+
+        :param codec: message codec;
+        :type codec: easygrpc.codec.Codec;
+        :param message_class: proto message class;
+        :type message_class: class;
+        :param message: message to serialize (codec format);
+        :type message: any python object;
+        :param number: number of round trips;
+        :type number: int;
+
+        :return: tuple (microseconds per round trip, serialized size).
+
+    """
+
+    serialize = codec.serializer(message_class)
+    deserialize = codec.deserializer(message_class) or (lambda data: data)
+    data = serialize(message)
+    seconds = min(timeit.repeat(lambda: deserialize(serialize(message)), number=number, repeat=3))
+
+    return seconds / number * 1e6, len(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", "-m", required=True, help="pb2 module name")
+    parser.add_argument("--message", "-c", required=True, help="message class name")
+    parser.add_argument("--json", "-j", default="{}", help="message fields in json format")
+    parser.add_argument("--number", "-n", type=int, default=10000)
+    args = parser.parse_args()
+
+    message_class = getattr(import_module(args.module), args.message)
+    message = json_format.Parse(args.json, message_class())
+
+    cases = [
+        (PROTOBUF, message),
+        (RAW, message.SerializeToString()),
+        (JsonCodec(), message),
+    ]
+    if msgpack is not None:
+        packed = json_format.MessageToDict(message, preserving_proto_field_name=True)
+        cases.append((FunctionCodec(msgpack.packb, msgpack.unpackb, name="msgpack"), packed))
+
+    print("protobuf implementation: {}".format(api_implementation.Type()))
+    for codec, value in cases:
+        per_call, size = measure(codec, message_class, value, args.number)
+        print("{:<10} {:8.2f} us/round trip  {:6d} bytes".format(codec.name, per_call, size))
+
+    if msgpack is None:
+        print("msgpack    not installed")
+    print("message: {}".format(json.dumps(json_format.MessageToDict(message))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""Cold start benchmark: load services/stubs with from_self vs from_manifest.
+
+    Run from the service directory (where proto_py and routes directories are located):
+
+        $ python benchmarks/cold_start.py --repeat 10
+
+    Every measurement runs in a fresh python process, so module import time is included.
+
+"""
+import os
+import sys
+import argparse
+import subprocess
+
+SNIPPETS = {
+    "server.from_self": "GRPCServer().from_self().route",
+    "server.from_manifest": "GRPCServer().from_manifest().route",
+    "client.from_self": "GRPCClient().from_self()",
+    "client.from_manifest": "GRPCClient().from_manifest()",
+}
+
+TEMPLATE = """
+import sys, time
+sys.path.insert(0, {path!r})
+start = time.perf_counter()
+from easygrpc.server import GRPCServer
+from easygrpc.client import GRPCClient
+{snippet}
+print(time.perf_counter() - start)
+"""
+
+
+def measure(snippet, repeat):
+    """Measure snippet time in fresh python processes.
+
+        :param snippet: python code to measure;
+        :type snippet: str;
+        :param repeat: number of processes;
+        :type repeat: int;
+
+        :return: list of float, seconds.
+
+    """
+
+    package_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    code = TEMPLATE.format(path=package_path, snippet=snippet)
+    return [float(subprocess.check_output([sys.executable, "-c", code], stderr=subprocess.DEVNULL).split()[-1])
+            for _ in range(repeat)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", "-r", type=int, default=5)
+    args = parser.parse_args()
+
+    for name, snippet in sorted(SNIPPETS.items()):
+        try:
+            times = sorted(measure(snippet, args.repeat))
+        except subprocess.CalledProcessError:
+            print("{:<24} failed".format(name))
+            continue
+        print("{:<24} min {:8.2f} ms  median {:8.2f} ms".format(name, times[0] * 1000, times[len(times) // 2] * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Proxy overhead benchmark: unary call directly to the backend vs through GRPCProxy.
+
+        $ python benchmarks/proxy_overhead.py --calls 5000 --size 512
+
+    Backend is a raw echo handler, so only transport and proxy costs are measured.
+
+"""
+import os
+import sys
+import time
+import argparse
+from concurrent import futures
+
+import grpc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from easygrpc.proxy import GRPCProxy  # noqa: E402
+from easygrpc.server import GRPCServer  # noqa: E402
+
+METHOD = "/bench.Echo/Call"
+
+
+class EchoHandler(grpc.GenericRpcHandler):
+    """Raw echo backend."""
+
+    def service(self, handler_call_details):
+        return grpc.unary_unary_rpc_method_handler(lambda request, context: request)
+
+
+def measure(address, calls, payload):
+    """Measure sequential unary calls.
+
+        :param address: server address;
+        :type address: str;
+        :param calls: number of calls;
+        :type calls: int;
+        :param payload: request payload;
+        :type payload: bytes;
+
+        :return: float, microseconds per call.
+
+    """
+
+    channel = grpc.insecure_channel(address)
+    call = channel.unary_unary(METHOD)
+    for _ in range(min(calls, 100)):
+        call(payload)
+
+    start = time.perf_counter()
+    for _ in range(calls):
+        call(payload)
+
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", "-n", type=int, default=5000)
+    parser.add_argument("--size", "-s", type=int, default=512)
+    args = parser.parse_args()
+
+    backend = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+    backend.add_generic_rpc_handlers((EchoHandler(),))
+    backend_port = backend.add_insecure_port("127.0.0.1:0")
+    backend.start()
+
+    proxy = GRPCServer(address="127.0.0.1:0", max_workers=4)
+    proxy.add_generic_handler(GRPCProxy("127.0.0.1:{}".format(backend_port)).set_streaming(METHOD, False, False))
+    proxy.config_server()
+    proxy_port = proxy.port
+    proxy.server.start()
+
+    payload = os.urandom(args.size)
+    direct = measure("127.0.0.1:{}".format(backend_port), args.calls, payload)
+    proxied = measure("127.0.0.1:{}".format(proxy_port), args.calls, payload)
+    print("direct   {:8.1f} us/call".format(direct))
+    print("proxied  {:8.1f} us/call".format(proxied))
+    print("overhead {:8.1f} us/hop".format(proxied - direct))
+
+    proxy.server.stop(0)
+    backend.stop(0)
+
+
+if __name__ == "__main__":
+    main()
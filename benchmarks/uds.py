@@ -0,0 +1,88 @@
+"""Local transport benchmark: unary calls to the same server over loopback TCP and unix domain socket.
+
+        $ python benchmarks/uds.py --calls 5000 --size 512
+
+    Server is a raw echo handler listening on both addresses (GRPCServer uds_path), client process CPU time
+    per call is reported next to the latency.
+
+"""
+import os
+import sys
+import time
+import tempfile
+import argparse
+
+import grpc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from easygrpc.server import GRPCServer  # noqa: E402
+from easygrpc.uds import UDS_PREFIX  # noqa: E402
+
+METHOD = "/bench.Echo/Call"
+
+
+class EchoHandler(grpc.GenericRpcHandler):
+    """Raw echo backend."""
+
+    def service(self, handler_call_details):
+        return grpc.unary_unary_rpc_method_handler(lambda request, context: request)
+
+
+def measure(address, calls, payload):
+    """Measure sequential unary calls.
+
+        :param address: server address;
+        :type address: str;
+        :param calls: number of calls;
+        :type calls: int;
+        :param payload: request payload;
+        :type payload: bytes;
+
+        :return: tuple (microseconds per call, process CPU microseconds per call).
+
+    """
+
+    channel = grpc.insecure_channel(address)
+    call = channel.unary_unary(METHOD)
+    for _ in range(min(calls, 100)):
+        call(payload)
+
+    start, cpu_start = time.perf_counter(), time.process_time()
+    for _ in range(calls):
+        call(payload)
+    elapsed, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+    channel.close()
+
+    return elapsed / calls * 1e6, cpu / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", "-n", type=int, default=5000)
+    parser.add_argument("--size", "-s", type=int, default=512)
+    parser.add_argument("--repeat", "-r", type=int, default=3)
+    args = parser.parse_args()
+
+    uds_path = os.path.join(tempfile.mkdtemp(), "bench.sock")
+    server = GRPCServer(address="127.0.0.1:0", max_workers=4, uds_path=uds_path)
+    server.add_generic_handler(EchoHandler())
+    server.config_server()
+    server.server.start()
+
+    payload = os.urandom(args.size)
+    results = {"tcp": [], "uds": []}
+    for _ in range(args.repeat):
+        results["tcp"].append(measure("127.0.0.1:{}".format(server.port), args.calls, payload))
+        results["uds"].append(measure(UDS_PREFIX + uds_path, args.calls, payload))
+    server.server.stop(0)
+
+    for name, values in sorted(results.items(), reverse=True):
+        latency, cpu = min(values)
+        print("{:<4} {:8.1f} us/call  {:8.1f} us cpu/call".format(name, latency, cpu))
+    tcp, uds = min(results["tcp"])[0], min(results["uds"])[0]
+    print("uds latency reduction {:5.1f}%".format((tcp - uds) / tcp * 100))
+
+
+if __name__ == "__main__":
+    main()
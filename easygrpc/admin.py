@@ -0,0 +1,301 @@
+import hmac
+import json
+import time
+import logging
+import itertools
+
+import six
+import grpc
+
+from .executors import BoundedExecutor, ElasticExecutor, PriorityExecutor, pooled
+
+ADMIN_SERVICE = "easygrpc.Admin"
+ADMIN_METHODS = ("Routes", "Calls", "Stats", "Tune")
+TOKEN_METADATA = "x-easygrpc-admin-token"
+
+
+def to_json(data):
+    """Serialize admin message: objects without JSON type are sent as their repr.
+
+        :param data: message;
+        :type data: dict;
+
+        :return: bytes.
+
+    """
+
+    return json.dumps(data, default=repr, sort_keys=True).encode("utf-8")
+
+
+def from_json(data):
+    """Deserialize admin message (empty message is an empty dict).
+
+        :param data: serialized message;
+        :type data: bytes;
+
+        :return: dict.
+
+    """
+
+    return json.loads(data.decode("utf-8")) if data else {}
+
+
+def resize_pool(pool, size):
+    """Change workers count of the thread pool at runtime.
+
+        - ElasticExecutor: pool is pinned to the size (None: sizing returns to the controller);
+        - BoundedExecutor (default server pool, route pools) and PriorityExecutor: workers are started
+          up to the new limit on demand, started workers are kept when the limit is decreased;
+        - Other executors can't be resized.
+
+        :param pool: thread pool;
+        :type pool: concurrent.futures.Executor;
+        :param size: workers count;
+        :type size: int;
+
+        :return: int, workers limit of the pool.
+
+    """
+
+    if isinstance(pool, ElasticExecutor):
+        if size is None:
+            pool.unpin()
+        else:
+            pool.pin(size)
+        return pool.size
+
+    if size is None or size < 1:
+        raise ValueError("Workers count must be positive, got: {}.".format(size))
+    if isinstance(pool, BoundedExecutor):
+        return pool.resize(size)
+    if isinstance(pool, PriorityExecutor):
+        pool.max_workers = size
+        return size
+
+    raise ValueError("Thread pool {!r} can't be resized.".format(pool))
+
+
+class CallRegistry(object):
+    """In-flight calls of the route table: method, peer and start time of every call until it's terminated."""
+
+    def __init__(self):
+        self._calls = {}
+        self._ids = itertools.count()
+
+    def track_handler(self, handler, handler_call_details):
+        """Track server call: method handler behavior registers the call until the call is terminated.
+
+            :param handler: method handler;
+            :type handler: grpc.RpcMethodHandler;
+            :param handler_call_details: grpc call details;
+            :type handler_call_details: grpc.HandlerCallDetails;
+
+            :return: grpc.RpcMethodHandler.
+
+        """
+
+        name = ("stream_" if handler.request_streaming else "unary_") + (
+            "stream" if handler.response_streaming else "unary")
+        behavior = getattr(handler, name)
+        method, calls, ids = handler_call_details.method, self._calls, self._ids
+
+        def tracked_behavior(request, context):
+            call_id = next(ids)
+            calls[call_id] = (method, time.monotonic(), context.peer())
+            if not context.add_callback(lambda: calls.pop(call_id, None)):
+                calls.pop(call_id, None)
+
+            return behavior(request, context)
+
+        # method thread pool (bulkhead or priority executor)
+        if hasattr(behavior, "experimental_thread_pool"):
+            tracked_behavior.experimental_thread_pool = behavior.experimental_thread_pool
+
+        return handler._replace(**{name: tracked_behavior})
+
+    def calls(self, min_age=0.0):
+        """In-flight calls, the oldest first.
+
+            :param min_age: skip calls younger than min_age seconds;
+            :type min_age: float;
+
+            :return: list of dict with method, peer and age (seconds).
+
+        """
+
+        now = time.monotonic()
+        calls = [dict(method=method, peer=peer, age=now - started)
+                 for method, started, peer in list(self._calls.values()) if now - started >= min_age]
+
+        return sorted(calls, key=lambda call: call["age"], reverse=True)
+
+    def __len__(self):
+        return len(self._calls)
+
+    def __repr__(self):
+        return "call registry: {} calls".format(len(self._calls))
+
+
+class AdminService(grpc.GenericRpcHandler):
+    """Admin service of the server: introspection and live tuning without restart.
+
+        Methods of "easygrpc.Admin" service receive and return JSON objects (raw bytes, no proto module):
+            - Routes: services and method routes of the route table;
+            - Calls: running calls with method, peer and age ({"min_age": seconds, "limit": int});
+            - Stats: thread pools, deadline guards, tenant quota, tracer, broadcast hub and multiplexer statistics;
+            - Tune: change tunables in place, response has their new values:
+                - workers: {"server": int, pool_name: int} (server pool or route pools, null unpins elastic pool);
+                - max_queue: {pool_name: int or null} (queue limit of route pools);
+                - tenant_quota: {"rate": float, "burst": float, "max_concurrency": int};
+                - sample_rate: float (server tracer);
+                - log_level: level name of the root logger or {logger_name: level_name}.
+
+        Admin calls run in the own thread pool, so they are served when the server pool is busy.
+        With token every call must send it in "x-easygrpc-admin-token" metadata.
+
+    """
+
+    def __init__(self, server, token=None, max_workers=1):
+        self.server = server
+        self.token = token
+        self.executor = BoundedExecutor(max_workers, name="easygrpc-admin")
+        self._handlers = {
+            "/{}/{}".format(ADMIN_SERVICE, name): grpc.unary_unary_rpc_method_handler(
+                pooled(self._behavior(getattr(self, name.lower())), self.executor))
+            for name in ADMIN_METHODS
+        }
+
+    def service(self, handler_call_details):
+        return self._handlers.get(handler_call_details.method)
+
+    def _behavior(self, method):
+
+        def admin_behavior(request, context):
+            if self.token is not None:
+                token = dict(context.invocation_metadata() or ()).get(TOKEN_METADATA) or ""
+                if not hmac.compare_digest(str(token), str(self.token)):
+                    context.abort(grpc.StatusCode.UNAUTHENTICATED, "Admin token is invalid.")
+            try:
+                params = from_json(request)
+            except ValueError as e:
+                context.abort(grpc.StatusCode.INVALID_ARGUMENT, "Request isn't a JSON object: {}".format(e))
+            try:
+                return to_json(method(**params))
+            except (TypeError, ValueError) as e:
+                context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
+
+        return admin_behavior
+
+    def routes(self):
+        route_table = self.server.route_table
+        methods = [dict(path=path, service=route.service_name, method=route.name,
+                        request_streaming=route.request_streaming, response_streaming=route.response_streaming,
+                        codec=repr(route.codec), executor=route.executor and route.executor.name,
+                        priority=route.priority, offloaded=route.offloaded)
+                   for path, route in sorted(six.iteritems(route_table.routes))]
+
+        return dict(services=list(route_table.services), methods=methods,
+                    generic_handlers=[repr(handler) for handler in self.server._generic_handlers])
+
+    def calls(self, min_age=0.0, limit=None):
+        registry = self.server.route_table.calls
+        calls = registry.calls(min_age) if registry is not None else []
+
+        return dict(count=len(calls), calls=calls[:limit])
+
+    def stats(self):
+        server = self.server
+        tracer = server.route_table.tracer
+        thread_pool = server.thread_pool
+        workers = thread_pool.stats() if isinstance(thread_pool, (BoundedExecutor, ElasticExecutor)) else dict(
+            max_workers=getattr(thread_pool, "max_workers", None))
+
+        return dict(server=workers, executors=server.executor_stats(), deadlines=server.deadline_stats(),
+                    tenants=server.tenant_stats(), tracer=tracer and tracer.stats(), broadcast=server.hub.stats(),
+                    multiplex=server.multiplexer and server.multiplexer.stats(),
+                    calls=len(server.route_table.calls or ()))
+
+    def tune(self, workers=None, max_queue=None, tenant_quota=None, sample_rate=None, log_level=None):
+        server, changed = self.server, {}
+
+        executors = server.route_table.executors
+        for name, size in six.iteritems(workers or {}):
+            pool = server.thread_pool if name == "server" else executors.get(name)
+            if pool is None:
+                raise ValueError("Unknown thread pool '{}'.".format(name))
+            changed.setdefault("workers", {})[name] = resize_pool(pool, size)
+
+        for name, limit in six.iteritems(max_queue or {}):
+            if name not in executors:
+                raise ValueError("Unknown thread pool '{}'.".format(name))
+            executors[name].max_queue = limit
+            changed.setdefault("max_queue", {})[name] = limit
+
+        if tenant_quota:
+            quota = server.route_table.tenant_quota
+            if quota is None:
+                raise ValueError("Tenant quota isn't set.")
+            quota.update(**tenant_quota)
+            changed["tenant_quota"] = dict(rate=quota.rate, burst=quota.burst, max_concurrency=quota.max_concurrency)
+
+        if sample_rate is not None:
+            if server.route_table.tracer is None:
+                raise ValueError("Tracer isn't set.")
+            server.route_table.tracer.sample_rate = float(sample_rate)
+            changed["sample_rate"] = server.route_table.tracer.sample_rate
+
+        if log_level is not None:
+            levels = log_level if isinstance(log_level, dict) else {"": log_level}
+            for name, level in six.iteritems(levels):
+                logger = logging.getLogger(name or None)
+                logger.setLevel(level.upper() if isinstance(level, str) else level)
+                changed.setdefault("log_level", {})[name] = logging.getLevelName(logger.level)
+
+        return changed
+
+    def __repr__(self):
+        return "admin service: {}".format(ADMIN_SERVICE)
+
+
+class AdminClient(object):
+    """Client of the admin service: methods return JSON responses as dicts.
+
+        client = AdminClient(grpc.insecure_channel("localhost:50051"))
+        client.calls(min_age=1.0)
+        client.tune(workers={"server": 32}, sample_rate=0.1)
+
+    """
+
+    def __init__(self, channel, token=None, timeout=5.0):
+        self.channel = channel
+        self.metadata = ((TOKEN_METADATA, token),) if token is not None else None
+        self.timeout = timeout
+
+    def call(self, method, **params):
+        """Call admin method.
+
+            :param method: method name (Routes, Calls, Stats or Tune);
+            :type method: str;
+
+            :return: dict.
+
+        """
+
+        multi_callable = self.channel.unary_unary("/{}/{}".format(ADMIN_SERVICE, method))
+
+        return from_json(multi_callable(to_json(params), timeout=self.timeout, metadata=self.metadata))
+
+    def routes(self):
+        return self.call("Routes")
+
+    def calls(self, min_age=0.0, limit=None):
+        return self.call("Calls", min_age=min_age, limit=limit)
+
+    def stats(self):
+        return self.call("Stats")
+
+    def tune(self, **tunables):
+        return self.call("Tune", **tunables)
+
+    def __repr__(self):
+        return "admin client: {}".format(self.channel)
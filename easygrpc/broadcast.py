@@ -0,0 +1,196 @@
+import threading
+import collections
+
+import grpc
+
+from .codec import to_bytes
+
+DROP, COALESCE, DISCONNECT = "drop", "coalesce", "disconnect"
+POLICIES = (DROP, COALESCE, DISCONNECT)
+
+
+class _Topic(object):
+    """Topic state: the last published messages (serialized) shared by all subscribers."""
+
+    __slots__ = ("condition", "log", "seq", "closed", "subscribers", "published", "dropped", "disconnected")
+
+    def __init__(self, max_queue):
+        self.condition = threading.Condition()
+        self.log = collections.deque(maxlen=max_queue)
+        self.seq = 0
+        self.closed = False
+        self.subscribers = 0
+        self.published = 0
+        self.dropped = 0
+        self.disconnected = 0
+
+    def wake(self):
+        with self.condition:
+            self.condition.notify_all()
+
+
+class BroadcastHub(object):
+    """Publish-subscribe hub of server streaming routes: published message is serialized once and the same
+        bytes are sent to every subscriber stream.
+
+        - Topic keeps the last max_queue serialized messages, every subscriber reads them from its own position
+          (subscriber queue is bounded by max_queue, publishing doesn't depend on subscribers count);
+        - Slow consumer policy when subscriber is more than max_queue messages behind:
+          "drop" (skip the oldest messages), "coalesce" (skip to the latest message) or
+          "disconnect" (abort the stream with RESOURCE_EXHAUSTED status);
+        - Subscribed method must send bytes as is: register PRESERIALIZED codec for it
+          (see GRPCServer.add_broadcast);
+        - Topic exists while it has subscribers: messages of the topic without subscribers are not kept,
+          closed topic is removed (the next subscription starts a new topic);
+        - Every subscriber stream takes a worker of the server (or method) thread pool while it's open.
+
+        Route usage:
+
+            def Subscribe(self, request, context):
+                return hub.subscribe(request.topic, context)
+
+    """
+
+    def __init__(self, max_queue=100, policy=DROP, serializer=None):
+        if policy not in POLICIES:
+            raise grpc.RpcError("Unknown slow consumer policy '{}', expected one of: {}.".format(policy, POLICIES))
+        self.max_queue = max_queue
+        self.policy = policy
+        self.serializer = serializer
+        self._topics = {}
+        self._lock = threading.Lock()
+
+    def _remove_topic(self, name, topic):
+        """Remove topic without subscribers (hub lock must be held)."""
+
+        if self._topics.get(name) is topic and not topic.subscribers:
+            del self._topics[name]
+
+    def publish(self, name, message):
+        """Publish message to the topic subscribers (message is serialized once).
+
+            :param name: topic name;
+            :type name: str;
+            :param message: proto message or serialized message;
+            :type message: proto message or bytes-like object;
+
+            :return: int, number of subscribers.
+
+        """
+
+        # nobody listens: message isn't serialized and kept
+        topic = self._topics.get(name)
+        if topic is None:
+            return 0
+
+        if isinstance(message, (bytes, bytearray, memoryview)):
+            data = to_bytes(message)
+        else:
+            data = self.serializer(message) if self.serializer is not None else message.SerializeToString()
+
+        with topic.condition:
+            topic.log.append(data)
+            topic.seq += 1
+            topic.published += 1
+            topic.condition.notify_all()
+
+            return topic.subscribers
+
+    def subscribe(self, name, context=None, max_queue=None, policy=None):
+        """Subscribe stream to the topic: messages published after subscription are sent as bytes.
+            Stream ends when the topic is closed or the call is terminated.
+
+            :param name: topic name;
+            :type name: str;
+            :param context: call context (stream is stopped when the call is cancelled);
+            :type context: grpc.ServicerContext;
+            :param max_queue: subscriber queue size (at most hub max_queue);
+            :type max_queue: int;
+            :param policy: slow consumer policy of the subscriber (default: hub policy);
+            :type policy: str;
+
+            :return: generator with bytes.
+
+        """
+
+        max_queue = min(max_queue or self.max_queue, self.max_queue)
+        policy = policy or self.policy
+        if policy not in POLICIES:
+            raise grpc.RpcError("Unknown slow consumer policy '{}', expected one of: {}.".format(policy, POLICIES))
+
+        with self._lock:
+            topic = self._topics.get(name)
+            if topic is None:
+                topic = self._topics[name] = _Topic(self.max_queue)
+            with topic.condition:
+                topic.subscribers += 1
+                position = topic.seq + 1
+
+        if context is not None:
+            context.add_callback(topic.wake)
+
+        return self._stream(name, topic, position, max_queue, policy, context)
+
+    def _stream(self, name, topic, position, max_queue, policy, context):
+        try:
+            while True:
+                with topic.condition:
+                    while position > topic.seq and not topic.closed and (context is None or context.is_active()):
+                        topic.condition.wait()
+                    if position > topic.seq:
+                        return
+
+                    # slow consumer
+                    lag = topic.seq - position + 1
+                    if lag > max_queue:
+                        if policy == DISCONNECT:
+                            topic.disconnected += 1
+                            break
+                        skip = lag - (1 if policy == COALESCE else max_queue)
+                        topic.dropped += skip
+                        position += skip
+
+                    first = topic.seq - len(topic.log) + 1
+                    batch = [topic.log[index] for index in range(position - first, len(topic.log))]
+                    position = topic.seq + 1
+
+                for data in batch:
+                    yield data
+        finally:
+            with self._lock:
+                with topic.condition:
+                    topic.subscribers -= 1
+                self._remove_topic(name, topic)
+
+        if context is not None:
+            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, "Subscriber is too slow: {} messages behind.".format(lag))
+
+    def close(self, name=None):
+        """Close the topic or all topics: subscriber streams are finished and topics are removed.
+
+            :param name: topic name (None: all topics);
+            :type name: str.
+
+        """
+
+        with self._lock:
+            topics = [self._topics.pop(topic_name) for topic_name in list(self._topics)
+                      if name is None or topic_name == name]
+
+        for topic in topics:
+            with topic.condition:
+                topic.closed = True
+                topic.condition.notify_all()
+
+    def stats(self):
+        """Topics statistics.
+
+            :return: dict like {topic: {subscribers, published, dropped, disconnected}}.
+
+        """
+
+        return {name: dict(subscribers=topic.subscribers, published=topic.published, dropped=topic.dropped,
+                           disconnected=topic.disconnected) for name, topic in list(self._topics.items())}
+
+    def __repr__(self):
+        return "broadcast hub: {} topics".format(len(self._topics))
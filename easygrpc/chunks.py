@@ -0,0 +1,255 @@
+import io
+import os
+import mmap
+import stat
+import threading
+from six.moves import queue
+
+CHUNK_SIZE = 1024 * 1024
+READAHEAD = 2
+OFFSET_METADATA = "x-easygrpc-offset"
+
+
+def get_chunk_data(chunk):
+    """Get chunk bytes: raw chunk (bytes-like object) or proto message with "data" field.
+
+        :param chunk: chunk message;
+        :type chunk: bytes-like object or proto message;
+
+        :return: bytes-like object.
+
+    """
+
+    return chunk if isinstance(chunk, (bytes, bytearray, memoryview)) else chunk.data
+
+
+def get_offset(context, default=0):
+    """Get transfer offset from call metadata (resumed transfer).
+
+        :param context: call context;
+        :type context: grpc.ServicerContext;
+        :param default: offset when metadata has no offset;
+        :type default: int;
+
+        :return: int.
+
+    """
+
+    for key, value in context.invocation_metadata() or ():
+        if key == OFFSET_METADATA:
+            return int(value)
+
+    return default
+
+
+def _read_file(source, chunk_size, offset):
+    """Read chunks from the file: regular files are mapped (mmap), other files are read with readinto.
+
+        :param source: binary file object;
+        :type source: file object;
+        :param chunk_size: chunk size in bytes;
+        :type chunk_size: int;
+        :param offset: first byte offset;
+        :type offset: int;
+
+        :return: generator with bytes.
+
+    """
+
+    try:
+        file_stat = os.fstat(source.fileno())
+        regular = stat.S_ISREG(file_stat.st_mode)
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        regular = False
+
+    # regular file: slice mapped pages
+    if regular:
+        size = file_stat.st_size
+        if size <= offset:
+            return
+        mapped = mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for position in range(offset, size, chunk_size):
+                yield mapped[position:position + chunk_size]
+        finally:
+            mapped.close()
+        return
+
+    # stream: read into chunk buffer
+    if offset:
+        source.seek(offset)
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    while True:
+        length = source.readinto(buffer)
+        if not length:
+            break
+        yield bytes(view[:length])
+
+
+def read_chunks(source, chunk_size=CHUNK_SIZE, offset=0, readahead=READAHEAD, message_class=None):
+    """Read file or buffer as a sequence of fixed-size chunks.
+        Chunks are read by a background thread, at most readahead chunks are waiting to be sent.
+
+        :param source: file path, binary file object or bytes-like object;
+        :type source: str or file object or bytes;
+        :param chunk_size: chunk size in bytes;
+        :type chunk_size: int;
+        :param offset: first byte offset (resumed transfer);
+        :type offset: int;
+        :param readahead: number of chunks read in advance (0: read chunks in the sending thread);
+        :type readahead: int;
+        :param message_class: chunk proto message class with "data" bytes field (None: raw chunks);
+        :type message_class: class;
+
+        :return: generator with chunks.
+
+    """
+
+    def read():
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            view = memoryview(source)
+            for position in range(offset, len(view), chunk_size):
+                yield view[position:position + chunk_size]
+        elif isinstance(source, str):
+            with open(source, "rb") as f:
+                for chunk in _read_file(f, chunk_size, offset):
+                    yield chunk
+        else:
+            for chunk in _read_file(source, chunk_size, offset):
+                yield chunk
+
+    chunks = read() if not readahead else _readahead(read(), readahead)
+    for chunk in chunks:
+        yield chunk if message_class is None else message_class(data=bytes(chunk))
+
+
+def _readahead(chunks, readahead):
+    """Read chunks in the background thread (bounded queue: backpressure of the slow receiver).
+
+        :param chunks: chunks generator;
+        :type chunks: generator;
+        :param readahead: queue size;
+        :type readahead: int;
+
+        :return: generator with chunks.
+
+    """
+
+    done, stopped = object(), threading.Event()
+    chunk_queue = queue.Queue(maxsize=readahead)
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                chunk_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def reader():
+        try:
+            for chunk in chunks:
+                if not put(chunk):
+                    break
+            else:
+                put(done)
+        except Exception as e:
+            put(e)
+        finally:
+            chunks.close()
+
+    thread = threading.Thread(target=reader, name="easygrpc-readahead", daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            chunk = chunk_queue.get()
+            if chunk is done:
+                break
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+    finally:
+        stopped.set()
+
+
+def write_chunks(chunks, target, offset=0):
+    """Write chunks to file or buffer as they are received.
+
+        :param chunks: received chunks (raw or proto messages with "data" field);
+        :type chunks: iterator;
+        :param target: file path, binary file object or writable buffer (bytearray);
+        :type target: str or file object or bytearray;
+        :param offset: first byte offset (resumed transfer): file is truncated to offset;
+        :type offset: int;
+
+        :return: int, file size (offset + written bytes).
+
+    """
+
+    if isinstance(target, str):
+        with open(target, "r+b" if os.path.exists(target) else "wb") as f:
+            return write_chunks(chunks, f, offset)
+
+    if isinstance(target, bytearray):
+        del target[offset:]
+        for chunk in chunks:
+            target += get_chunk_data(chunk)
+        return len(target)
+
+    target.seek(offset)
+    target.truncate()
+    position = offset
+    for chunk in chunks:
+        data = get_chunk_data(chunk)
+        target.write(data)
+        position += len(data)
+
+    return position
+
+
+def send_file(source, context=None, chunk_size=CHUNK_SIZE, readahead=READAHEAD, message_class=None):
+    """Route helper: send file as response stream from the offset requested by the client metadata.
+
+        :param source: file path, binary file object or bytes-like object;
+        :type source: str or file object or bytes;
+        :param context: call context;
+        :type context: grpc.ServicerContext;
+        :param chunk_size: chunk size in bytes;
+        :type chunk_size: int;
+        :param readahead: number of chunks read in advance;
+        :type readahead: int;
+        :param message_class: chunk proto message class with "data" bytes field (None: raw chunks);
+        :type message_class: class;
+
+        :return: generator with chunks.
+
+    """
+
+    offset = get_offset(context) if context is not None else 0
+
+    return read_chunks(source, chunk_size, offset, readahead, message_class)
+
+
+def receive_file(request_iterator, target, context=None):
+    """Route helper: write request stream to file from the offset sent in the client metadata.
+        Final file size is sent to the client in the trailing metadata.
+
+        :param request_iterator: received chunks;
+        :type request_iterator: iterator;
+        :param target: file path, binary file object or writable buffer (bytearray);
+        :type target: str or file object or bytearray;
+        :param context: call context;
+        :type context: grpc.ServicerContext;
+
+        :return: int, file size.
+
+    """
+
+    size = write_chunks(request_iterator, target, get_offset(context) if context is not None else 0)
+    if context is not None:
+        context.set_trailing_metadata(((OFFSET_METADATA, str(size)),))
+
+    return size
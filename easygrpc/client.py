@@ -9,21 +9,40 @@ from functools import update_wrapper, partial
 import six
 import grpc
 
+from .codec import PROTOBUF, RAW
+from .chunks import CHUNK_SIZE, READAHEAD, OFFSET_METADATA, read_chunks, write_chunks
 from .parser import GRPCParser
+from .limits import LimitedCallable
+from .context import DeadlineCallable, current_call
+from .inproc import InprocChannel, is_inproc
+from .uds import prefer_uds
+from .multiplex import MultiplexChannel
+from .registry import MethodRegistry
+from .manifest import ROUTE_MANIFEST, LazyObject, RouteManifest
+
+
+MULTI_CALLABLES = (
+    grpc.UnaryUnaryMultiCallable,
+    grpc.UnaryStreamMultiCallable,
+    grpc.StreamUnaryMultiCallable,
+    grpc.StreamStreamMultiCallable,
+)
 
 
 class StubWrapper(object):
     """Stub wrapper add hook to Stub class methods."""
 
-    def __init__(self, wrapped_stub, client, request_hook=None):
+    def __init__(self, wrapped_stub, client, request_hook=None, stub_name=None):
         self.wrapped_stub = wrapped_stub
         self._client = client
         self._request_hook = request_hook
+        self._stub_name = stub_name
         update_wrapper(self, wrapped_stub)
 
     @staticmethod
-    def use_request_hook(self, item, client, request_hook):
-        """Wrapper function to use request hook with grpc channel method.
+    def use_request_hook(self, item, client, request_hook, stub_name=None):
+        """Wrapper function to use request hook with grpc channel method (and client compression, limits,
+            deadline propagation and tracing).
 
             :param self: active Stub instance;
             :type self: instance of Stub class;
@@ -35,15 +54,41 @@ class StubWrapper(object):
                 - client: client object;
                 - method: stub request send method;
                 *args, **kwargs - standard method use parameters;
+            :param stub_name: stub name (compression policy key);
+            :type stub_name: str;
 
             :return: Stub class with request hook function.
 
         """
 
         obj = object.__getattribute__(self, item)
+        is_unary = isinstance(obj, grpc.UnaryUnaryMultiCallable)
+
+        # unary request methods: request compression
+        if stub_name and (is_unary or isinstance(obj, grpc.UnaryStreamMultiCallable)):
+            policy = client.compression.get(stub_name, item)
+            if policy is not None:
+                obj = policy.wrap_callable(obj, "{}.{}".format(stub_name, item))
+
+        # rate limit and circuit breaker
+        if stub_name and isinstance(obj, MULTI_CALLABLES):
+            rate_limit, breaker = client.rate_limits.get(stub_name, item), client.breakers.get(stub_name, item)
+            if rate_limit is not None or breaker is not None:
+                obj = LimitedCallable(obj, "{}.{}".format(stub_name, item), rate_limit, breaker)
+
+        # call inside server handler: deadline and cancellation of the incoming call
+        original = object.__getattribute__(self, item)
+        scope = client.propagate_deadline and isinstance(original, MULTI_CALLABLES) and current_call()
+        if scope:
+            response_streaming = isinstance(original, (grpc.UnaryStreamMultiCallable, grpc.StreamStreamMultiCallable))
+            obj = DeadlineCallable(obj, scope, client.deadline_margin, response_streaming)
+
+        # tracing: span of the sampled call, trace context in the metadata
+        if client.tracer is not None and isinstance(original, MULTI_CALLABLES):
+            obj = client.tracer.wrap_callable(obj, "{}.{}".format(stub_name or type(self).__name__, item))
 
         # only service methods
-        if isinstance(obj, grpc.UnaryUnaryMultiCallable):
+        if is_unary:
 
             def wrapper_hook(*args, **kwargs):
 
@@ -74,7 +119,8 @@ class StubWrapper(object):
         """
 
         # create special hook
-        getattr_hook = partial(StubWrapper.use_request_hook, client=self._client, request_hook=self._request_hook)
+        getattr_hook = partial(StubWrapper.use_request_hook, client=self._client, request_hook=self._request_hook,
+                               stub_name=self._stub_name)
         setattr(self.wrapped_stub, "__getattribute__", lambda obj, item: getattr_hook(obj, item))
 
         return self.wrapped_stub(active_stub, *args, **kwargs)
@@ -83,6 +129,99 @@ class StubWrapper(object):
         return "wrapper stub: {}".format(self.wrapped_stub)
 
 
+class DescriptorStub(object):
+    """Stub built from proto service descriptor (like generated Stub class, but method codecs can differ).
+
+        Raw methods don't parse messages: they send and receive serialized messages (bytes).
+
+    """
+
+    CHANNEL_METHODS = {
+        (False, False): "unary_unary",
+        (False, True): "unary_stream",
+        (True, False): "stream_unary",
+        (True, True): "stream_stream",
+    }
+
+    service_descriptor = None
+    codecs = {}
+
+    def __init__(self, channel):
+        for method in self.service_descriptor.methods:
+            path = "/{}/{}".format(self.service_descriptor.full_name, method.name)
+            codec = self.codecs.get(method.name, PROTOBUF)
+            channel_method = getattr(channel, self.CHANNEL_METHODS[GRPCParser.get_method_streaming(method)])
+            setattr(self, method.name, channel_method(
+                path,
+                request_serializer=codec.serializer(GRPCParser.get_message_class(method.input_type)),
+                response_deserializer=codec.deserializer(GRPCParser.get_message_class(method.output_type))
+            ))
+
+    @classmethod
+    def create(cls, stub_class, stub_name, raw_methods=(), codecs=None):
+        """Create descriptor stub class for proto Stub class.
+
+            :param stub_class: proto Stub class;
+            :type stub_class: class;
+            :param stub_name: stub (service) name;
+            :type stub_name: str;
+            :param raw_methods: proto method names (True for all methods) which send and receive bytes;
+            :type raw_methods: tuple with str or bool;
+            :param codecs: method codecs registry (protobuf codec by default);
+            :type codecs: easygrpc.registry.MethodRegistry;
+
+            :return: DescriptorStub subclass.
+
+        """
+
+        service_descriptor = GRPCParser.find_service_descriptor(inspect.getmodule(stub_class), stub_name)
+        if service_descriptor is None:
+            raise grpc.RpcError("Can't find proto service descriptor of the stub '{}'.".format(stub_name))
+
+        method_codecs = {}
+        for method in service_descriptor.methods:
+            method_codecs[method.name] = codecs.get(stub_name, method.name) if codecs else PROTOBUF
+            if raw_methods is True or method.name in raw_methods:
+                method_codecs[method.name] = RAW
+
+        return type(stub_class.__name__, (cls,), dict(service_descriptor=service_descriptor, codecs=method_codecs))
+
+
+class LazyStub(object):
+    """Lazy stub: lightweight stub descriptor, stub wrapper and stub messages are created on the first use."""
+
+    def __init__(self, name, stub_class):
+        self.name = name
+        self.stub_class = stub_class
+
+    def build(self, client):
+        """Create stub instance and add it to the client.
+
+            :param client: GRPCClient object;
+            :type client: instance of the GRPCClient class;
+
+            :return: stub instance.
+
+        """
+
+        stub_class = LazyObject.unwrap(self.stub_class)
+        messages = SimpleNamespace(**client.get_stub_params(stub_class, self.name)["messages"])
+        client.stubs.setdefault(self.name, stub_class)
+
+        # stub with changed methods codecs
+        stub_config = client.stub_config.get(self.name)
+        if stub_config or client.codecs.has(self.name) or client.codecs.default is not PROTOBUF:
+            stub_class = DescriptorStub.create(stub_class, self.name, codecs=client.codecs, **stub_config or {})
+
+        stub_class.messages = messages
+        client.add_stub(stub_class, proto_name=self.name, need_check=False)
+
+        return client.__dict__[self.name]
+
+    def __repr__(self):
+        return "lazy stub: {}".format(self.stub_class)
+
+
 # TODO: Add reconfigure server
 # TODO: Add special search methods method (check change server config)
 class GRPCClient(object):
@@ -103,12 +242,46 @@ class GRPCClient(object):
 
     request_hook = None
 
-    def __init__(self, proto_py_module=None, address=None, stub_names=(), max_message_length=None):
+    # deadline propagation: outbound calls of server handlers use deadline of the incoming call minus margin
+    PROPAGATE_DEADLINE = True
+    DEADLINE_MARGIN = 0.01
+
+    # in-process server ("inproc:name" address): pass copies of proto messages instead of serialized messages
+    INPROC_COPY_MESSAGES = False
+
+    # unix domain socket of the local server: used instead of local TCP address when the socket exists
+    UDS_PATH = None
+
+    # multiplexed mode: unary calls are sent over one bidi stream (server must enable multiplexed mode)
+    MULTIPLEX = False
+    MULTIPLEX_IDLE_TIMEOUT = 60.0  # seconds without calls before the stream is closed (None: kept until close)
+
+    def __init__(self, proto_py_module=None, address=None, stub_names=(), max_message_length=None, uds_path=None,
+                 multiplex=None):
 
         # client instance
         self.stubs = {}
-        self.channel = grpc.insecure_channel(target=address or self.DEFAULT_ADDRESS,
-                                             options=[('grpc.max_message_length', max_message_length or 4*1024*1024)])
+        self.stubs_params = {}
+        self.stub_config = {}
+        self.codecs = MethodRegistry(PROTOBUF)
+        self.compression = MethodRegistry()
+        self.rate_limits = MethodRegistry()
+        self.breakers = MethodRegistry()
+        self.propagate_deadline = self.PROPAGATE_DEADLINE
+        self.deadline_margin = self.DEADLINE_MARGIN
+        self.tracer = None
+        self._lazy_stubs = {}
+        self._parsed_modules = set()
+        self.target = prefer_uds(address or self.DEFAULT_ADDRESS, uds_path or self.UDS_PATH)
+        if is_inproc(self.target):
+            self.channel = InprocChannel(self.target, copy_messages=self.INPROC_COPY_MESSAGES)
+        else:
+            self.channel = grpc.insecure_channel(target=self.target, options=[
+                ('grpc.max_send_message_length', max_message_length or 4*1024*1024),
+                ('grpc.max_receive_message_length', max_message_length or 4*1024*1024),
+            ])
+            if self.MULTIPLEX if multiplex is None else multiplex:
+                self.channel = MultiplexChannel(self.channel, self.MULTIPLEX_IDLE_TIMEOUT)
 
         if proto_py_module:
             self.from_module(proto_py_module, *stub_names)
@@ -156,7 +329,7 @@ class GRPCClient(object):
                     yield s_name, obj
 
     def _parse_module(self, proto_py_module, *stub_names):
-        """Parse proto_py_module to find Stub add class and messages.
+        """Parse proto_py_module to find Stub add class (messages are parsed on the first stub use).
 
             :param proto_py_module: python module generate from .proto file;
             :type proto_py_module: import module isinstance;
@@ -167,17 +340,33 @@ class GRPCClient(object):
 
         # get stubs
         for s_name, stub_obj in self.parse_proto_file(proto_py_module, self.HANDLER_SEARCH_PATTERN, *stub_names):
-            if s_name in self.stubs:
+            if s_name in self.stubs or s_name in self._lazy_stubs:
                 raise grpc.RpcError("The same stub name '{}' is already exists.".format(s_name))
             self.stubs[s_name] = stub_obj
+            self._lazy_stubs[s_name] = LazyStub(s_name, stub_obj)
+
+    def get_stub_params(self, stub_class, stub_name):
+        """Get stub parameters (messages and methods), proto_py module is parsed once.
 
-        # set messages to the stub object
-        self.stubs_params = self.GRPCParser.parse_module("stub", proto_py_module=proto_py_module)
-        for s_name, stub_obj in six.iteritems(self.stubs):
-            stub_obj.messages = SimpleNamespace(**self.stubs_params[s_name]["messages"])
+            :param stub_class: stub class from proto_py module;
+            :type stub_class: proto Stub class;
+            :param stub_name: stub name;
+            :type stub_name: str;
+
+            :return: dict like {"stub_class": stub_class, "messages": dict, "methods": set}.
+
+        """
+
+        module_name = stub_class.__module__
+        if module_name not in self._parsed_modules:
+            self.stubs_params.update(self.GRPCParser.parse_module("stub", proto_py_module=import_module(module_name)))
+            self._parsed_modules.add(module_name)
+
+        return self.stubs_params[stub_name]
 
     def from_module(self, proto_py_module, *stub_names):
         """Add stubs from object [stubs name mast be equal of the proto names].
+            Stubs are created on the first use (see LazyStub).
 
             :param proto_py_module: python module generate from .proto file;
             :type proto_py_module: tuple with import module isinstance;
@@ -188,14 +377,7 @@ class GRPCClient(object):
 
         """
 
-        # parse module
-        old_names = set(self.stubs)
         self._parse_module(proto_py_module, *stub_names)
-        new_names = set(self.stubs) - old_names
-
-        # add new stubs
-        for s_name in new_names:
-            self.add_stub(self.stubs[s_name], need_check=False)
 
         return self
 
@@ -228,8 +410,10 @@ class GRPCClient(object):
 
         """
 
-        for s_name in [operator.and_, operator.sub][include](set(self.stubs), set(stub_names)):
-            delattr(self, s_name)
+        for s_name in [operator.and_, operator.sub][include](set(self.stubs) | set(self._lazy_stubs), set(stub_names)):
+            self.stubs.pop(s_name, None)
+            self._lazy_stubs.pop(s_name, None)
+            self.__dict__.pop(s_name, None)
 
         return self
 
@@ -251,6 +435,255 @@ class GRPCClient(object):
 
         return self.from_modules(*proto_py_modules)
 
+    def config_stub(self, stub_name, **config):
+        """Change stub configuration (stub is recreated on the next use).
+
+            Stub configuration keys:
+                - raw_methods: proto method names (True for all methods) which send and receive bytes
+                  (codecs are set with register_codec).
+
+            :param stub_name: stub name;
+            :type stub_name: str;
+            :param config: stub configuration;
+            :type config: dict;
+
+            :return: client instance.
+
+        """
+
+        self.stub_config.setdefault(stub_name, {}).update(config)
+        self._reset_stub(stub_name)
+
+        return self
+
+    def register_codec(self, codec, stub_name=None, method_name=None):
+        """Register message codec for all stubs, the stub or the stub method (stubs are recreated on the next use).
+
+            :param codec: message codec;
+            :type codec: easygrpc.codec.Codec;
+            :param stub_name: stub name (default codec when stub_name is None);
+            :type stub_name: str;
+            :param method_name: proto method name (codec for all stub methods when method_name is None);
+            :type method_name: str;
+
+            :return: client instance.
+
+        """
+
+        self.codecs.register(codec, stub_name, method_name)
+        for s_name in list(self.stubs) if stub_name is None else (stub_name,):
+            self._reset_stub(s_name)
+
+        return self
+
+    def set_compression(self, policy, stub_name=None, method_name=None):
+        """Set request compression policy for all stubs, the stub or the stub method.
+            Policy is used by unary request methods, compression argument of the call has priority.
+
+            :param policy: compression policy (None: no compression);
+            :type policy: easygrpc.compression.CompressionPolicy;
+            :param stub_name: stub name (default policy when stub_name is None);
+            :type stub_name: str;
+            :param method_name: proto method name (policy for all stub methods when method_name is None);
+            :type method_name: str;
+
+            :return: client instance.
+
+        """
+
+        self.compression.register(policy, stub_name, method_name)
+
+        return self
+
+    def set_rate_limit(self, rate_limit, stub_name=None, method_name=None):
+        """Set rate limit for all stubs, the stub or the stub method (every method has own token bucket).
+            Calls over the rate fail fast with GRPCRateLimitError (grpc.RpcError with RESOURCE_EXHAUSTED code).
+
+            :param rate_limit: rate limit like RateLimit(rate=100, burst=20);
+            :type rate_limit: easygrpc.limits.RateLimit;
+            :param stub_name: stub name (default limit when stub_name is None);
+            :type stub_name: str;
+            :param method_name: proto method name (limit for all stub methods when method_name is None);
+            :type method_name: str;
+
+            :return: client instance.
+
+        """
+
+        self.rate_limits.register(rate_limit, stub_name, method_name)
+
+        return self
+
+    def set_circuit_breaker(self, breaker, stub_name=None, method_name=None):
+        """Set circuit breaker for all stubs, the stub or the stub method (every method has own breaker state).
+            Calls fail fast with GRPCCircuitOpenError (grpc.RpcError with UNAVAILABLE code) while breaker is open.
+
+            :param breaker: circuit breaker like CircuitBreaker(error_rate=0.5, latency=1.0);
+            :type breaker: easygrpc.limits.CircuitBreaker;
+            :param stub_name: stub name (default breaker when stub_name is None);
+            :type stub_name: str;
+            :param method_name: proto method name (breaker for all stub methods when method_name is None);
+            :type method_name: str;
+
+            :return: client instance.
+
+        """
+
+        self.breakers.register(breaker, stub_name, method_name)
+
+        return self
+
+    def limit_stats(self):
+        """Rate limits and circuit breakers statistics.
+
+            :return: dict like {"rate_limits": {method_key: stats}, "breakers": {method_key: stats}}.
+
+        """
+
+        stats = {}
+        for name, registry in (("rate_limits", self.rate_limits), ("breakers", self.breakers)):
+            stats[name] = {}
+            for limit in {id(value): value for value in [registry.default] + list(registry.items().values())
+                          if value is not None}.values():
+                stats[name].update(limit.stats())
+
+        return stats
+
+    def set_tracer(self, tracer):
+        """Set tracer of the client calls: spans of sampled calls, trace context is sent in the metadata.
+            Calls made by server handlers continue the trace of the handled call.
+
+            :param tracer: tracer like Tracer("gateway", sample_rate=0.01, path="spans.jsonl") or None;
+            :type tracer: easygrpc.tracing.Tracer;
+
+            :return: client instance.
+
+        """
+
+        self.tracer = tracer and tracer.start()
+
+        return self
+
+    def close(self):
+        """Close the client channel (and the multiplexed stream): calls in progress are cancelled."""
+
+        self.channel.close()
+
+    @staticmethod
+    def upload(method, source, offset=0, chunk_size=CHUNK_SIZE, readahead=READAHEAD, message_class=None,
+               **call_kwargs):
+        """Send file or buffer to the request streaming method as a sequence of fixed-size chunks.
+            Only chunk_size * (readahead + 1) bytes are kept in memory (route uses easygrpc.chunks.receive_file).
+
+            :param method: stub method (request streaming);
+            :type method: grpc.StreamUnaryMultiCallable;
+            :param source: file path, binary file object or bytes-like object;
+            :type source: str or file object or bytes;
+            :param offset: first byte offset (resume previous upload, offset is sent in the metadata);
+            :type offset: int;
+            :param chunk_size: chunk size in bytes;
+            :type chunk_size: int;
+            :param readahead: number of chunks read in advance;
+            :type readahead: int;
+            :param message_class: chunk proto message class with "data" bytes field (None: raw method);
+            :type message_class: class;
+            :param call_kwargs: method call parameters (timeout, metadata, ...);
+            :type call_kwargs: dict;
+
+            :return: tuple (response, int: uploaded size reported by the route or None).
+
+        """
+
+        call_kwargs["metadata"] = tuple(call_kwargs.get("metadata") or ()) + ((OFFSET_METADATA, str(offset)),)
+        response, call = method.with_call(read_chunks(source, chunk_size, offset, readahead, message_class),
+                                          **call_kwargs)
+        size = dict(call.trailing_metadata() or ()).get(OFFSET_METADATA)
+
+        return response, size and int(size)
+
+    @staticmethod
+    def download(method, request, target, offset=0, resume=False, **call_kwargs):
+        """Receive response stream of the method into file or buffer (chunks are written as they arrive).
+            Target is truncated to the offset before the first chunk is written.
+
+            :param method: stub method (response streaming);
+            :type method: grpc.UnaryStreamMultiCallable;
+            :param request: request message;
+            :type request: proto message;
+            :param target: file path, binary file object or writable buffer (bytearray);
+            :type target: str or file object or bytearray;
+            :param offset: first byte offset;
+            :type offset: int;
+            :param resume: resume previous download: offset is the size of the existing target (path or bytearray);
+            :type resume: bool;
+            :param call_kwargs: method call parameters (timeout, metadata, ...);
+            :type call_kwargs: dict;
+
+            :return: int, target size.
+
+        """
+
+        if resume:
+            offset = len(target) if isinstance(target, bytearray) else 0
+            if isinstance(target, str) and os.path.exists(target):
+                offset = os.path.getsize(target)
+
+        call_kwargs["metadata"] = tuple(call_kwargs.get("metadata") or ()) + ((OFFSET_METADATA, str(offset)),)
+
+        return write_chunks(method(request, **call_kwargs), target, offset)
+
+    def _reset_stub(self, stub_name):
+        """Remove created stub instance: stub is recreated on the next use.
+
+            :param stub_name: stub name;
+            :type stub_name: str.
+
+        """
+
+        if stub_name in self.__dict__:
+            self.__dict__.pop(stub_name)
+            self._lazy_stubs[stub_name] = LazyStub(stub_name, self.stubs[stub_name])
+
+    def from_manifest(self, path=None, *stub_names):
+        """Load stubs from route manifest created by "grpc-admin routes".
+            Modules are not scanned: stub module is imported on the first stub use (see LazyStub).
+
+            :param path: manifest file path (default: "PROTO_PY_FOLDER/ROUTE_MANIFEST");
+            :type path: str;
+            :param stub_names: added stub names;
+            :type stub_names: tuple with str;
+
+            :return: client instance.
+
+        """
+
+        manifest = RouteManifest.load(path or os.path.join(self.PROTO_PY_FOLDER, ROUTE_MANIFEST))
+        for s_name, params in manifest.filter(*stub_names):
+            if s_name in self.stubs or s_name in self._lazy_stubs:
+                raise grpc.RpcError("The same stub name '{}' is already exists.".format(s_name))
+            self._lazy_stubs[s_name] = LazyStub(s_name, LazyObject(params["grpc_module"], params["stub"]))
+
+        return self
+
+    def __getattr__(self, item):
+        """Create lazy stub on the first use.
+
+            :param item: attribute name;
+            :type item: str;
+
+            :return: stub instance.
+
+        """
+
+        lazy_stub = self.__dict__.get("_lazy_stubs", {}).get(item)
+        if lazy_stub is None:
+            raise AttributeError("'{}' object has no attribute '{}'".format(type(self).__name__, item))
+
+        stub = lazy_stub.build(self)
+        self._lazy_stubs.pop(item, None)
+
+        return stub
+
     def add_stub(self, stub, proto_name=None, need_check=True):
         """Add user define service to the server.
 
@@ -276,7 +709,8 @@ class GRPCClient(object):
             raise grpc.RpcError("The same stub name {} is already exists.".format(s_name))
 
         # add stub
-        wrapper_stub = StubWrapper(self.stubs[s_name], client=self, request_hook=self.request_hook)
+        self.stubs.setdefault(s_name, stub)
+        wrapper_stub = StubWrapper(stub, client=self, request_hook=self.request_hook, stub_name=s_name)
         setattr(self, s_name, wrapper_stub(self.channel))
 
     def add_stubs(self, *stubs, **stubs_param):
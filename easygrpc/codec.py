@@ -0,0 +1,94 @@
+def to_bytes(data):
+    """Raw serializer: bytes are passed as is, other bytes-like objects (memoryview, bytearray) are copied to bytes.
+
+        :param data: serialized message;
+        :type data: bytes-like object;
+
+        :return: bytes.
+
+    """
+
+    return data if isinstance(data, bytes) else bytes(data)
+
+
+class Codec(object):
+    """Message codec: create serializer and deserializer for message class (protobuf codec by default)."""
+
+    name = "protobuf"
+
+    def serializer(self, message_class):
+        """Get message serializer.
+
+            :param message_class: proto message class from descriptor;
+            :type message_class: class;
+
+            :return: function: message --> bytes.
+
+        """
+
+        return message_class.SerializeToString
+
+    def deserializer(self, message_class):
+        """Get message deserializer.
+
+            :param message_class: proto message class from descriptor;
+            :type message_class: class;
+
+            :return: function: bytes --> message (None: bytes are passed as is).
+
+        """
+
+        return message_class.FromString
+
+    def __repr__(self):
+        return "codec: {}".format(self.name)
+
+
+class RawCodec(Codec):
+    """Raw codec: messages are not parsed, handlers and stubs use serialized messages (bytes)."""
+
+    name = "raw"
+
+    def serializer(self, message_class):
+        return to_bytes
+
+    def deserializer(self, message_class):
+        return None
+
+
+class FunctionCodec(Codec):
+    """Codec from functions (message class is not used), like FunctionCodec(msgpack.packb, msgpack.unpackb)."""
+
+    def __init__(self, serialize, deserialize, name="function"):
+        self.serialize = serialize
+        self.deserialize = deserialize
+        self.name = name
+
+    def serializer(self, message_class):
+        return self.serialize
+
+    def deserializer(self, message_class):
+        return self.deserialize
+
+
+class PreserializedCodec(Codec):
+    """Protobuf codec which sends serialized messages (bytes) as is: message is serialized once and sent
+        to many streams (see easygrpc.broadcast.BroadcastHub).
+
+    """
+
+    name = "preserialized"
+
+    def serializer(self, message_class):
+
+        def serialize(message):
+            if isinstance(message, (bytes, bytearray, memoryview)):
+                return to_bytes(message)
+            return message.SerializeToString()
+
+        return serialize
+
+
+PROTOBUF = Codec()
+RAW = RawCodec()
+PRESERIALIZED = PreserializedCodec()
@@ -0,0 +1,218 @@
+import zlib
+import threading
+from functools import update_wrapper
+
+import grpc
+
+ALGORITHMS = {
+    "gzip": grpc.Compression.Gzip,
+    "deflate": grpc.Compression.Deflate,
+}
+
+
+class CompressionStats(object):
+    """Compression statistics of one method."""
+
+    def __init__(self):
+        self.messages = 0
+        self.compressed = 0
+        self.samples = 0
+        self.ratio = None
+
+    def add_sample(self, ratio, weight=0.2):
+        """Add observed compression ratio (exponential moving average).
+
+            :param ratio: compressed size / serialized size;
+            :type ratio: float;
+            :param weight: weight of the new sample;
+            :type weight: float.
+
+        """
+
+        self.samples += 1
+        self.ratio = ratio if self.ratio is None else self.ratio + weight * (ratio - self.ratio)
+
+    def as_dict(self):
+        return dict(messages=self.messages, compressed=self.compressed, samples=self.samples, ratio=self.ratio)
+
+
+class CompressedCallable(object):
+    """Client multi-callable wrapper: compression of every request is chosen by the policy."""
+
+    def __init__(self, multi_callable, policy, key):
+        self.multi_callable = multi_callable
+        self.policy = policy
+        self.key = key
+
+    def _kwargs(self, request, kwargs):
+        if kwargs.get("compression") is None:
+            kwargs["compression"] = self.policy.choose(self.key, request)
+        return kwargs
+
+    def __call__(self, request, *args, **kwargs):
+        return self.multi_callable(request, *args, **self._kwargs(request, kwargs))
+
+    def with_call(self, request, *args, **kwargs):
+        return self.multi_callable.with_call(request, *args, **self._kwargs(request, kwargs))
+
+    def future(self, request, *args, **kwargs):
+        return self.multi_callable.future(request, *args, **self._kwargs(request, kwargs))
+
+    def __getattr__(self, item):
+        return getattr(self.multi_callable, item)
+
+
+class CompressionPolicy(object):
+    """Adaptive compression policy.
+
+        - Message is compressed only when its serialized size is at least min_size bytes;
+        - With max_ratio every sample_every-th large message is compressed with zlib to estimate the ratio
+          (compressed size / serialized size): compression is turned off while the average ratio is
+          greater than max_ratio (incompressible payloads) and turned on again when samples become better;
+        - Server: applied to route handler responses (streaming responses per message);
+        - Client: applied to requests of unary request methods (request streaming calls are not compressed).
+
+    """
+
+    def __init__(self, algorithm="gzip", min_size=1024, max_ratio=None, sample_every=50):
+        self.algorithm = ALGORITHMS.get(algorithm, algorithm)
+        self.min_size = min_size
+        self.max_ratio = max_ratio
+        self.sample_every = max(sample_every, 1)
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_size(message, serializer=None):
+        """Get serialized message size.
+
+            :param message: message (proto message, bytes-like object or any codec message);
+            :type message: any python object;
+            :param serializer: message serializer (used for messages without ByteSize method);
+            :type serializer: function;
+
+            :return: int or None (unknown size).
+
+        """
+
+        if isinstance(message, (bytes, bytearray, memoryview)):
+            return len(message)
+        if hasattr(message, "ByteSize"):
+            return message.ByteSize()
+        if serializer is not None:
+            return len(serializer(message))
+
+        return None
+
+    @staticmethod
+    def serialize(message, serializer=None):
+        if isinstance(message, (bytes, bytearray, memoryview)):
+            return message
+        if hasattr(message, "SerializeToString"):
+            return message.SerializeToString()
+
+        return serializer and serializer(message)
+
+    def choose(self, key, message, serializer=None):
+        """Choose message compression.
+
+            :param key: method key (statistics key);
+            :type key: str;
+            :param message: message to send;
+            :type message: any python object;
+            :param serializer: message serializer;
+            :type serializer: function;
+
+            :return: grpc.Compression or None (no compression).
+
+        """
+
+        stats = self._stats.get(key)
+        if stats is None:
+            with self._lock:
+                stats = self._stats.setdefault(key, CompressionStats())
+
+        size = self.get_size(message, serializer)
+        with self._lock:
+            stats.messages += 1
+            index = stats.messages
+
+        if size is not None and size < self.min_size:
+            return None
+
+        if self.max_ratio is not None:
+            if size and (stats.ratio is None or index % self.sample_every == 0):
+                data = self.serialize(message, serializer)
+                if data is not None:
+                    with self._lock:
+                        stats.add_sample(len(zlib.compress(data)) / float(len(data)))
+            if stats.ratio is not None and stats.ratio > self.max_ratio:
+                return None
+
+        with self._lock:
+            stats.compressed += 1
+
+        return self.algorithm
+
+    def wrap_behavior(self, key, behavior, response_streaming, serializer=None):
+        """Wrap route handler behavior: choose response compression.
+
+            :param key: method key (full method path);
+            :type key: str;
+            :param behavior: method implementation (signature like servicer method);
+            :type behavior: callable object;
+            :param response_streaming: response streaming flag;
+            :type response_streaming: bool;
+            :param serializer: response serializer;
+            :type serializer: function;
+
+            :return: callable object.
+
+        """
+
+        if response_streaming:
+
+            def wrapper(request, context):
+                context.set_compression(self.algorithm)
+                for response in behavior(request, context):
+                    if self.choose(key, response, serializer) is None:
+                        context.disable_next_message_compression()
+                    yield response
+
+        else:
+
+            def wrapper(request, context):
+                response = behavior(request, context)
+                algorithm = self.choose(key, response, serializer)
+                if algorithm is not None:
+                    context.set_compression(algorithm)
+                return response
+
+        return update_wrapper(wrapper, behavior)
+
+    def wrap_callable(self, multi_callable, key):
+        """Wrap client multi-callable: choose request compression.
+
+            :param multi_callable: unary request multi-callable;
+            :type multi_callable: grpc.UnaryUnaryMultiCallable or grpc.UnaryStreamMultiCallable;
+            :param key: method key like "StubName.MethodName";
+            :type key: str;
+
+            :return: CompressedCallable.
+
+        """
+
+        return CompressedCallable(multi_callable, self, key)
+
+    def stats(self):
+        """Compression statistics.
+
+            :return: dict like {method_key: {messages, compressed, samples, ratio}}.
+
+        """
+
+        with self._lock:
+            return {key: stats.as_dict() for key, stats in self._stats.items()}
+
+    def __repr__(self):
+        return "compression policy: {} >= {} bytes".format(self.algorithm, self.min_size)
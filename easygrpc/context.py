@@ -0,0 +1,186 @@
+import time
+import threading
+import contextvars
+
+from .exc import GRPCDeadlineExceededError
+
+MAX_TIMEOUT = 60 * 60 * 24 * 365
+
+_current_call = contextvars.ContextVar("easygrpc_call", default=None)
+
+
+def time_remaining(context):
+    """Get remaining time of the call (grpc reports huge remaining time for calls without deadline).
+
+        :param context: call context;
+        :type context: grpc.ServicerContext;
+
+        :return: float (seconds) or None when call has no deadline.
+
+    """
+
+    remaining = context.time_remaining()
+
+    return None if remaining is None or remaining > MAX_TIMEOUT else remaining
+
+
+def current_call():
+    """Get scope of the server call handled in the current thread (task).
+
+        :return: CallScope or None.
+
+    """
+
+    return _current_call.get()
+
+
+class CallScope(object):
+    """Server call scope: deadline and cancellation of the incoming call for outbound client calls.
+
+        Outbound calls registered in the scope are cancelled when the incoming call is terminated.
+
+    """
+
+    def __init__(self, context):
+        remaining = time_remaining(context)
+        self.deadline = None if remaining is None else time.monotonic() + remaining
+        self.cancelled = False
+        self._calls = set()
+        self._lock = threading.Lock()
+
+        if not context.add_callback(self.cancel):
+            self.cancelled = True
+
+    def time_remaining(self):
+        """Remaining time of the incoming call.
+
+            :return: float (seconds) or None when call has no deadline.
+
+        """
+
+        return None if self.deadline is None else self.deadline - time.monotonic()
+
+    def timeout(self, timeout=None, margin=0.0):
+        """Get timeout of the outbound call.
+
+            :param timeout: timeout set by the caller;
+            :type timeout: float;
+            :param margin: safety margin in seconds (time to send the response upstream);
+            :type margin: float;
+
+            :return: float or None (no deadline).
+
+        """
+
+        remaining = self.time_remaining()
+        if remaining is None:
+            return timeout
+
+        return remaining - margin if timeout is None else min(timeout, remaining - margin)
+
+    def track(self, call):
+        """Register outbound call: it is cancelled with the incoming call.
+
+            :param call: outbound call;
+            :type call: grpc.Call and grpc.Future;
+
+            :return: call.
+
+        """
+
+        with self._lock:
+            if not self.cancelled:
+                self._calls.add(call)
+                call.add_done_callback(self._calls.discard)
+                return call
+
+        call.cancel()
+
+        return call
+
+    def cancel(self):
+        """Incoming call is terminated: cancel outbound calls."""
+
+        with self._lock:
+            self.cancelled = True
+            calls, self._calls = list(self._calls), set()
+
+        for call in calls:
+            call.cancel()
+
+
+def propagate(behavior, response_streaming):
+    """Wrap method behavior: create call scope for outbound client calls of the handler.
+
+        :param behavior: method implementation (signature like servicer method);
+        :type behavior: callable object;
+        :param response_streaming: response streaming flag;
+        :type response_streaming: bool;
+
+        :return: function.
+
+    """
+
+    def scoped_stream(scope, responses):
+        # scope is current only while the next response is produced (worker thread runs other calls later)
+        iterator = iter(responses)
+        while True:
+            token = _current_call.set(scope)
+            try:
+                response = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                _current_call.reset(token)
+            yield response
+
+    def propagated_behavior(request, context):
+        scope = CallScope(context)
+        token = _current_call.set(scope)
+        try:
+            response = behavior(request, context)
+        finally:
+            _current_call.reset(token)
+
+        return scoped_stream(scope, response) if response_streaming else response
+
+    return propagated_behavior
+
+
+class DeadlineCallable(object):
+    """Client multi-callable wrapper: outbound call uses remaining time of the incoming call and is cancelled
+        with it (blocking unary calls are sent as futures to be cancellable).
+
+    """
+
+    def __init__(self, multi_callable, scope, margin=0.0, response_streaming=False):
+        self.multi_callable = multi_callable
+        self.scope = scope
+        self.margin = margin
+        self.response_streaming = response_streaming
+
+    def _kwargs(self, kwargs):
+        timeout = self.scope.timeout(kwargs.get("timeout"), self.margin)
+        if self.scope.cancelled or (timeout is not None and timeout <= 0):
+            raise GRPCDeadlineExceededError(self.scope.time_remaining())
+        kwargs["timeout"] = timeout
+
+        return kwargs
+
+    def __call__(self, request, *args, **kwargs):
+        kwargs = self._kwargs(kwargs)
+        if self.response_streaming:
+            return self.scope.track(self.multi_callable(request, *args, **kwargs))
+
+        return self.scope.track(self.multi_callable.future(request, *args, **kwargs)).result()
+
+    def with_call(self, request, *args, **kwargs):
+        future = self.scope.track(self.multi_callable.future(request, *args, **self._kwargs(kwargs)))
+
+        return future.result(), future
+
+    def future(self, request, *args, **kwargs):
+        return self.scope.track(self.multi_callable.future(request, *args, **self._kwargs(kwargs)))
+
+    def __getattr__(self, item):
+        return getattr(self.multi_callable, item)
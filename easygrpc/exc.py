@@ -1,3 +1,6 @@
+import grpc
+
+
 class GRPCError(BaseException):
     """gRPC global error class."""
 
@@ -12,3 +15,33 @@ class GRPCServiceError(GRPCError):
 
 class GRPCClientError(GRPCError):
     """gRPC client error: client global error."""
+
+
+class GRPCRateLimitError(GRPCClientError, grpc.RpcError):
+    """gRPC client error: request is rejected by the client rate limit (not sent)."""
+
+    def code(self):
+        return grpc.StatusCode.RESOURCE_EXHAUSTED
+
+    def details(self):
+        return "Client rate limit of '{}' is exceeded.".format(*self.args)
+
+
+class GRPCCircuitOpenError(GRPCClientError, grpc.RpcError):
+    """gRPC client error: request is rejected by the open circuit breaker (not sent)."""
+
+    def code(self):
+        return grpc.StatusCode.UNAVAILABLE
+
+    def details(self):
+        return "Circuit breaker of '{}' is open.".format(*self.args)
+
+
+class GRPCDeadlineExceededError(GRPCClientError, grpc.RpcError):
+    """gRPC client error: deadline of the incoming server call is exceeded, outbound request is not sent."""
+
+    def code(self):
+        return grpc.StatusCode.DEADLINE_EXCEEDED
+
+    def details(self):
+        return "Deadline of the incoming call is exceeded (remaining time: {}).".format(*self.args)
@@ -0,0 +1,581 @@
+import time
+import threading
+import collections
+from concurrent import futures
+
+import grpc
+
+
+class BoundedExecutor(futures.ThreadPoolExecutor):
+    """Thread pool of a service or method (bulkhead): own workers, queue limit and statistics.
+
+        grpc server runs method handler in this pool when handler behavior has "experimental_thread_pool"
+        attribute (see MethodRoute), so calls are moved to the pool without extra serialization.
+        Queue limit is checked when the call arrives (see RouteTable.service): calls over the limit are
+        rejected with RESOURCE_EXHAUSTED status and don't take workers of other pools.
+
+    """
+
+    def __init__(self, max_workers, max_queue=None, name="easygrpc"):
+        super(BoundedExecutor, self).__init__(max_workers=max_workers, thread_name_prefix=name)
+        self.name = name
+        self.max_queue = max_queue
+        self.params = dict(max_workers=max_workers, max_queue=max_queue)
+
+        # statistics
+        self._stats_lock = threading.Lock()
+        self.queued = 0
+        self.active = 0
+        self.submitted = 0
+        self.completed = 0
+        self.rejected = 0
+
+    @property
+    def max_workers(self):
+        return self._max_workers
+
+    def submit(self, fn, *args, **kwargs):
+        with self._stats_lock:
+            self.queued += 1
+            self.submitted += 1
+
+        return super(BoundedExecutor, self).submit(self._run, fn, *args, **kwargs)
+
+    def _run(self, fn, *args, **kwargs):
+        with self._stats_lock:
+            self.queued -= 1
+            self.active += 1
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._stats_lock:
+                self.active -= 1
+                self.completed += 1
+
+    def resize(self, max_workers):
+        """Change workers limit: workers are started up to the new limit on demand, started workers are kept.
+
+            :param max_workers: workers limit;
+            :type max_workers: int;
+
+            :return: int, workers limit.
+
+        """
+
+        self._max_workers = max_workers
+
+        return max_workers
+
+    def is_full(self):
+        """Check new call must be rejected: all workers are busy and queue is full.
+
+            :return: bool.
+
+        """
+
+        return self.max_queue is not None and self.queued >= self.max_queue and self.active >= self._max_workers
+
+    def reject(self):
+        """Count rejected call."""
+
+        with self._stats_lock:
+            self.rejected += 1
+
+    def stats(self):
+        """Pool statistics.
+
+            :return: dict with workers, active and queued calls, utilization (active / workers) and counters.
+
+        """
+
+        with self._stats_lock:
+            return dict(max_workers=self._max_workers, max_queue=self.max_queue, active=self.active,
+                        queued=self.queued, utilization=self.active / float(self._max_workers),
+                        submitted=self.submitted, completed=self.completed, rejected=self.rejected)
+
+    def __repr__(self):
+        return "bounded executor: {} ({} workers)".format(self.name, self._max_workers)
+
+
+def pooled(behavior, executor):
+    """Bind behavior to the executor: grpc server runs it in the executor instead of the server pool.
+
+        :param behavior: method implementation (signature like servicer method);
+        :type behavior: callable object;
+        :param executor: executor of the method;
+        :type executor: BoundedExecutor;
+
+        :return: function.
+
+    """
+
+    def pooled_behavior(request, context):
+        return behavior(request, context)
+
+    pooled_behavior.experimental_thread_pool = executor
+
+    return pooled_behavior
+
+
+PRIORITY_METADATA = "x-easygrpc-priority"
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+
+
+class _WorkItem(object):
+    """Work item of the priority executor."""
+
+    __slots__ = ("future", "fn", "args", "kwargs", "priority", "time", "shed")
+
+    def __init__(self, future, fn, args, kwargs, priority):
+        self.future = future
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.time = time.monotonic()
+        self.shed = False
+
+    def run(self):
+        if not self.future.set_running_or_notify_cancel():
+            return
+        try:
+            self.future.set_result(self.fn(*self.args, **self.kwargs))
+        except BaseException as e:
+            self.future.set_exception(e)
+
+
+class _PriorityPool(futures.ThreadPoolExecutor):
+    """Facade of the priority executor for one priority level (grpc "experimental_thread_pool")."""
+
+    def __init__(self, executor, priority):
+        super(_PriorityPool, self).__init__(max_workers=1)
+        self.executor = executor
+        self.priority = priority
+
+    def submit(self, fn, *args, **kwargs):
+        return self.executor.submit_priority(self.priority, fn, *args, **kwargs)
+
+    def shutdown(self, wait=True, **kwargs):
+        pass
+
+
+class PriorityExecutor(futures.Executor):
+    """Priority executor: replaces FIFO queue of the server thread pool with priority queues.
+
+        - Priority levels: 0 is the highest, weights define level shares (default levels: high, normal, low);
+        - Weighted-fair dequeuing (smooth weighted round robin): low priority work still progresses;
+        - Call priority comes from "x-easygrpc-priority" metadata (level or name) or method default;
+        - Queue limit: calls over max_queue are rejected, with preempt high priority call sheds the oldest
+          queued call of the lowest priority (it is aborted with RESOURCE_EXHAUSTED status).
+
+    """
+
+    def __init__(self, max_workers=10, weights=(8, 4, 1), max_queue=None, preempt=False, default_priority=1):
+        self.max_workers = max_workers
+        self.weights = tuple(weights)
+        self.max_queue = max_queue
+        self.preempt = preempt
+        self.default_priority = default_priority
+
+        self._queues = [collections.deque() for _ in self.weights]
+        self._shed = collections.deque()
+        self._current = [0] * len(self.weights)
+        self._condition = threading.Condition()
+        self._local = threading.local()
+        self._threads = []
+        self._idle = 0
+        self._shutdown = False
+        self._pools = {}
+
+        # statistics
+        self._stats = [dict(submitted=0, completed=0, rejected=0, shed=0, wait_time=0.0) for _ in self.weights]
+
+    def get_priority(self, metadata, default=None):
+        """Get call priority from the metadata.
+
+            :param metadata: invocation metadata;
+            :type metadata: tuple with (key, value);
+            :param default: method default priority;
+            :type default: int;
+
+            :return: int, priority level.
+
+        """
+
+        priority = self.default_priority if default is None else default
+        for key, value in metadata or ():
+            if key == PRIORITY_METADATA:
+                priority = PRIORITIES[value] if value in PRIORITIES else int(value) if value.isdigit() else priority
+                break
+
+        return min(max(priority, 0), len(self.weights) - 1)
+
+    def get_pool(self, priority):
+        """Get executor facade for the priority (grpc method handler "experimental_thread_pool").
+
+            :param priority: priority level;
+            :type priority: int;
+
+            :return: futures.ThreadPoolExecutor.
+
+        """
+
+        pool = self._pools.get(priority)
+        if pool is None:
+            pool = self._pools.setdefault(priority, _PriorityPool(self, priority))
+
+        return pool
+
+    def wrap(self, behavior, priority):
+        """Bind behavior to the priority level: shed calls are aborted before the behavior runs.
+
+            :param behavior: method implementation (signature like servicer method);
+            :type behavior: callable object;
+            :param priority: priority level;
+            :type priority: int;
+
+            :return: function.
+
+        """
+
+        def prioritized_behavior(request, context):
+            if getattr(self._local, "shed", False):
+                context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, "Call is preempted by higher priority calls.")
+            return behavior(request, context)
+
+        prioritized_behavior.experimental_thread_pool = self.get_pool(priority)
+
+        return prioritized_behavior
+
+    def admit(self, priority):
+        """Check call of the priority can be queued (shed lower priority call with preempt).
+
+            :param priority: priority level;
+            :type priority: int;
+
+            :return: bool.
+
+        """
+
+        with self._condition:
+            if self.max_queue is None or sum(map(len, self._queues)) < self.max_queue:
+                return True
+
+            if self.preempt:
+                for level in range(len(self._queues) - 1, priority, -1):
+                    if self._queues[level]:
+                        item = self._queues[level].popleft()
+                        item.shed = True
+                        self._shed.append(item)
+                        self._stats[level]["shed"] += 1
+                        return True
+
+            self._stats[priority]["rejected"] += 1
+            return False
+
+    def submit(self, fn, *args, **kwargs):
+        return self.submit_priority(self.default_priority, fn, *args, **kwargs)
+
+    def submit_priority(self, priority, fn, *args, **kwargs):
+        """Queue work item with priority.
+
+            :param priority: priority level;
+            :type priority: int;
+            :param fn: callable object;
+            :type fn: callable object;
+
+            :return: futures.Future.
+
+        """
+
+        future = futures.Future()
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            self._queues[priority].append(_WorkItem(future, fn, args, kwargs, priority))
+            self._stats[priority]["submitted"] += 1
+
+            # idle workers may not have woken up yet: start a worker for every item they can't take
+            queued = len(self._shed) + sum(len(queue) for queue in self._queues)
+            if queued > self._idle and len(self._threads) < self.max_workers:
+                name = "easygrpc-priority_{}".format(len(self._threads))
+                thread = threading.Thread(target=self._worker, name=name, daemon=True)
+                self._threads.append(thread)
+                thread.start()
+            self._condition.notify()
+
+        return future
+
+    def _pop(self):
+        """Get next work item: shed items first, then smooth weighted round robin of non-empty levels."""
+
+        if self._shed:
+            return self._shed.popleft()
+
+        best, total = None, 0
+        for level, queue in enumerate(self._queues):
+            if queue:
+                self._current[level] += self.weights[level]
+                total += self.weights[level]
+                if best is None or self._current[level] > self._current[best]:
+                    best = level
+        self._current[best] -= total
+
+        return self._queues[best].popleft()
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                while not self._shed and not any(self._queues) and not self._shutdown:
+                    self._idle += 1
+                    self._condition.wait()
+                    self._idle -= 1
+                if not self._shed and not any(self._queues):
+                    return
+                item = self._pop()
+                self._stats[item.priority]["wait_time"] += time.monotonic() - item.time
+
+            self._local.shed = item.shed
+            item.run()
+            with self._condition:
+                self._stats[item.priority]["completed"] += 1
+
+    def shutdown(self, wait=True, **kwargs):
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def stats(self):
+        """Priority levels statistics.
+
+            :return: dict like {priority: {weight, queued, submitted, completed, rejected, shed, avg_wait_time}}.
+
+        """
+
+        with self._condition:
+            return {level: dict(weight=self.weights[level], queued=len(self._queues[level]),
+                                submitted=stats["submitted"], completed=stats["completed"],
+                                rejected=stats["rejected"], shed=stats["shed"],
+                                avg_wait_time=stats["completed"] and stats["wait_time"] / stats["completed"])
+                    for level, stats in enumerate(self._stats)}
+
+    def __repr__(self):
+        return "priority executor: {} workers, weights {}".format(self.max_workers, self.weights)
+
+
+class ElasticExecutor(futures.Executor):
+    """Elastic server thread pool: number of workers follows the load between min_workers and max_workers.
+
+        - Every interval the controller measures average queue wait, utilization (busy time / worker time)
+          and throughput (completed calls per second);
+        - Grow: queue wait above target_wait for grow_after intervals, pool grows by half;
+        - Growth is reverted when throughput doesn't rise (CPU-bound load) and pool isn't grown for hold intervals
+          (hold doubles after every failed growth);
+        - Shrink: queue wait below half of target_wait and utilization below idle_utilization
+          for shrink_after intervals, pool shrinks by a quarter (hysteresis: no thrashing near the target);
+        - Pinned pool has fixed size (pin / unpin), sizing decisions are kept for metrics.
+
+    """
+
+    def __init__(self, min_workers=4, max_workers=64, target_wait=0.005, idle_utilization=0.5, interval=1.0,
+                 grow_after=2, shrink_after=5, hold=10, history=100):
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.target_wait = target_wait
+        self.idle_utilization = idle_utilization
+        self.interval = interval
+        self.grow_after = grow_after
+        self.shrink_after = shrink_after
+        self.hold = hold
+        self.size = min_workers
+        self.pinned = None
+        self.decisions = collections.deque(maxlen=history)
+
+        self._queue = collections.deque()
+        self._condition = threading.Condition()
+        self._threads = set()
+        self._idle = 0
+        self._active = 0
+        self._shutdown = False
+        self._controller = None
+        self._stopped = threading.Event()
+
+        # measurement window and controller state
+        self._wait_time = 0.0
+        self._waited = 0
+        self._busy_time = 0.0
+        self._completed = 0
+        self._window_start = time.monotonic()
+        self._high = 0
+        self._low = 0
+        self._hold = 0
+        self._failures = 0
+        self._trial = None
+        self.metrics = dict(avg_wait=0.0, utilization=0.0, throughput=0.0)
+
+    def submit(self, fn, *args, **kwargs):
+        future = futures.Future()
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            self._queue.append(_WorkItem(future, fn, args, kwargs, 0))
+            if len(self._queue) > self._idle and len(self._threads) < self.size:
+                self._spawn()
+            self._condition.notify()
+            if self._controller is None and self.pinned is None:
+                self._controller = threading.Thread(target=self._control, name="easygrpc-elastic", daemon=True)
+                self._controller.start()
+
+        return future
+
+    def _spawn(self):
+        thread = threading.Thread(target=self._worker, name="easygrpc-elastic_{}".format(len(self._threads)),
+                                  daemon=True)
+        self._threads.add(thread)
+        thread.start()
+
+    def _worker(self):
+        thread = threading.current_thread()
+        while True:
+            with self._condition:
+                while not self._queue and not self._shutdown and len(self._threads) <= self.size:
+                    self._idle += 1
+                    self._condition.wait()
+                    self._idle -= 1
+                if len(self._threads) > self.size or not self._queue:
+                    self._threads.discard(thread)
+                    return
+                item = self._queue.popleft()
+                started = time.monotonic()
+                self._wait_time += started - item.time
+                self._waited += 1
+                self._active += 1
+
+            item.run()
+            with self._condition:
+                self._active -= 1
+                self._busy_time += time.monotonic() - started
+                self._completed += 1
+
+    def resize(self, size, reason):
+        """Set pool size: workers are started on demand, extra workers exit when they are idle.
+
+            :param size: number of workers;
+            :type size: int;
+            :param reason: sizing decision reason (metrics);
+            :type reason: str.
+
+        """
+
+        with self._condition:
+            if size == self.size:
+                return
+            self.decisions.append(dict(time=time.time(), size=size, previous=self.size, reason=reason,
+                                       **self.metrics))
+            self.size = size
+            while len(self._threads) < min(size, len(self._queue) + self._active):
+                self._spawn()
+            self._condition.notify_all()
+
+    def pin(self, size):
+        """Pin pool to the fixed size (controller doesn't change it).
+
+            :param size: number of workers;
+            :type size: int.
+
+        """
+
+        self.pinned = size
+        self.resize(size, "pinned")
+
+    def unpin(self):
+        """Return pool sizing to the controller."""
+
+        self.pinned = None
+        with self._condition:
+            if self._controller is None:
+                self._controller = threading.Thread(target=self._control, name="easygrpc-elastic", daemon=True)
+                self._controller.start()
+
+    def _control(self):
+        while not self._stopped.wait(self.interval):
+            if self.pinned is None:
+                self.adjust()
+
+    def adjust(self):
+        """Measure the last interval and resize the pool (controller step).
+
+            :return: int, pool size.
+
+        """
+
+        with self._condition:
+            now = time.monotonic()
+            elapsed = max(now - self._window_start, 1e-6)
+            avg_wait = self._wait_time / self._waited if self._waited else 0.0
+            utilization = min(self._busy_time / (elapsed * max(len(self._threads), 1)), 1.0)
+            throughput = self._completed / elapsed
+            backlog = len(self._queue)
+            self._wait_time, self._waited, self._busy_time, self._completed = 0.0, 0, 0.0, 0
+            self._window_start = now
+            self.metrics = dict(avg_wait=avg_wait, utilization=utilization, throughput=throughput)
+
+        size = self.size
+
+        # growth trial: keep new size only when throughput rises
+        if self._trial is not None:
+            previous_size, previous_throughput = self._trial
+            self._trial = None
+            if throughput < previous_throughput * 1.05 and previous_size < size:
+                # repeated failed growth: hold period doubles
+                self._failures += 1
+                self._hold = self.hold * 2 ** min(self._failures - 1, 5)
+                self.resize(previous_size, "no throughput gain")
+                return self.size
+            self._failures = 0
+
+        if self._hold:
+            self._hold -= 1
+
+        saturated = avg_wait > self.target_wait or (backlog and not self._idle)
+        self._high = self._high + 1 if saturated else 0
+        self._low = self._low + 1 if avg_wait < self.target_wait / 2 and utilization < self.idle_utilization else 0
+
+        if self._high >= self.grow_after and not self._hold and size < self.max_workers:
+            self._high = 0
+            self._trial = size, throughput
+            self.resize(min(self.max_workers, size + max(1, size // 2)), "queue wait")
+        elif self._low >= self.shrink_after and size > self.min_workers:
+            self._low = 0
+            self.resize(max(self.min_workers, size - max(1, size // 4)), "low utilization")
+
+        return self.size
+
+    def shutdown(self, wait=True, **kwargs):
+        self._stopped.set()
+        with self._condition:
+            self._shutdown = True
+            threads = list(self._threads)
+            self._condition.notify_all()
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def stats(self):
+        """Pool sizing metrics.
+
+            :return: dict with size, bounds, workers, active and queued calls, the last interval metrics
+                (avg_wait, utilization, throughput) and the last sizing decisions.
+
+        """
+
+        with self._condition:
+            return dict(size=self.size, min_workers=self.min_workers, max_workers=self.max_workers,
+                        pinned=self.pinned, workers=len(self._threads), active=self._active,
+                        queued=len(self._queue), decisions=list(self.decisions), **self.metrics)
+
+    def __repr__(self):
+        return "elastic executor: {} workers ({}..{})".format(self.size, self.min_workers, self.max_workers)
@@ -0,0 +1,564 @@
+import time
+import threading
+import contextvars
+import collections
+from six.moves import queue
+
+import grpc
+
+INPROC_PREFIX = "inproc:"
+MAX_BUFFERED = 32  # responses of the stream produced in the thread pool ahead of the client
+POLL_INTERVAL = 0.1
+
+# started in-process servers: {name: InprocServer}
+_servers = {}
+_servers_lock = threading.Lock()
+_END = object()
+
+
+def is_inproc(address):
+    """Check address of the in-process server like "inproc:name".
+
+        :param address: server address;
+        :type address: str;
+
+        :return: bool.
+
+    """
+
+    return bool(address) and address.startswith(INPROC_PREFIX)
+
+
+class _HandlerCallDetails(collections.namedtuple("_HandlerCallDetails", ("method", "invocation_metadata")),
+                          grpc.HandlerCallDetails):
+    pass
+
+
+class InprocAbort(Exception):
+    """Call aborted by the handler (grpc.ServicerContext.abort)."""
+
+
+def _transfer(serializer, deserializer, copy_messages):
+    """Create message transfer function from sender to receiver.
+        Proto message is copied when receiver deserializer is "FromString" of the message class (copy_messages),
+        otherwise message is serialized and deserialized (codecs of both sides are kept).
+
+        :param serializer: sender serializer (None: bytes);
+        :type serializer: callable object;
+        :param deserializer: receiver deserializer (None: bytes);
+        :type deserializer: callable object;
+        :param copy_messages: copy messages instead of serialization;
+        :type copy_messages: bool;
+
+        :return: function.
+
+    """
+
+    message_class = copy_messages and getattr(deserializer, "__self__", None)
+
+    def transfer(value):
+        if message_class and type(value) is message_class:
+            message = message_class()
+            message.CopyFrom(value)
+            return message
+        data = value if serializer is None else serializer(value)
+        return data if deserializer is None else deserializer(data)
+
+    return transfer
+
+
+class InprocCall(grpc.RpcError, grpc.Call, grpc.Future):
+    """Client side of the in-process call: status, metadata, result or response stream.
+        Failed call is raised as grpc.RpcError like grpc channel calls.
+
+    """
+
+    def __init__(self, method, metadata=None, timeout=None):
+        self.method = method
+        self.metadata = tuple(tuple(item) for item in metadata or ())
+        self.deadline = None if timeout is None else time.monotonic() + timeout
+        self._code = None
+        self._details = None
+        self._initial_metadata = ()
+        self._trailing_metadata = ()
+        self._result = None
+        self._responses = None
+        self._run = None
+        self._queue = None
+        self._slots = None
+        self._callbacks = []
+        self._done_callbacks = []
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    def terminate(self, code, details=None):
+        """Terminate the call (the first status wins): wake up waiting client and run callbacks.
+
+            :param code: call status code;
+            :type code: grpc.StatusCode;
+            :param details: status details;
+            :type details: str;
+
+            :return: bool, False when the call is already terminated.
+
+        """
+
+        with self._lock:
+            if self._done.is_set():
+                return False
+            self._code, self._details = code, details
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+            done_callbacks, self._done_callbacks = self._done_callbacks, []
+
+        if self._queue is not None:
+            self._queue.put(_END)
+        for callback in callbacks:
+            callback()
+        for callback in done_callbacks:
+            callback(self)
+
+        return True
+
+    def _expire(self):
+        return self.terminate(grpc.StatusCode.DEADLINE_EXCEEDED, "Deadline Exceeded")
+
+    # grpc.Call
+    def initial_metadata(self):
+        return self._initial_metadata
+
+    def trailing_metadata(self):
+        return self._trailing_metadata
+
+    def code(self):
+        return self._code
+
+    def details(self):
+        return self._details
+
+    def is_active(self):
+        return not self._done.is_set()
+
+    def time_remaining(self):
+        return None if self.deadline is None else max(self.deadline - time.monotonic(), 0)
+
+    def cancel(self):
+        return self.terminate(grpc.StatusCode.CANCELLED, "Locally cancelled by application!")
+
+    def add_callback(self, callback):
+        with self._lock:
+            if self._done.is_set():
+                return False
+            self._callbacks.append(callback)
+            return True
+
+    # grpc.Future
+    def cancelled(self):
+        return self._code == grpc.StatusCode.CANCELLED
+
+    def running(self):
+        return not self._done.is_set()
+
+    def done(self):
+        return self._done.is_set()
+
+    def _wait(self, timeout=None):
+        end = None if timeout is None else time.monotonic() + timeout
+        while not self._done.is_set():
+            now = time.monotonic()
+            if self.deadline is not None and now >= self.deadline:
+                self._expire()
+                break
+            if end is not None and now >= end:
+                raise grpc.FutureTimeoutError()
+            waits = [limit - now for limit in (self.deadline, end) if limit is not None]
+            self._done.wait(min(waits) if waits else None)
+
+    def result(self, timeout=None):
+        self._wait(timeout)
+        if self._code != grpc.StatusCode.OK:
+            raise self
+        return self._result
+
+    def exception(self, timeout=None):
+        self._wait(timeout)
+        return None if self._code == grpc.StatusCode.OK else self
+
+    def traceback(self, timeout=None):
+        self._wait(timeout)
+        return None
+
+    def add_done_callback(self, fn):
+        with self._lock:
+            if not self._done.is_set():
+                self._done_callbacks.append(fn)
+                return
+        fn(self)
+
+    # response stream
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._queue is not None:
+            try:
+                response = self._queue.get(timeout=self.time_remaining())
+            except queue.Empty:
+                self._expire()
+                raise self
+            if response is not _END:
+                self._slots.release()
+        elif self._done.is_set():
+            response = _END
+        elif self.deadline is not None and time.monotonic() >= self.deadline:
+            self._expire()
+            raise self
+        else:
+            response = self._run(next, self._responses, _END)
+
+        if response is _END:
+            if self._code != grpc.StatusCode.OK:
+                raise self
+            raise StopIteration()
+
+        return response
+
+    next = __next__
+
+    def __str__(self):
+        return "<InprocCall of RPC that terminated with:\n\tstatus = {}\n\tdetails = \"{}\"\n>".format(
+            self._code, self._details)
+
+    __repr__ = __str__
+
+
+class InprocContext(grpc.ServicerContext):
+    """Server call context of the in-process call."""
+
+    def __init__(self, call, peer):
+        self._call = call
+        self._peer = peer
+        self._code = None
+        self._details = None
+
+    def invocation_metadata(self):
+        return self._call.metadata
+
+    def peer(self):
+        return self._peer
+
+    def peer_identities(self):
+        return None
+
+    def peer_identity_key(self):
+        return None
+
+    def auth_context(self):
+        return {}
+
+    def set_compression(self, compression):
+        pass
+
+    def disable_next_message_compression(self):
+        pass
+
+    def send_initial_metadata(self, initial_metadata):
+        self._call._initial_metadata = tuple(initial_metadata)
+
+    def set_trailing_metadata(self, trailing_metadata):
+        self._call._trailing_metadata = tuple(trailing_metadata)
+
+    def trailing_metadata(self):
+        return self._call._trailing_metadata
+
+    def abort(self, code, details):
+        if code == grpc.StatusCode.OK:
+            code, details = grpc.StatusCode.UNKNOWN, "Abort with OK status."
+        self._code, self._details = code, details
+        raise InprocAbort(code, details)
+
+    def abort_with_status(self, status):
+        self.set_trailing_metadata(status.trailing_metadata or ())
+        self.abort(status.code, status.details)
+
+    def set_code(self, code):
+        self._code = code
+
+    def set_details(self, details):
+        self._details = details
+
+    def code(self):
+        return self._code
+
+    def details(self):
+        return self._details
+
+    def is_active(self):
+        return self._call.is_active()
+
+    def time_remaining(self):
+        return self._call.time_remaining()
+
+    def cancel(self):
+        self._call.cancel()
+
+    def add_callback(self, callback):
+        return self._call.add_callback(callback)
+
+    def finish(self):
+        """Terminate the call with the status set by the handler."""
+
+        code = self._code or grpc.StatusCode.OK
+        self._call.terminate(code, self._details)
+
+    def fail(self, error):
+        """Terminate the call: handler raised the error.
+
+            :param error: handler error;
+            :type error: Exception.
+
+        """
+
+        if isinstance(error, InprocAbort):
+            self._call.terminate(self._code, self._details)
+        else:
+            self._call.terminate(grpc.StatusCode.UNKNOWN, "Exception calling application: {}".format(error))
+
+
+class InprocServer(object):
+    """In-process server (grpc.Server interface): clients with "inproc:name" address call route handlers
+        of the server directly, without sockets and HTTP/2.
+
+        - Method handlers are found by the generic handlers (route table) like in grpc server;
+        - Unary calls without deadline run in the calling thread, calls with deadline, futures, request-response
+          streams and methods with own thread pool run in the thread pool;
+        - Response stream produced in the thread pool is at most MAX_BUFFERED responses ahead of the client;
+        - Messages are serialized by both sides codecs or copied (see InprocChannel copy_messages).
+
+    """
+
+    def __init__(self, thread_pool):
+        self.thread_pool = thread_pool
+        self.name = None
+        self._generic_handlers = []
+
+    def add_generic_rpc_handlers(self, generic_rpc_handlers):
+        self._generic_handlers.extend(generic_rpc_handlers)
+
+    def add_insecure_port(self, address):
+        self.name = address[len(INPROC_PREFIX):] if is_inproc(address) else address
+        return 0
+
+    def add_secure_port(self, address, server_credentials):
+        return self.add_insecure_port(address)
+
+    def start(self):
+        with _servers_lock:
+            if _servers.get(self.name, self) is not self:
+                raise grpc.RpcError("In-process server '{}' is already started.".format(self.name))
+            _servers[self.name] = self
+
+    def stop(self, grace):
+        with _servers_lock:
+            if _servers.get(self.name) is self:
+                _servers.pop(self.name)
+        event = threading.Event()
+        event.set()
+
+        return event
+
+    def wait_for_termination(self, timeout=None):
+        while timeout is None or timeout > 0:
+            if _servers.get(self.name) is not self:
+                return True
+            time.sleep(0.1)
+            timeout = None if timeout is None else timeout - 0.1
+        return False
+
+    def get_handler(self, method, metadata):
+        details = _HandlerCallDetails(method, metadata)
+        for generic_handler in self._generic_handlers:
+            handler = generic_handler.service(details)
+            if handler is not None:
+                return handler
+
+        return None
+
+    def invoke(self, call, request, request_transfer, response_transfer, block, peer=None):
+        """Run the call: find method handler and run it inline or in the thread pool.
+
+            :param call: client call;
+            :type call: InprocCall;
+            :param request: request message or request iterator;
+            :type request: object;
+            :param request_transfer: function (client request serializer, handler request deserializer);
+            :type request_transfer: tuple;
+            :param response_transfer: function (handler response serializer, client response deserializer);
+            :type response_transfer: tuple;
+            :param block: client waits for the unary response;
+            :type block: bool;
+            :param peer: peer of the call context (default: "inproc:name");
+            :type peer: str.
+
+        """
+
+        handler = self.get_handler(call.method, call.metadata)
+        if handler is None:
+            call.terminate(grpc.StatusCode.UNIMPLEMENTED, "Method not found!")
+            return
+
+        behavior = getattr(handler, ("stream_" if handler.request_streaming else "unary_") + (
+            "stream" if handler.response_streaming else "unary"))
+        to_request = _transfer(request_transfer[0], handler.request_deserializer, request_transfer[2])
+        to_response = _transfer(handler.response_serializer, response_transfer[1], response_transfer[2])
+        context = InprocContext(call, peer or "{}{}".format(INPROC_PREFIX, self.name))
+        pool = getattr(behavior, "experimental_thread_pool", None)
+        run = contextvars.Context().run
+
+        def request_in():
+            if handler.request_streaming:
+                return (to_request(item) for item in request)
+            return to_request(request)
+
+        def unary():
+            try:
+                call._result = to_response(behavior(request_in(), context))
+            except Exception as e:
+                context.fail(e)
+            else:
+                context.finish()
+
+        def stream():
+            try:
+                for response in behavior(request_in(), context):
+                    if not call.is_active():
+                        return
+                    yield to_response(response)
+            except Exception as e:
+                context.fail(e)
+            else:
+                context.finish()
+
+        def pump():
+            # producer waits for the client when MAX_BUFFERED responses are not read
+            for response in stream():
+                while not call._slots.acquire(timeout=POLL_INTERVAL):
+                    if not call.is_active():
+                        return
+                call._queue.put(response)
+
+        try:
+            if not handler.response_streaming:
+                if block and pool is None and call.deadline is None:
+                    run(unary)
+                else:
+                    (pool or self.thread_pool).submit(run, unary)
+            elif handler.request_streaming or pool is not None:
+                call._queue, call._slots = queue.Queue(), threading.Semaphore(MAX_BUFFERED)
+                (pool or self.thread_pool).submit(run, pump)
+            else:
+                call._run, call._responses = run, stream()
+        except RuntimeError as e:
+            call.terminate(grpc.StatusCode.UNAVAILABLE, "In-process server is stopped: {}".format(e))
+
+    def __repr__(self):
+        return "in-process server: {}".format(self.name)
+
+
+class _InprocMultiCallable(object):
+
+    def __init__(self, channel, method, request_serializer=None, response_deserializer=None):
+        self.channel = channel
+        self.method = method if isinstance(method, str) else method.decode()
+        self.request_transfer = request_serializer, None, channel.copy_messages
+        self.response_transfer = None, response_deserializer, channel.copy_messages
+
+    def _start(self, request, timeout=None, metadata=None, credentials=None, wait_for_ready=None, compression=None,
+               block=False):
+        call = InprocCall(self.method, metadata, timeout)
+        server = _servers.get(self.channel.name)
+        if server is None:
+            call.terminate(grpc.StatusCode.UNAVAILABLE, "In-process server '{}' is not started.".format(
+                self.channel.name))
+        else:
+            server.invoke(call, request, self.request_transfer, self.response_transfer, block)
+
+        return call
+
+    def _with_call(self, request, *args, **kwargs):
+        call = self._start(request, *args, block=True, **kwargs)
+
+        return call.result(), call
+
+
+class _InprocUnaryUnary(_InprocMultiCallable, grpc.UnaryUnaryMultiCallable):
+
+    def __call__(self, request, *args, **kwargs):
+        return self._with_call(request, *args, **kwargs)[0]
+
+    def with_call(self, request, *args, **kwargs):
+        return self._with_call(request, *args, **kwargs)
+
+    def future(self, request, *args, **kwargs):
+        return self._start(request, *args, **kwargs)
+
+
+class _InprocStreamUnary(_InprocMultiCallable, grpc.StreamUnaryMultiCallable):
+
+    def __call__(self, request_iterator, *args, **kwargs):
+        return self._with_call(request_iterator, *args, **kwargs)[0]
+
+    def with_call(self, request_iterator, *args, **kwargs):
+        return self._with_call(request_iterator, *args, **kwargs)
+
+    def future(self, request_iterator, *args, **kwargs):
+        return self._start(request_iterator, *args, **kwargs)
+
+
+class _InprocUnaryStream(_InprocMultiCallable, grpc.UnaryStreamMultiCallable):
+
+    def __call__(self, request, *args, **kwargs):
+        return self._start(request, *args, **kwargs)
+
+
+class _InprocStreamStream(_InprocMultiCallable, grpc.StreamStreamMultiCallable):
+
+    def __call__(self, request_iterator, *args, **kwargs):
+        return self._start(request_iterator, *args, **kwargs)
+
+
+class InprocChannel(grpc.Channel):
+    """Channel of the in-process server like "inproc:name" (server is found on every call).
+
+        :param copy_messages: pass copies of proto messages instead of serialized messages (when both sides
+            use protobuf codec of the same message class).
+
+    """
+
+    def __init__(self, address, copy_messages=False):
+        self.name = address[len(INPROC_PREFIX):] if is_inproc(address) else address
+        self.copy_messages = copy_messages
+
+    def subscribe(self, callback, try_to_connect=False):
+        callback(grpc.ChannelConnectivity.READY)
+
+    def unsubscribe(self, callback):
+        pass
+
+    def unary_unary(self, method, request_serializer=None, response_deserializer=None, **kwargs):
+        return _InprocUnaryUnary(self, method, request_serializer, response_deserializer)
+
+    def unary_stream(self, method, request_serializer=None, response_deserializer=None, **kwargs):
+        return _InprocUnaryStream(self, method, request_serializer, response_deserializer)
+
+    def stream_unary(self, method, request_serializer=None, response_deserializer=None, **kwargs):
+        return _InprocStreamUnary(self, method, request_serializer, response_deserializer)
+
+    def stream_stream(self, method, request_serializer=None, response_deserializer=None, **kwargs):
+        return _InprocStreamStream(self, method, request_serializer, response_deserializer)
+
+    def close(self):
+        pass
+
+    def __repr__(self):
+        return "in-process channel: {}".format(self.name)
@@ -0,0 +1,542 @@
+import time
+import threading
+import collections
+
+import grpc
+
+from .exc import GRPCRateLimitError, GRPCCircuitOpenError
+
+DEFAULT_TENANT = "anonymous"
+BREAKER_ERROR_CODES = (
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.DEADLINE_EXCEEDED,
+    grpc.StatusCode.RESOURCE_EXHAUSTED,
+    grpc.StatusCode.INTERNAL,
+    grpc.StatusCode.UNKNOWN,
+)
+
+
+class TokenBucket(object):
+    """Token bucket: rate tokens per second, at most burst tokens are saved."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or max(rate, 1))
+        self.tokens = self.burst
+        self.time = time.monotonic()
+
+    def take(self, tokens=1):
+        """Take tokens (bucket is refilled on access).
+
+            :param tokens: number of tokens;
+            :type tokens: float;
+
+            :return: bool, tokens are taken.
+
+        """
+
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.time) * self.rate)
+        self.time = now
+        if self.tokens < tokens:
+            return False
+
+        self.tokens -= tokens
+        return True
+
+    def __repr__(self):
+        return "token bucket: {}/s, burst {}".format(self.rate, self.burst)
+
+
+class TenantState(object):
+    """Tenant usage: token bucket, active calls and counters."""
+
+    __slots__ = ("bucket", "active", "calls", "rejected", "deprioritized")
+
+    def __init__(self, bucket=None):
+        self.bucket = bucket
+        self.active = 0
+        self.calls = 0
+        self.rejected = 0
+        self.deprioritized = 0
+
+    def as_dict(self):
+        return dict(active=self.active, calls=self.calls, rejected=self.rejected, deprioritized=self.deprioritized,
+                    tokens=self.bucket and self.bucket.tokens)
+
+
+class TenantQuota(object):
+    """Per-tenant fair-share quota of the server calls.
+
+        - Tenant identity: "peer" (client host), "principal" (authenticated peer identity), metadata key
+          or callable object: context --> tenant name;
+        - Every tenant gets max_concurrency active calls and token bucket rate (calls per second);
+        - Excess calls are rejected with RESOURCE_EXHAUSTED status; with action "deprioritize" calls over
+          the rate get the lowest priority of the server scheduler instead (tenant identity must be a metadata
+          key, see GRPCServer.set_scheduler), calls over max_concurrency are still rejected, calls of routes
+          which don't run in the scheduler (no scheduler or own thread pool) over the rate are rejected;
+        - At most max_tenants tenants are tracked (least recently used tenant is removed).
+
+    """
+
+    def __init__(self, identity="peer", rate=None, burst=None, max_concurrency=None, max_tenants=10000,
+                 action="reject"):
+        self.identity = identity
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.max_tenants = max_tenants
+        self.action = action
+        self._tenants = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def deprioritize(self):
+        return self.action == "deprioritize" and isinstance(self.identity, str) \
+            and self.identity not in ("peer", "principal")
+
+    def update(self, rate=None, burst=None, max_concurrency=None):
+        """Change quota of all tenants at runtime (token buckets of known tenants are updated).
+
+            :param rate: calls per second of every tenant;
+            :type rate: float;
+            :param burst: token bucket size;
+            :type burst: float;
+            :param max_concurrency: active calls of every tenant;
+            :type max_concurrency: int.
+
+        """
+
+        with self._lock:
+            self.rate = rate if rate is not None else self.rate
+            self.burst = burst if burst is not None else self.burst
+            self.max_concurrency = max_concurrency if max_concurrency is not None else self.max_concurrency
+            for state in self._tenants.values():
+                if self.rate is None:
+                    continue
+                if state.bucket is None:
+                    state.bucket = TokenBucket(self.rate, self.burst)
+                else:
+                    state.bucket.rate = float(self.rate)
+                    state.bucket.burst = float(self.burst or max(self.rate, 1))
+                    state.bucket.tokens = min(state.bucket.tokens, state.bucket.burst)
+
+    def get_tenant(self, context=None, metadata=None):
+        """Get tenant name of the call.
+
+            :param context: call context;
+            :type context: grpc.ServicerContext;
+            :param metadata: invocation metadata (used when context is None);
+            :type metadata: tuple with (key, value);
+
+            :return: str.
+
+        """
+
+        if callable(self.identity):
+            return self.identity(context) or DEFAULT_TENANT
+
+        if self.identity == "peer":
+            return context.peer().rsplit(":", 1)[0] or DEFAULT_TENANT
+
+        if self.identity == "principal":
+            identities = context.peer_identities()
+            return identities[0].decode("utf-8") if identities else DEFAULT_TENANT
+
+        for key, value in (context.invocation_metadata() if context is not None else metadata) or ():
+            if key == self.identity:
+                return value
+
+        return DEFAULT_TENANT
+
+    def _get_state(self, tenant):
+        """Get tenant state, tenant becomes the most recently used one (lock must be held)."""
+
+        state = self._tenants.get(tenant)
+        if state is None:
+            if len(self._tenants) >= self.max_tenants:
+                self._tenants.popitem(last=False)
+            state = self._tenants[tenant] = TenantState(TokenBucket(self.rate, self.burst) if self.rate is not None else None)
+        else:
+            self._tenants.move_to_end(tenant)
+
+        return state
+
+    def check_rate(self, metadata):
+        """Check tenant rate before the call is queued (deprioritize action).
+
+            :param metadata: invocation metadata;
+            :type metadata: tuple with (key, value);
+
+            :return: bool, call is in the tenant rate.
+
+        """
+
+        with self._lock:
+            state = self._get_state(self.get_tenant(metadata=metadata))
+            if state.bucket is None or state.bucket.take():
+                return True
+            state.deprioritized += 1
+
+        return False
+
+    def acquire(self, context, rate_checked=False):
+        """Start tenant call.
+
+            :param context: call context;
+            :type context: grpc.ServicerContext;
+            :param rate_checked: tenant rate was checked before the call was queued (deprioritize action);
+            :type rate_checked: bool;
+
+            :return: TenantState or None (call must be rejected).
+
+        """
+
+        tenant = self.get_tenant(context)
+        with self._lock:
+            state = self._get_state(tenant)
+            state.calls += 1
+            if (self.max_concurrency is not None and state.active >= self.max_concurrency) or \
+                    (not (self.deprioritize and rate_checked) and state.bucket is not None and
+                     not state.bucket.take()):
+                state.rejected += 1
+                return None
+            state.active += 1
+
+        return state
+
+    def release(self, state):
+        with self._lock:
+            state.active -= 1
+
+    def wrap(self, behavior, response_streaming, rate_checked=False):
+        """Wrap method behavior with the tenant quota.
+
+            :param behavior: method implementation (signature like servicer method);
+            :type behavior: callable object;
+            :param response_streaming: response streaming flag (stream call is active until it is consumed);
+            :type response_streaming: bool;
+            :param rate_checked: calls run in the server scheduler, tenant rate is checked before they are queued
+                (with deprioritize action calls over the rate aren't rejected);
+            :type rate_checked: bool;
+
+            :return: function.
+
+        """
+
+        def release_stream(state, responses):
+            try:
+                for response in responses:
+                    yield response
+            finally:
+                self.release(state)
+
+        def limited_behavior(request, context):
+            state = self.acquire(context, rate_checked)
+            if state is None:
+                context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, "Tenant quota is exceeded.")
+
+            if response_streaming:
+                try:
+                    return release_stream(state, behavior(request, context))
+                except BaseException:
+                    self.release(state)
+                    raise
+
+            try:
+                return behavior(request, context)
+            finally:
+                self.release(state)
+
+        return limited_behavior
+
+    def stats(self):
+        """Tenants usage and throttling.
+
+            :return: dict like {tenant: {active, calls, rejected, deprioritized, tokens}}.
+
+        """
+
+        with self._lock:
+            return {tenant: state.as_dict() for tenant, state in self._tenants.items()}
+
+    def __repr__(self):
+        return "tenant quota: {} ({} tenants)".format(self.identity, len(self._tenants))
+
+
+class RateLimit(object):
+    """Client rate limit: token bucket of every stub method (calls over the rate fail fast)."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def allow(self, key):
+        """Take token of the method.
+
+            :param key: method key like "StubName.MethodName";
+            :type key: str;
+
+            :return: bool.
+
+        """
+
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+                self._stats[key] = dict(allowed=0, rejected=0)
+            allowed = bucket.take()
+            self._stats[key]["allowed" if allowed else "rejected"] += 1
+
+        return allowed
+
+    def stats(self):
+        """Limiter statistics.
+
+            :return: dict like {method_key: {allowed, rejected, tokens}}.
+
+        """
+
+        with self._lock:
+            return {key: dict(stats, tokens=self._buckets[key].tokens) for key, stats in self._stats.items()}
+
+    def __repr__(self):
+        return "rate limit: {}/s".format(self.rate)
+
+
+class _BreakerState(object):
+    """Circuit breaker state of one method: state, sliding window buckets and counters."""
+
+    def __init__(self):
+        self.state = CircuitBreaker.CLOSED
+        self.opened_at = 0.0
+        self.probes = 0
+        self.buckets = collections.deque()
+        self.rejected = 0
+        self.opened = 0
+
+    def totals(self):
+        calls, errors, slow = 0, 0, 0
+        for _, bucket_calls, bucket_errors, bucket_slow in self.buckets:
+            calls, errors, slow = calls + bucket_calls, errors + bucket_errors, slow + bucket_slow
+        return calls, errors, slow
+
+
+class CircuitBreaker(object):
+    """Client circuit breaker of every stub method.
+
+        - Closed: calls are sent, results are counted in the sliding window (window seconds, buckets parts);
+        - Open: when window has at least min_calls calls and error rate (BREAKER_ERROR_CODES) reaches error_rate
+          or rate of calls slower than latency seconds reaches slow_rate, calls fail fast for open_time seconds;
+        - Half-open: after open_time half_open_calls probe calls are sent: success closes the breaker,
+          failure opens it again.
+
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, error_rate=0.5, latency=None, slow_rate=0.5, window=10.0, buckets=10, min_calls=20,
+                 open_time=5.0, half_open_calls=1, error_codes=BREAKER_ERROR_CODES):
+        self.error_rate = error_rate
+        self.latency = latency
+        self.slow_rate = slow_rate
+        self.window = window
+        self.bucket_time = window / buckets
+        self.min_calls = min_calls
+        self.open_time = open_time
+        self.half_open_calls = half_open_calls
+        self.error_codes = frozenset(error_codes)
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def _get_state(self, key):
+        state = self._states.get(key)
+        if state is None:
+            state = self._states.setdefault(key, _BreakerState())
+        return state
+
+    def allow(self, key):
+        """Check call of the method can be sent.
+
+            :param key: method key like "StubName.MethodName";
+            :type key: str;
+
+            :return: bool.
+
+        """
+
+        with self._lock:
+            state = self._get_state(key)
+            if state.state == self.OPEN and time.monotonic() - state.opened_at >= self.open_time:
+                state.state, state.probes = self.HALF_OPEN, 0
+            if state.state == self.CLOSED:
+                return True
+            if state.state == self.HALF_OPEN and state.probes < self.half_open_calls:
+                state.probes += 1
+                return True
+
+            state.rejected += 1
+            return False
+
+    def cancel(self, key):
+        """Call admitted by allow isn't sent: give back half-open probe.
+
+            :param key: method key like "StubName.MethodName";
+            :type key: str.
+
+        """
+
+        with self._lock:
+            state = self._get_state(key)
+            if state.state == self.HALF_OPEN and state.probes:
+                state.probes -= 1
+
+    def record(self, key, code, latency):
+        """Record call result.
+
+            :param key: method key like "StubName.MethodName";
+            :type key: str;
+            :param code: call status code;
+            :type code: grpc.StatusCode;
+            :param latency: call time in seconds;
+            :type latency: float.
+
+        """
+
+        failed = code in self.error_codes
+        slow = self.latency is not None and latency >= self.latency
+        now = time.monotonic()
+        with self._lock:
+            state = self._get_state(key)
+
+            # half-open probe result
+            if state.state == self.HALF_OPEN:
+                if failed or slow:
+                    state.state, state.opened_at = self.OPEN, now
+                    state.opened += 1
+                else:
+                    state.state = self.CLOSED
+                    state.buckets.clear()
+                return
+
+            # sliding window
+            while state.buckets and now - state.buckets[0][0] >= self.window:
+                state.buckets.popleft()
+            if not state.buckets or now - state.buckets[-1][0] >= self.bucket_time:
+                state.buckets.append([now, 0, 0, 0])
+            bucket = state.buckets[-1]
+            bucket[1] += 1
+            bucket[2] += failed
+            bucket[3] += slow
+
+            calls, errors, slow_calls = state.totals()
+            if state.state == self.CLOSED and calls >= self.min_calls and (
+                    errors >= self.error_rate * calls or (self.latency is not None and
+                                                          slow_calls >= self.slow_rate * calls)):
+                state.state, state.opened_at = self.OPEN, now
+                state.opened += 1
+
+    def state(self, key):
+        """Get breaker state of the method.
+
+            :param key: method key like "StubName.MethodName";
+            :type key: str;
+
+            :return: str: closed, open or half_open.
+
+        """
+
+        with self._lock:
+            return self._get_state(key).state
+
+    def stats(self):
+        """Breaker statistics.
+
+            :return: dict like {method_key: {state, calls, errors, slow, rejected, opened}} (window counters).
+
+        """
+
+        with self._lock:
+            result = {}
+            for key, state in self._states.items():
+                calls, errors, slow = state.totals()
+                result[key] = dict(state=state.state, calls=calls, errors=errors, slow=slow,
+                                   rejected=state.rejected, opened=state.opened)
+            return result
+
+    def __repr__(self):
+        return "circuit breaker: error rate {}, latency {}".format(self.error_rate, self.latency)
+
+
+class LimitedCallable(object):
+    """Client multi-callable wrapper: rate limit and circuit breaker of the stub method."""
+
+    def __init__(self, multi_callable, key, rate_limit=None, breaker=None):
+        self.multi_callable = multi_callable
+        self.key = key
+        self.rate_limit = rate_limit
+        self.breaker = breaker
+        self.response_streaming = isinstance(multi_callable, (grpc.UnaryStreamMultiCallable,
+                                                              grpc.StreamStreamMultiCallable))
+
+    def _admit(self):
+        # open breaker rejects calls without taking rate tokens
+        if self.breaker is not None and not self.breaker.allow(self.key):
+            raise GRPCCircuitOpenError(self.key)
+        if self.rate_limit is not None and not self.rate_limit.allow(self.key):
+            if self.breaker is not None:
+                self.breaker.cancel(self.key)
+            raise GRPCRateLimitError(self.key)
+
+        return time.monotonic()
+
+    def _record(self, code, start):
+        if self.breaker is not None:
+            self.breaker.record(self.key, code, time.monotonic() - start)
+
+    def _call(self, method, *args, **kwargs):
+        start = self._admit()
+        try:
+            result = method(*args, **kwargs)
+        except grpc.RpcError as error:
+            self._record(error.code() if hasattr(error, "code") else grpc.StatusCode.UNKNOWN, start)
+            raise
+        except Exception:
+            self._record(grpc.StatusCode.UNKNOWN, start)
+            raise
+
+        if self.breaker is not None and (self.response_streaming or method is not self.multi_callable):
+            result.add_done_callback(lambda call: self._record(call.code(), start))
+        else:
+            self._record(grpc.StatusCode.OK, start)
+
+        return result
+
+    def __call__(self, *args, **kwargs):
+        return self._call(self.multi_callable, *args, **kwargs)
+
+    def with_call(self, *args, **kwargs):
+        start = self._admit()
+        try:
+            result = self.multi_callable.with_call(*args, **kwargs)
+        except grpc.RpcError as error:
+            self._record(error.code() if hasattr(error, "code") else grpc.StatusCode.UNKNOWN, start)
+            raise
+        except Exception:
+            self._record(grpc.StatusCode.UNKNOWN, start)
+            raise
+        self._record(grpc.StatusCode.OK, start)
+
+        return result
+
+    def future(self, *args, **kwargs):
+        return self._call(self.multi_callable.future, *args, **kwargs)
+
+    def __getattr__(self, item):
+        return getattr(self.multi_callable, item)
@@ -0,0 +1,135 @@
+import json
+from importlib import import_module
+
+import six
+
+ROUTE_MANIFEST = "route_manifest.json"
+
+
+class LazyObject(object):
+    """Lazy object: import module and get object from it on first use."""
+
+    def __init__(self, module_name, name):
+        self.module_name = module_name
+        self.name = name
+        self._obj = None
+
+    def resolve(self):
+        """Import module and get object.
+
+            :return: object from module.
+
+        """
+
+        if self._obj is None:
+            self._obj = getattr(import_module(self.module_name), self.name)
+
+        return self._obj
+
+    @staticmethod
+    def unwrap(obj):
+        """Get real object from lazy object.
+
+            :param obj: lazy object or any other object;
+            :type obj: any python object;
+
+            :return: resolved object for lazy object, otherwise object itself.
+
+        """
+
+        return obj.resolve() if isinstance(obj, LazyObject) else obj
+
+    def __call__(self, *args, **kwargs):
+        return self.resolve()(*args, **kwargs)
+
+    def __repr__(self):
+        return "lazy object: {}.{}".format(self.module_name, self.name)
+
+
+class RouteManifest(object):
+    """Route manifest class: precomputed map of services to their modules.
+
+        Manifest is created by "grpc-admin routes" and has json format like:
+            {"services": {
+                service_name: {
+                    "proto_module": pb2 module name,
+                    "grpc_module": module name with add function and stub,
+                    "add_function": add_*Servicer_to_server function name,
+                    "stub": stub class name,
+                    "route_module": user define service module name,
+                    "route_class": user define service class name,
+                    "methods": list of method names
+                }
+            }}
+
+    """
+
+    def __init__(self, services=None):
+        self.services = services or {}
+
+    @classmethod
+    def load(cls, path):
+        """Load manifest from file.
+
+            :param path: manifest file path;
+            :type path: str;
+
+            :return: manifest instance.
+
+        """
+
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f)["services"])
+
+    def dump(self, path):
+        """Save manifest to file.
+
+            :param path: manifest file path;
+            :type path: str.
+
+        """
+
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"services": self.services}, f, indent=2, sort_keys=True)
+
+    def add_service(self, name, proto_module, grpc_module, route_module, route_class, methods):
+        """Add service to the manifest.
+
+            :param name: service name;
+            :type name: str;
+            :param proto_module: pb2 module name;
+            :type proto_module: str;
+            :param grpc_module: module name with add function and stub class;
+            :type grpc_module: str;
+            :param route_module: user define service module name;
+            :type route_module: str;
+            :param route_class: user define service class name;
+            :type route_class: str;
+            :param methods: service method names;
+            :type methods: iterable with str.
+
+        """
+
+        self.services[name] = dict(
+            proto_module=proto_module,
+            grpc_module=grpc_module,
+            add_function="add_{}Servicer_to_server".format(name),
+            stub="{}Stub".format(name),
+            route_module=route_module,
+            route_class=route_class,
+            methods=sorted(methods)
+        )
+
+    def filter(self, *names):
+        """Get manifest services.
+
+            :param names: service names (all services when names are empty);
+            :type names: tuple with str;
+
+            :return: generator: (service_name, service parameters dict).
+
+        """
+
+        for name, params in sorted(six.iteritems(self.services)):
+            if not names or name in names:
+                yield name, params
@@ -0,0 +1,423 @@
+import time
+import struct
+import threading
+import itertools
+from six.moves import queue
+
+import grpc
+
+from .executors import BoundedExecutor, pooled
+from .inproc import InprocCall, InprocServer
+
+MULTIPLEX_METHOD = "/easygrpc.Multiplex/Call"
+MAX_CONCURRENCY = 100
+MAX_STREAMS = 64
+IDLE_TIMEOUT = 60.0
+MAX_BATCH = 64
+
+_REQUEST = struct.Struct("!QdHH")  # call id, timeout (< 0: no deadline), method length, metadata count
+_METADATUM = struct.Struct("!HI")  # key length, value length
+_RESPONSE = struct.Struct("!QBI")  # call id, status code, details length
+_LENGTH = struct.Struct("!I")  # frame length in the batch
+_CODES = {code.value[0]: code for code in grpc.StatusCode}
+_END = object()
+
+
+def encode_request(call_id, method, payload, timeout=None, metadata=()):
+    """Encode logical call frame: call id, method, timeout, metadata and serialized request.
+
+        :param call_id: correlation id;
+        :type call_id: int;
+        :param method: full method path;
+        :type method: str;
+        :param payload: serialized request;
+        :type payload: bytes;
+        :param timeout: call timeout in seconds;
+        :type timeout: float;
+        :param metadata: call metadata;
+        :type metadata: tuple with (key, value);
+
+        :return: bytes.
+
+    """
+
+    method = method.encode()
+    metadata = tuple(metadata or ())
+    parts = [_REQUEST.pack(call_id, -1.0 if timeout is None else timeout, len(method), len(metadata)), method]
+    for key, value in metadata:
+        key, value = key.encode(), value if isinstance(value, bytes) else value.encode()
+        parts.extend((_METADATUM.pack(len(key), len(value)), key, value))
+    parts.append(payload)
+
+    return b"".join(parts)
+
+
+def decode_request(frame):
+    """Decode logical call frame.
+
+        :param frame: request frame;
+        :type frame: bytes;
+
+        :return: tuple (call id, method, timeout, metadata, payload).
+
+    """
+
+    call_id, timeout, method_length, count = _REQUEST.unpack_from(frame)
+    position = _REQUEST.size + method_length
+    method = frame[_REQUEST.size:position].decode()
+    metadata = []
+    for _ in range(count):
+        key_length, value_length = _METADATUM.unpack_from(frame, position)
+        position += _METADATUM.size
+        key = frame[position:position + key_length].decode()
+        value = frame[position + key_length:position + key_length + value_length]
+        metadata.append((key, value if key.endswith("-bin") else value.decode()))
+        position += key_length + value_length
+
+    return call_id, method, None if timeout < 0 else timeout, tuple(metadata), frame[position:]
+
+
+def encode_response(call_id, code, details=None, payload=b""):
+    """Encode logical call response frame: call id, status and serialized response.
+
+        :return: bytes.
+
+    """
+
+    details = (details or "").encode()
+
+    return b"".join((_RESPONSE.pack(call_id, code.value[0], len(details)), details, payload or b""))
+
+
+def decode_response(frame):
+    """Decode logical call response frame.
+
+        :param frame: response frame;
+        :type frame: bytes;
+
+        :return: tuple (call id, grpc.StatusCode, details, payload).
+
+    """
+
+    call_id, code, details_length = _RESPONSE.unpack_from(frame)
+    position = _RESPONSE.size + details_length
+
+    return call_id, _CODES[code], frame[_RESPONSE.size:position].decode() or None, frame[position:]
+
+
+def batches(frames, max_batch=MAX_BATCH):
+    """Pack queued frames into messages: all frames waiting in the queue are sent in one stream message.
+
+        :param frames: frames queue (_END: end of the stream);
+        :type frames: queue.Queue;
+        :param max_batch: maximum frames in one message;
+        :type max_batch: int;
+
+        :return: generator with bytes.
+
+    """
+
+    while True:
+        frame = frames.get()
+        if frame is _END:
+            return
+        batch = [_LENGTH.pack(len(frame)), frame]
+        while len(batch) < max_batch * 2:
+            try:
+                frame = frames.get_nowait()
+            except queue.Empty:
+                break
+            if frame is _END:
+                yield b"".join(batch)
+                return
+            batch.extend((_LENGTH.pack(len(frame)), frame))
+        yield b"".join(batch)
+
+
+def unpack(message):
+    """Get frames of the stream message.
+
+        :param message: stream message;
+        :type message: bytes;
+
+        :return: generator with bytes.
+
+    """
+
+    position, size = 0, len(message)
+    while position < size:
+        length, = _LENGTH.unpack_from(message, position)
+        position += _LENGTH.size
+        yield message[position:position + length]
+        position += length
+
+
+class Multiplexer(grpc.GenericRpcHandler):
+    """Server side of the multiplexed mode: logical unary calls of one bidi stream are run by the route handlers.
+
+        - Stream metadata is added to the metadata of every logical call;
+        - Logical calls run in the multiplexer thread pool (or the own pool of the method), at most
+          max_concurrency calls of one stream are in progress (stream reading waits);
+        - Stream takes a worker of the streams pool while it's open, so open streams don't take
+          server pool workers (streams over max_streams wait for a worker);
+        - Responses are sent as soon as calls are finished (out of order), failed call only fails its response;
+        - Frames waiting to be sent are packed into one stream message (see batches).
+
+    """
+
+    def __init__(self, generic_handlers, max_workers=10, max_concurrency=MAX_CONCURRENCY, max_streams=MAX_STREAMS):
+        self.executor = BoundedExecutor(max_workers, name="easygrpc-multiplex")
+        self.stream_executor = BoundedExecutor(max_streams, name="easygrpc-multiplex-streams")
+        self.max_concurrency = max_concurrency
+        self._server = InprocServer(self.executor)
+        self._server.add_generic_rpc_handlers(generic_handlers)
+        self._handler = grpc.stream_stream_rpc_method_handler(pooled(self._behavior, self.stream_executor))
+
+    def service(self, handler_call_details):
+        return self._handler if handler_call_details.method == MULTIPLEX_METHOD else None
+
+    def _behavior(self, request_iterator, context):
+        responses = queue.Queue()
+        slots = threading.BoundedSemaphore(self.max_concurrency)
+        stream_metadata = tuple((key, value) for key, value in context.invocation_metadata() or ())
+        peer = context.peer()
+        state = {"active": 1}
+        lock = threading.Lock()
+
+        def done():
+            with lock:
+                state["active"] -= 1
+                if not state["active"]:
+                    responses.put(_END)
+
+        def respond(call_id):
+
+            def callback(call):
+                responses.put(encode_response(call_id, call.code(), call.details(), call._result))
+                slots.release()
+                done()
+
+            return callback
+
+        def read():
+            try:
+                for message in request_iterator:
+                    for frame in unpack(message):
+                        call_id, method, timeout, metadata, payload = decode_request(frame)
+                        slots.acquire()
+                        with lock:
+                            state["active"] += 1
+                        call = InprocCall(method, stream_metadata + metadata, timeout)
+                        call.add_done_callback(respond(call_id))
+                        self._server.invoke(call, payload, (None, None, False), (None, None, False), False, peer)
+            except grpc.RpcError:
+                pass
+            finally:
+                done()
+
+        threading.Thread(target=read, name="easygrpc-multiplex", daemon=True).start()
+
+        return batches(responses)
+
+    def stats(self):
+        return dict(self.executor.stats(), streams=self.stream_executor.stats())
+
+    def __repr__(self):
+        return "multiplexer: {} workers, {} streams, {} calls per stream".format(
+            self.executor.max_workers, self.stream_executor.max_workers, self.max_concurrency)
+
+
+class _MultiplexStream(object):
+    """Client bidi stream: pending logical calls by correlation id, closed after idle_timeout without calls."""
+
+    def __init__(self, channel, idle_timeout=None):
+        self.requests = queue.Queue()
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.closed = False
+        self.idle_timeout = idle_timeout
+        self._used = time.monotonic()
+        self._timer = None
+        self.responses = channel.stream_stream(MULTIPLEX_METHOD)(batches(self.requests))
+        threading.Thread(target=self._read, name="easygrpc-multiplex", daemon=True).start()
+
+    def send(self, call_id, frame, call, deserializer):
+        with self.lock:
+            if self.closed:
+                return False
+            self.pending[call_id] = call, deserializer
+            self._used = time.monotonic()
+        call.add_done_callback(lambda _: self._done(call_id))
+        self.requests.put(frame)
+
+        return True
+
+    def _done(self, call_id):
+        with self.lock:
+            self.pending.pop(call_id, None)
+            if self.pending or self.closed or self.idle_timeout is None or self._timer is not None:
+                return
+            self._used = time.monotonic()
+            self._schedule(self.idle_timeout)
+
+    def _schedule(self, delay):
+        self._timer = threading.Timer(delay, self._close_idle)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _close_idle(self):
+        with self.lock:
+            self._timer = None
+            if self.closed or self.pending:
+                return
+            idle = time.monotonic() - self._used
+            if idle < self.idle_timeout:
+                self._schedule(self.idle_timeout - idle)
+                return
+        self.close()
+
+    def _read(self):
+        code, details = grpc.StatusCode.UNAVAILABLE, "Multiplexed stream is closed."
+        try:
+            for message in self.responses:
+                for frame in unpack(message):
+                    self._resolve(*decode_response(frame))
+        except grpc.RpcError as error:
+            code, details = error.code(), error.details()
+        finally:
+            self.close()
+            with self.lock:
+                pending, self.pending = self.pending, {}
+            for call, _ in list(pending.values()):
+                call.terminate(code, details)
+
+    def _resolve(self, call_id, code, details, payload):
+        call, deserializer = self.pending.pop(call_id, (None, None))
+        if call is None:
+            return
+        if code == grpc.StatusCode.OK:
+            try:
+                call._result = payload if deserializer is None else deserializer(payload)
+            except Exception as e:
+                code, details = grpc.StatusCode.INTERNAL, "Exception deserializing response: {}".format(e)
+        call.terminate(code, details)
+
+    def close(self):
+        with self.lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self.closed:
+                self.closed = True
+                self.requests.put(_END)
+
+
+class MultiplexClient(object):
+    """Client side of the multiplexed mode: logical unary calls are sent over one long-lived bidi stream.
+        Stream is opened on the first call and reopened after failure (pending calls fail with stream status)
+        or after idle_timeout seconds without calls (None: stream is kept until the client is closed).
+
+    """
+
+    def __init__(self, channel, idle_timeout=IDLE_TIMEOUT):
+        self.channel = channel
+        self.idle_timeout = idle_timeout
+        self._ids = itertools.count(1)
+        self._stream = None
+        self._lock = threading.Lock()
+
+    def start(self, method, payload, deserializer=None, timeout=None, metadata=None):
+        """Send logical call.
+
+            :param method: full method path;
+            :type method: str;
+            :param payload: serialized request;
+            :type payload: bytes;
+            :param deserializer: response deserializer;
+            :type deserializer: callable object;
+            :param timeout: call timeout in seconds;
+            :type timeout: float;
+            :param metadata: call metadata;
+            :type metadata: tuple with (key, value);
+
+            :return: easygrpc.inproc.InprocCall (grpc.Call and grpc.Future).
+
+        """
+
+        call = InprocCall(method, metadata, timeout)
+        call_id = next(self._ids)
+        frame = encode_request(call_id, method, payload, timeout, call.metadata)
+        while True:
+            stream = self._stream
+            if stream is None or stream.closed:
+                with self._lock:
+                    if self._stream is None or self._stream.closed:
+                        self._stream = _MultiplexStream(self.channel, self.idle_timeout)
+                    stream = self._stream
+            if stream.send(call_id, frame, call, deserializer):
+                return call
+
+    def close(self):
+        if self._stream is not None:
+            self._stream.close()
+
+
+class _MultiplexedUnaryUnary(grpc.UnaryUnaryMultiCallable):
+
+    def __init__(self, client, method, request_serializer=None, response_deserializer=None):
+        self.client = client
+        self.method = method if isinstance(method, str) else method.decode()
+        self.request_serializer = request_serializer
+        self.response_deserializer = response_deserializer
+
+    def _start(self, request, timeout=None, metadata=None, credentials=None, wait_for_ready=None, compression=None):
+        payload = request if self.request_serializer is None else self.request_serializer(request)
+
+        return self.client.start(self.method, payload, self.response_deserializer, timeout, metadata)
+
+    def __call__(self, request, *args, **kwargs):
+        return self._start(request, *args, **kwargs).result()
+
+    def with_call(self, request, *args, **kwargs):
+        call = self._start(request, *args, **kwargs)
+
+        return call.result(), call
+
+    def future(self, request, *args, **kwargs):
+        return self._start(request, *args, **kwargs)
+
+
+class MultiplexChannel(grpc.Channel):
+    """Channel wrapper: unary-unary calls are multiplexed over one bidi stream, streaming calls use the channel.
+        Server must enable multiplexed mode (GRPCServer.enable_multiplex).
+
+    """
+
+    def __init__(self, channel, idle_timeout=IDLE_TIMEOUT):
+        self.channel = channel
+        self.client = MultiplexClient(channel, idle_timeout)
+
+    def subscribe(self, callback, try_to_connect=False):
+        self.channel.subscribe(callback, try_to_connect)
+
+    def unsubscribe(self, callback):
+        self.channel.unsubscribe(callback)
+
+    def unary_unary(self, method, request_serializer=None, response_deserializer=None, **kwargs):
+        return _MultiplexedUnaryUnary(self.client, method, request_serializer, response_deserializer)
+
+    def unary_stream(self, method, request_serializer=None, response_deserializer=None, **kwargs):
+        return self.channel.unary_stream(method, request_serializer, response_deserializer, **kwargs)
+
+    def stream_unary(self, method, request_serializer=None, response_deserializer=None, **kwargs):
+        return self.channel.stream_unary(method, request_serializer, response_deserializer, **kwargs)
+
+    def stream_stream(self, method, request_serializer=None, response_deserializer=None, **kwargs):
+        return self.channel.stream_stream(method, request_serializer, response_deserializer, **kwargs)
+
+    def close(self):
+        self.client.close()
+        self.channel.close()
+
+    def __repr__(self):
+        return "multiplexed channel: {}".format(self.channel)
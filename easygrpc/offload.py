@@ -0,0 +1,207 @@
+import time
+import threading
+import multiprocessing
+from importlib import import_module
+from concurrent import futures
+from concurrent.futures.process import BrokenProcessPool
+
+import grpc
+from google.protobuf import descriptor_pool
+
+from .parser import GRPCParser
+from .context import time_remaining
+
+# worker process state: servicer instances and request classes
+_servicers = {}
+_request_classes = {}
+
+
+def cpu_bound(method):
+    """Decorator: run route method in the process pool of the server (see ProcessOffload).
+
+        Only unary-unary methods can be offloaded. Method runs in the worker process with its own servicer
+        instance and gets OffloadContext instead of grpc context.
+
+    """
+
+    method.cpu_bound = True
+
+    return method
+
+
+class OffloadAbort(Exception):
+    """Call aborted in the worker process."""
+
+    def __init__(self, code, details):
+        super(OffloadAbort, self).__init__(code, details)
+        self.code = code
+        self.details = details
+
+
+class OffloadContext(object):
+    """Call context of the worker process: metadata, deadline, trailing metadata and abort."""
+
+    def __init__(self, metadata, timeout):
+        self._metadata = metadata
+        self._deadline = timeout and time.time() + timeout
+        self.trailing_metadata = ()
+        self.code = None
+        self.details = None
+
+    def invocation_metadata(self):
+        return self._metadata
+
+    def time_remaining(self):
+        return self._deadline and max(self._deadline - time.time(), 0)
+
+    def is_active(self):
+        return True
+
+    def set_trailing_metadata(self, trailing_metadata):
+        self.trailing_metadata = tuple(trailing_metadata)
+
+    def set_code(self, code):
+        self.code = code
+
+    def set_details(self, details):
+        self.details = details
+
+    def abort(self, code, details):
+        raise OffloadAbort(code, details)
+
+
+def _get_servicer(module_name, class_name):
+    servicer = _servicers.get((module_name, class_name))
+    if servicer is None:
+        servicer = _servicers[module_name, class_name] = getattr(import_module(module_name), class_name)()
+
+    return servicer
+
+
+def _init_worker(routes):
+    """Worker process initializer: import route modules and create servicers once.
+
+        :param routes: route servicers like ((module_name, class_name), ...);
+        :type routes: tuple.
+
+    """
+
+    for module_name, class_name in routes:
+        _get_servicer(module_name, class_name)
+
+
+def _run(module_name, class_name, method_name, method_path, request, metadata, timeout):
+    """Run servicer method in the worker process: serialized request in, serialized response out.
+
+        :return: tuple (response bytes, trailing metadata, status code, details).
+
+    """
+
+    servicer = _get_servicer(module_name, class_name)
+    request_class = _request_classes.get(method_path)
+    if request_class is None:
+        method = descriptor_pool.Default().FindMethodByName(method_path[1:].replace("/", "."))
+        request_class = _request_classes[method_path] = GRPCParser.get_message_class(method.input_type)
+
+    context = OffloadContext(metadata, timeout)
+    try:
+        response = getattr(servicer, method_name)(request_class.FromString(request), context)
+    except OffloadAbort as abort:
+        return None, context.trailing_metadata, abort.code, abort.details
+
+    if context.code not in (None, grpc.StatusCode.OK):
+        return None, context.trailing_metadata, context.code, context.details
+
+    return response.SerializeToString(), context.trailing_metadata, None, None
+
+
+class ProcessOffload(object):
+    """Process pool of CPU-bound route methods.
+
+        - Request crosses the process boundary as serialized bytes, response is returned as serialized bytes
+          and sent unchanged (route uses raw codec);
+        - Worker processes import route modules and create servicers once at startup;
+        - Process pool is started on the first offloaded call, workers are spawned (forking a process
+          with running grpc threads is not safe), so route modules must be importable;
+        - Pool is restarted after a worker process dies, calls in progress fail with UNAVAILABLE status.
+
+    """
+
+    START_METHOD = "spawn"
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+        self.routes = set()
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = futures.ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context(self.START_METHOD),
+                        initializer=_init_worker,
+                        initargs=(tuple(sorted(self.routes)),)
+                    )
+        return self._executor
+
+    def behavior(self, servicer, method_name, method_path):
+        """Create thread behavior which runs servicer method in the process pool.
+
+            :param servicer: user define service instance;
+            :type servicer: service class instance;
+            :param method_name: servicer method name;
+            :type method_name: str;
+            :param method_path: full method path;
+            :type method_path: str;
+
+            :return: function: raw request --> raw response.
+
+        """
+
+        route = type(servicer).__module__, type(servicer).__name__
+        self.routes.add(route)
+
+        def offloaded(request, context):
+            executor = self.executor
+            try:
+                future = executor.submit(_run, route[0], route[1], method_name, method_path, request,
+                                         tuple((key, value) for key, value in context.invocation_metadata() or ()),
+                                         time_remaining(context))
+                context.add_callback(future.cancel)
+                response, trailing_metadata, code, details = future.result()
+            except BrokenProcessPool as error:
+                self._reset(executor)
+                context.abort(grpc.StatusCode.UNAVAILABLE, "Worker process has terminated: {}".format(error))
+            if trailing_metadata:
+                context.set_trailing_metadata(trailing_metadata)
+            if code is not None:
+                context.abort(code, details)
+
+            return response
+
+        return offloaded
+
+    def _reset(self, executor):
+        """Drop broken process pool (worker process has died): the next call starts a new pool.
+
+            :param executor: broken process pool;
+            :type executor: futures.ProcessPoolExecutor.
+
+        """
+
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def shutdown(self, wait=True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    def __repr__(self):
+        return "process offload: {} routes".format(len(self.routes))
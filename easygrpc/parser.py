@@ -1,8 +1,10 @@
+import sys
 from itertools import chain
 from collections import defaultdict
-from inspect import getmembers, isclass, isfunction
+from inspect import getmembers, isclass, isfunction, ismodule
 
 import six
+from google.protobuf import descriptor_pb2, symbol_database
 
 
 # TODO: Add parse special type
@@ -175,3 +177,64 @@ class GRPCParser(object):
         """
 
         return isfunction(obj) and obj.__name__.startswith("beta_create_")
+
+    @staticmethod
+    def find_service_descriptor(proto_py_module, service_name):
+        """Find proto service descriptor in pb2 module or in pb2 modules used by pb2_grpc module.
+
+            :param proto_py_module: proto .py module generated by gRPCio (pb2 or pb2_grpc module);
+            :type proto_py_module: import module instance;
+            :param service_name: service name;
+            :type service_name: str;
+
+            :return: google.protobuf.descriptor.ServiceDescriptor or None.
+
+        """
+
+        modules = [proto_py_module] + [obj for obj in six.itervalues(vars(proto_py_module)) if ismodule(obj)]
+        if proto_py_module.__name__.endswith("_pb2_grpc"):
+            modules.append(sys.modules.get(proto_py_module.__name__[:-len("_grpc")]))
+
+        for module in filter(None, modules):
+            services = getattr(getattr(module, "DESCRIPTOR", None), "services_by_name", {})
+            if service_name in services:
+                return services[service_name]
+
+        return None
+
+    @staticmethod
+    def get_method_streaming(method_descriptor):
+        """Get method cardinality.
+
+            :param method_descriptor: proto method descriptor;
+            :type method_descriptor: google.protobuf.descriptor.MethodDescriptor;
+
+            :return: tuple (request streaming flag, response streaming flag).
+
+        """
+
+        if hasattr(method_descriptor, "client_streaming"):
+            return method_descriptor.client_streaming, method_descriptor.server_streaming
+
+        method_proto = descriptor_pb2.MethodDescriptorProto()
+        method_descriptor.CopyToProto(method_proto)
+
+        return method_proto.client_streaming, method_proto.server_streaming
+
+    @staticmethod
+    def get_message_class(message_descriptor):
+        """Get message class by proto message descriptor.
+
+            :param message_descriptor: proto message descriptor;
+            :type message_descriptor: google.protobuf.descriptor.Descriptor;
+
+            :return: message class.
+
+        """
+
+        try:
+            from google.protobuf.message_factory import GetMessageClass
+        except ImportError:
+            return symbol_database.Default().GetSymbol(message_descriptor.full_name)
+
+        return GetMessageClass(message_descriptor)
@@ -0,0 +1,342 @@
+import time
+import itertools
+import threading
+from functools import partial
+
+import grpc
+from google.protobuf import descriptor_pool
+
+from .client import GRPCClient
+from .parser import GRPCParser
+from .context import time_remaining
+
+
+class ProxyRoute(object):
+    """Proxy route: backend address, selection rule and call statistics."""
+
+    def __init__(self, name, address, service=None, prefix=None, metadata=None):
+        self.name = name
+        self.address = address
+        self.service = service
+        self.prefix = prefix
+        self.metadata = metadata
+
+        # statistics
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.active = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    def match(self, method, metadata):
+        """Check call must be forwarded by the route.
+
+            :param method: full method path like "/package.Service/Method";
+            :type method: str;
+            :param metadata: invocation metadata;
+            :type metadata: tuple with (key, value);
+
+            :return: bool.
+
+        """
+
+        service = method.split("/")[1] if method.count("/") == 2 else ""
+        if self.service and self.service not in (service, service.split(".")[-1]):
+            return False
+        if self.prefix and not method.startswith(self.prefix):
+            return False
+        if self.metadata and tuple(self.metadata) not in [tuple(item) for item in metadata or ()]:
+            return False
+
+        return True
+
+    def begin(self):
+        with self._lock:
+            self.calls += 1
+            self.active += 1
+
+    def end(self, code, duration):
+        with self._lock:
+            self.active -= 1
+            self.errors += code is not grpc.StatusCode.OK
+            self.total_time += duration
+            self.max_time = max(self.max_time, duration)
+
+    def stats(self):
+        """Route statistics.
+
+            :return: dict with calls, errors, active calls, average and maximum call time in seconds.
+
+        """
+
+        with self._lock:
+            return dict(address=self.address, calls=self.calls, errors=self.errors, active=self.active,
+                        avg_time=self.calls and self.total_time / self.calls, max_time=self.max_time)
+
+    def __repr__(self):
+        return "proxy route: {} --> {}".format(self.name, self.address)
+
+
+class GRPCProxy(grpc.GenericRpcHandler):
+    """gRPC proxy class: forward any method to backend servers.
+
+        - Catch-all generic handler (add to server with GRPCServer.add_generic_handler);
+        - Select backend by service name, method prefix or metadata value (first matched route);
+        - Forward raw bytes (no message parsing) over pooled GRPCClient channels;
+        - Keep streaming of all cardinalities, deadlines, metadata and cancellation;
+        - Per-route statistics.
+
+        Unary methods known from the proto descriptor pool (or set_streaming) are forwarded as cheaper
+        unary calls; all other methods are forwarded as stream-stream calls.
+
+    """
+
+    client_class = GRPCClient
+    SKIP_METADATA_PREFIXES = ("grpc-", ":", "user-agent")
+
+    def __init__(self, default_address=None, channels_per_backend=1, max_message_length=None):
+        self.routes = []
+        self.channels_per_backend = channels_per_backend
+        self.max_message_length = max_message_length
+        self._clients = {}
+        self._callables = {}
+        self._streaming = {}
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+        if default_address:
+            self.add_route(default_address)
+
+    def add_route(self, address, service=None, prefix=None, metadata=None, name=None):
+        """Add backend route (routes are checked in the adding order).
+
+            :param address: backend address;
+            :type address: str;
+            :param service: service name (short or full) to forward;
+            :type service: str;
+            :param prefix: method path prefix to forward like "/package.";
+            :type prefix: str;
+            :param metadata: metadata item (key, value) to forward;
+            :type metadata: tuple;
+            :param name: route name used in statistics;
+            :type name: str;
+
+            :return: proxy instance.
+
+        """
+
+        self.routes.append(ProxyRoute(name or service or prefix or address, address, service, prefix, metadata))
+
+        return self
+
+    def select(self, method, metadata):
+        """Select backend route.
+
+            :param method: full method path;
+            :type method: str;
+            :param metadata: invocation metadata;
+            :type metadata: tuple with (key, value);
+
+            :return: ProxyRoute or None.
+
+        """
+
+        for route in self.routes:
+            if route.match(method, metadata):
+                return route
+
+        return None
+
+    def set_streaming(self, method, request_streaming, response_streaming):
+        """Set method cardinality (used for methods missing in the proto descriptor pool).
+
+            :param method: full method path;
+            :type method: str;
+            :param request_streaming: request streaming flag;
+            :type request_streaming: bool;
+            :param response_streaming: response streaming flag;
+            :type response_streaming: bool;
+
+            :return: proxy instance.
+
+        """
+
+        self._streaming[method] = request_streaming, response_streaming
+
+        return self
+
+    def get_streaming(self, method):
+        """Get method cardinality from the proto descriptor pool (stream-stream for unknown methods).
+
+            :param method: full method path;
+            :type method: str;
+
+            :return: tuple (request streaming flag, response streaming flag).
+
+        """
+
+        streaming = self._streaming.get(method)
+        if streaming is None:
+            streaming = True, True
+            try:
+                service_name, method_name = method[1:].split("/")
+                service = descriptor_pool.Default().FindServiceByName(service_name)
+                streaming = GRPCParser.get_method_streaming(service.methods_by_name[method_name])
+            except (KeyError, ValueError):
+                pass
+            self._streaming[method] = streaming
+
+        return streaming
+
+    def get_callable(self, address, method, unary=False):
+        """Get raw callable of the backend method (channels are used in turn).
+
+            :param address: backend address;
+            :type address: str;
+            :param method: full method path;
+            :type method: str;
+            :param unary: unary-unary callable flag (stream-stream callable by default);
+            :type unary: bool;
+
+            :return: grpc.UnaryUnaryMultiCallable or grpc.StreamStreamMultiCallable.
+
+        """
+
+        index = next(self._counter) % self.channels_per_backend
+        key = address, index, method, unary
+        multi_callable = self._callables.get(key)
+        if multi_callable is None:
+            with self._lock:
+                if (address, index) not in self._clients:
+                    self._clients[address, index] = self.client_class(address=address,
+                                                                      max_message_length=self.max_message_length)
+            channel = self._clients[address, index].channel
+            multi_callable = (channel.unary_unary if unary else channel.stream_stream)(method)
+            self._callables[key] = multi_callable
+
+        return multi_callable
+
+    def forward_metadata(self, metadata):
+        """Filter invocation metadata to forward.
+
+            :param metadata: invocation metadata;
+            :type metadata: tuple with (key, value);
+
+            :return: tuple with (key, value).
+
+        """
+
+        return tuple((key, value) for key, value in metadata or () if not key.startswith(self.SKIP_METADATA_PREFIXES))
+
+    def stats(self):
+        """Proxy statistics.
+
+            :return: dict like {route_name: route statistics}.
+
+        """
+
+        return {route.name: route.stats() for route in self.routes}
+
+    def service(self, handler_call_details):
+        """Find method handler (grpc.GenericRpcHandler interface): messages are not parsed.
+
+            :param handler_call_details: grpc call details;
+            :type handler_call_details: grpc.HandlerCallDetails;
+
+            :return: grpc.RpcMethodHandler or None.
+
+        """
+
+        method = handler_call_details.method
+        route = self.select(method, handler_call_details.invocation_metadata)
+        if route is None:
+            return None
+
+        if self.get_streaming(method) == (False, False):
+            return grpc.unary_unary_rpc_method_handler(partial(self._forward_unary, route, method))
+
+        return grpc.stream_stream_rpc_method_handler(partial(self._forward, route, method))
+
+    def _forward_unary(self, route, method, request, context):
+        """Forward unary call to the backend.
+
+            :param route: backend route;
+            :type route: ProxyRoute;
+            :param method: full method path;
+            :type method: str;
+            :param request: incoming raw message;
+            :type request: bytes;
+            :param context: incoming call context;
+            :type context: grpc.ServicerContext;
+
+            :return: bytes, raw response message.
+
+        """
+
+        start, code = time.perf_counter(), grpc.StatusCode.OK
+        route.begin()
+        try:
+            call = self.get_callable(route.address, method, unary=True).future(
+                request,
+                timeout=time_remaining(context),
+                metadata=self.forward_metadata(context.invocation_metadata())
+            )
+            context.add_callback(call.cancel)
+            response = call.result()
+            context.send_initial_metadata(call.initial_metadata() or ())
+            context.set_trailing_metadata(call.trailing_metadata() or ())
+            return response
+        except grpc.FutureCancelledError:
+            code = grpc.StatusCode.CANCELLED
+            context.abort(code, "Call is cancelled.")
+        except grpc.RpcError as error:
+            code = error.code()
+            context.set_trailing_metadata(error.trailing_metadata() or ())
+            context.abort(code, error.details())
+        finally:
+            route.end(code, time.perf_counter() - start)
+
+    def _forward(self, route, method, request_iterator, context):
+        """Forward call to the backend.
+
+            :param route: backend route;
+            :type route: ProxyRoute;
+            :param method: full method path;
+            :type method: str;
+            :param request_iterator: incoming raw messages;
+            :type request_iterator: iterator with bytes;
+            :param context: incoming call context;
+            :type context: grpc.ServicerContext;
+
+            :return: generator with raw response messages.
+
+        """
+
+        start, code = time.perf_counter(), grpc.StatusCode.OK
+        route.begin()
+        call = self.get_callable(route.address, method)(
+            request_iterator,
+            timeout=time_remaining(context),
+            metadata=self.forward_metadata(context.invocation_metadata())
+        )
+        context.add_callback(call.cancel)
+
+        try:
+            context.send_initial_metadata(call.initial_metadata() or ())
+            for response in call:
+                yield response
+            context.set_trailing_metadata(call.trailing_metadata() or ())
+        except grpc.RpcError as error:
+            code = error.code()
+            context.set_trailing_metadata(error.trailing_metadata() or ())
+            context.abort(code, error.details())
+        except GeneratorExit:
+            code = grpc.StatusCode.CANCELLED
+            call.cancel()
+            raise
+        finally:
+            route.end(code, time.perf_counter() - start)
+
+    def __repr__(self):
+        return "gRPC proxy: {}".format(", ".join(map(repr, self.routes)))
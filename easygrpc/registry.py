@@ -0,0 +1,77 @@
+import six
+
+
+class MethodRegistry(object):
+    """Method registry: values for service methods (method value --> service value --> default value)."""
+
+    def __init__(self, default=None):
+        self.default = default
+        self._items = {}
+
+    def register(self, value, service=None, method=None):
+        """Register value.
+
+            :param value: registered value;
+            :type value: any python object;
+            :param service: service name (default value when service is None);
+            :type service: str;
+            :param method: proto method name (service value when method is None);
+            :type method: str.
+
+        """
+
+        if service is None:
+            self.default = value
+        else:
+            self._items[service, method] = value
+
+    def unregister(self, service, method=None):
+        """Remove registered value.
+
+            :param service: service name;
+            :type service: str;
+            :param method: proto method name;
+            :type method: str.
+
+        """
+
+        self._items.pop((service, method), None)
+
+    def get(self, service, method):
+        """Get value for the service method.
+
+            :param service: service name;
+            :type service: str;
+            :param method: proto method name;
+            :type method: str;
+
+            :return: registered value.
+
+        """
+
+        value = self._items.get((service, method))
+        if value is None:
+            value = self._items.get((service, None), self.default)
+
+        return value
+
+    def has(self, service):
+        """Check service has own values.
+
+            :param service: service name;
+            :type service: str;
+
+            :return: bool.
+
+        """
+
+        return any(s_name == service for s_name, _ in self._items)
+
+    def items(self):
+        """Registered values.
+
+            :return: dict like {(service, method): value}.
+
+        """
+
+        return dict(six.iteritems(self._items))
@@ -0,0 +1,558 @@
+import time
+import inspect
+import logging
+import threading
+
+import six
+import grpc
+
+from .codec import PROTOBUF, RAW
+from .context import time_remaining, propagate
+from .executors import BoundedExecutor, pooled
+from .parser import GRPCParser
+from .manifest import LazyObject
+from .registry import MethodRegistry
+
+logger = logging.getLogger(__name__)
+
+HANDLER_BUILDERS = {
+    (False, False): grpc.unary_unary_rpc_method_handler,
+    (False, True): grpc.unary_stream_rpc_method_handler,
+    (True, False): grpc.stream_unary_rpc_method_handler,
+    (True, True): grpc.stream_stream_rpc_method_handler,
+}
+
+
+class DeadlineGuard(object):
+    """Deadline guard of the method: calls are checked when they leave the executor queue.
+
+        Call is rejected with DEADLINE_EXCEEDED without running the handler when its deadline has expired
+        or remaining time is less than the observed minimum latency of the method (unary responses).
+        Statistics: dropped calls (saved work) and late calls (handler finished after the deadline).
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.min_latency = 0.0
+        self.dropped = 0
+        self.late = 0
+        self._lock = threading.Lock()
+        self._observed = False
+
+    def wrap(self, behavior, response_streaming):
+        """Wrap method behavior with the deadline check.
+
+            :param behavior: method implementation (signature like servicer method);
+            :type behavior: callable object;
+            :param response_streaming: response streaming flag (latency is observed for unary responses);
+            :type response_streaming: bool;
+
+            :return: function.
+
+        """
+
+        def guarded_behavior(request, context):
+            remaining = time_remaining(context)
+            if remaining is None:
+                return behavior(request, context)
+
+            with self._lock:
+                expired = remaining <= self.min_latency
+                if expired:
+                    self.dropped += 1
+            if expired:
+                context.abort(grpc.StatusCode.DEADLINE_EXCEEDED, "Deadline expired before the call has started.")
+
+            if response_streaming:
+                return behavior(request, context)
+
+            start = time.perf_counter()
+            response = behavior(request, context)
+            self.observe(time.perf_counter() - start, remaining)
+
+            return response
+
+        return guarded_behavior
+
+    def observe(self, latency, remaining):
+        """Add observed handler latency.
+
+            :param latency: handler time in seconds;
+            :type latency: float;
+            :param remaining: remaining time of the call when handler started;
+            :type remaining: float.
+
+        """
+
+        with self._lock:
+            if latency > remaining:
+                self.late += 1
+            if not self._observed or latency < self.min_latency:
+                self.min_latency, self._observed = latency, True
+
+    def stats(self):
+        """Guard statistics.
+
+            :return: dict with dropped and late calls count and minimum latency in seconds.
+
+        """
+
+        with self._lock:
+            return dict(dropped=self.dropped, late=self.late, min_latency=self.min_latency)
+
+
+class _HandlerRecorder(object):
+    """Fake grpc server: record generic handlers added by generated add_*Servicer_to_server function."""
+
+    def __init__(self):
+        self.handlers = []
+
+    def add_generic_rpc_handlers(self, generic_rpc_handlers):
+        self.handlers.extend(generic_rpc_handlers)
+
+    def add_registered_method_handlers(self, service_name, method_handlers):
+        pass
+
+
+class MethodRoute(object):
+    """Method route: prebuilt grpc method handler of one proto method.
+
+        Messages are (de)serialized by the codec: raw codec doesn't parse messages,
+        behavior receives and returns serialized messages (bytes).
+        Response compression is chosen by the compression policy (easygrpc.compression.CompressionPolicy).
+        Method with executor runs in its own thread pool (easygrpc.executors.BoundedExecutor).
+        Calls with expired deadline are dropped by the deadline guard when they leave the executor queue.
+        Tenant quota (easygrpc.limits.TenantQuota) limits concurrency and rate of every caller.
+        With propagate_deadline outbound GRPCClient calls of the handler use deadline of the call
+        (see easygrpc.context).
+
+    """
+
+    def __init__(self, service_name, method_descriptor, behavior, codec=PROTOBUF, compression=None, executor=None,
+                 priority=None, deadline_guard=None, tenant_quota=None, propagate_deadline=False):
+        self.service_name = service_name
+        self.name = method_descriptor.name
+        self.path = "/{}/{}".format(method_descriptor.containing_service.full_name, method_descriptor.name)
+        self.descriptor = method_descriptor
+        self.behavior = behavior
+        self.codec = codec
+        self.compression = compression
+        self.executor = executor
+        self.priority = priority
+        self.deadline_guard = deadline_guard
+        self.tenant_quota = tenant_quota
+        self.propagate_deadline = propagate_deadline
+        self.offloaded = False
+        self._scheduled_handlers = {}
+
+        # request and response
+        self.request_streaming, self.response_streaming = GRPCParser.get_method_streaming(method_descriptor)
+        self.request_class = GRPCParser.get_message_class(method_descriptor.input_type)
+        self.response_class = GRPCParser.get_message_class(method_descriptor.output_type)
+
+        self.handler = self.build_handler(behavior)
+        self.reject_handler = None
+
+    def build_handler(self, behavior, scheduler=None, priority=None):
+        """Build grpc method handler.
+
+            :param behavior: method implementation (signature like servicer method);
+            :type behavior: callable object;
+            :param scheduler: priority executor (used for method without own thread pool);
+            :type scheduler: easygrpc.executors.PriorityExecutor;
+            :param priority: call priority level;
+            :type priority: int;
+
+            :return: grpc.RpcMethodHandler.
+
+        """
+
+        response_serializer = self.codec.serializer(self.response_class)
+        if self.propagate_deadline:
+            behavior = propagate(behavior, self.response_streaming)
+        if self.compression is not None:
+            behavior = self.compression.wrap_behavior(self.path, behavior, self.response_streaming, response_serializer)
+        if self.tenant_quota is not None:
+            behavior = self.tenant_quota.wrap(behavior, self.response_streaming,
+                                              rate_checked=self.executor is None and scheduler is not None)
+        if self.deadline_guard is not None:
+            behavior = self.deadline_guard.wrap(behavior, self.response_streaming)
+        if self.executor is not None:
+            behavior = pooled(behavior, self.executor)
+        elif scheduler is not None:
+            behavior = scheduler.wrap(behavior, priority)
+
+        return HANDLER_BUILDERS[self.request_streaming, self.response_streaming](
+            behavior,
+            request_deserializer=self.codec.deserializer(self.request_class),
+            response_serializer=response_serializer
+        )
+
+    def get_scheduled_handler(self, scheduler, priority):
+        """Get grpc method handler which runs in the priority executor with the priority (handlers are cached).
+
+            :param scheduler: server priority executor;
+            :type scheduler: easygrpc.executors.PriorityExecutor;
+            :param priority: call priority level;
+            :type priority: int;
+
+            :return: grpc.RpcMethodHandler.
+
+        """
+
+        handler = self._scheduled_handlers.get((scheduler, priority))
+        if handler is None:
+            handler = self.build_handler(self.behavior, scheduler, priority)
+            self._scheduled_handlers[scheduler, priority] = handler
+
+        return handler
+
+    def get_reject_handler(self):
+        """Get grpc method handler which rejects calls with RESOURCE_EXHAUSTED status (thread pool is full).
+
+            :return: grpc.RpcMethodHandler.
+
+        """
+
+        if self.reject_handler is None:
+            self.reject_handler = HANDLER_BUILDERS[self.request_streaming, self.response_streaming](self._reject)
+
+        return self.reject_handler
+
+    def _reject(self, request, context):
+        context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, "Thread pool of the method '{}' is full.".format(self.path))
+
+    def __repr__(self):
+        return "method route: {}".format(self.path)
+
+
+class RouteTable(grpc.GenericRpcHandler):
+    """Route table class: one generic handler for all server services.
+
+        - Build method handlers from proto service descriptors;
+        - One dict lookup from full method path to prebuilt method handler;
+        - Method aliases: proto method is implemented by servicer method with other name;
+        - Per-method overrides;
+        - Per-method message codecs (codec registry);
+        - Per-method response compression policies (compression registry);
+        - Per-service or per-method thread pools (bulkheads) with queue limits;
+        - CPU-bound methods offloaded to the process pool (easygrpc.offload.ProcessOffload);
+        - Priority scheduling of calls in the server priority executor (easygrpc.executors.PriorityExecutor);
+        - Drop calls with expired deadlines before running handlers (DeadlineGuard);
+        - Per-tenant concurrency and rate quotas (easygrpc.limits.TenantQuota);
+        - Deadline and cancellation propagation to outbound client calls (easygrpc.context);
+        - Spans with stage timings of sampled calls (easygrpc.tracing.Tracer);
+        - In-flight calls registry of the admin service (easygrpc.admin.CallRegistry);
+        - Swap service or method handlers in place (in-flight calls keep the old handlers).
+
+    """
+
+    def __init__(self, codecs=None, compression=None, offload=None, drop_expired=True, propagate_deadlines=True):
+        self.codecs = codecs or MethodRegistry(PROTOBUF)
+        self.compression = compression or MethodRegistry()
+        self.offload = offload
+        self.scheduler = None
+        self.drop_expired = drop_expired
+        self.propagate_deadlines = propagate_deadlines
+        self.tenant_quota = None
+        self.tracer = None
+        self.calls = None
+        self.executors = {}
+        self.deadline_guards = {}
+        self._routes = {}
+        self._fallback = {}
+        self._lock = threading.Lock()
+
+    @property
+    def routes(self):
+        """Actual method routes.
+
+            :return: dict like {full_method_path: MethodRoute}.
+
+        """
+
+        return dict(self._routes)
+
+    @property
+    def services(self):
+        """Active service names.
+
+            :return: tuple with str.
+
+        """
+
+        return tuple(sorted({route.service_name for route in six.itervalues(self._routes)} | set(self._fallback)))
+
+    def set_service(self, name, add_function, servicer, config=None):
+        """Add or replace service handlers.
+
+            :param name: service name;
+            :type name: str;
+            :param add_function: add_*Servicer_to_server function from proto_py module;
+            :type add_function: function;
+            :param servicer: user define service instance;
+            :type servicer: service class instance;
+            :param config: route configuration, updates servicer class attribute "route_config", keys:
+                - aliases: dict like {proto_method_name: servicer_method_name};
+                - overrides: dict like {proto_method_name: callable object};
+                - raw_methods: proto method names (True for all methods) which receive and return bytes;
+                - codecs: dict like {proto_method_name: Codec} (codec registry is used by default);
+                - compression: dict like {proto_method_name: CompressionPolicy} (compression registry by default);
+                - executor: service thread pool: BoundedExecutor or dict like {"max_workers": 4, "max_queue": 100};
+                - executors: method thread pools: dict like {proto_method_name: BoundedExecutor or dict};
+                - process_methods: unary proto method names (True for all methods) which run in the process pool
+                  (like servicer methods decorated with easygrpc.offload.cpu_bound);
+                - priority: service default priority level of the priority executor (0 is the highest);
+                - priorities: dict like {proto_method_name: priority level};
+            :type config: dict.
+
+        """
+
+        add_function, servicer = LazyObject.unwrap(add_function), LazyObject.unwrap(servicer)
+        config = dict(getattr(servicer, "route_config", {}), **(config or {}))
+        aliases, overrides = config.get("aliases") or {}, config.get("overrides") or {}
+        raw_methods, codecs = config.get("raw_methods") or (), config.get("codecs") or {}
+        compression = config.get("compression") or {}
+        executor, executors = config.get("executor"), config.get("executors") or {}
+        process_methods = config.get("process_methods") or ()
+        priority, priorities = config.get("priority"), config.get("priorities") or {}
+
+        # service without descriptor: use generated generic handler
+        service_descriptor = GRPCParser.find_service_descriptor(inspect.getmodule(add_function), name)
+        if service_descriptor is None:
+            logger.warning("Descriptor of service '%s' isn't found: route table features are not used "
+                           "(aliases, codecs, thread pools, quotas, tracing).", name)
+            recorder = _HandlerRecorder()
+            add_function(servicer, recorder)
+            self._swap(name, {}, tuple(recorder.handlers))
+            return
+
+        method_routes = {}
+        for method in service_descriptor.methods:
+            behavior = overrides.get(method.name) or getattr(servicer, aliases.get(method.name, method.name))
+            codec = codecs.get(method.name) or self.codecs.get(name, method.name)
+            if raw_methods is True or method.name in raw_methods:
+                codec = RAW
+
+            # CPU-bound method: serialized messages cross the process boundary
+            offloaded = method.name not in overrides and (process_methods is True or method.name in process_methods
+                                                          or getattr(behavior, "cpu_bound", False))
+            if offloaded:
+                if self.offload is None or GRPCParser.get_method_streaming(method) != (False, False):
+                    raise grpc.RpcError("Method '{}' of service '{}' can't run in the process pool.".format(
+                        method.name, name))
+                behavior = self.offload.behavior(servicer, aliases.get(method.name, method.name),
+                                                 "/{}/{}".format(service_descriptor.full_name, method.name))
+                codec = RAW
+            policy = compression.get(method.name) or self.compression.get(name, method.name)
+            method_executor = self.get_executor("{}.{}".format(name, method.name), executors.get(method.name)) \
+                or self.get_executor(name, executor)
+            path = "/{}/{}".format(service_descriptor.full_name, method.name)
+            method_route = MethodRoute(name, method, behavior, codec=codec, compression=policy,
+                                       executor=method_executor, priority=priorities.get(method.name, priority),
+                                       deadline_guard=self.get_deadline_guard(path),
+                                       tenant_quota=self.tenant_quota,
+                                       propagate_deadline=self.propagate_deadlines)
+            method_route.offloaded = offloaded
+            method_routes[method_route.path] = method_route
+
+        self._swap(name, method_routes)
+
+    def set_method(self, service_name, method_name, behavior):
+        """Replace one method handler.
+
+            :param service_name: service name;
+            :type service_name: str;
+            :param method_name: proto method name;
+            :type method_name: str;
+            :param behavior: method implementation (signature like servicer method);
+            :type behavior: callable object.
+
+        """
+
+        method_route = self.get_route(service_name, method_name)
+        if method_route is None:
+            raise grpc.RpcError("Can't find method '{}' of service '{}'.".format(method_name, service_name))
+
+        codec = self.codecs.get(service_name, method_name) if method_route.offloaded else method_route.codec
+        new_route = MethodRoute(service_name, method_route.descriptor, behavior, codec=codec,
+                                compression=method_route.compression, executor=method_route.executor,
+                                priority=method_route.priority, deadline_guard=method_route.deadline_guard,
+                                tenant_quota=method_route.tenant_quota,
+                                propagate_deadline=method_route.propagate_deadline)
+        with self._lock:
+            routes = dict(self._routes)
+            routes[new_route.path] = new_route
+            self._routes = routes
+
+    def get_executor(self, name, executor):
+        """Get thread pool from the route configuration (pool with the same name and parameters is reused).
+
+            :param name: pool name (service name or "service.method");
+            :type name: str;
+            :param executor: BoundedExecutor or dict with BoundedExecutor parameters (max_workers, max_queue);
+            :type executor: BoundedExecutor or dict or None;
+
+            :return: BoundedExecutor or None.
+
+        """
+
+        if executor is None or isinstance(executor, BoundedExecutor):
+            if executor is not None:
+                self.executors.setdefault(name, executor)
+            return executor
+
+        params = dict(dict(max_queue=None), **executor)
+        current = self.executors.get(name)
+        if current is None or current.params != params:
+            if current is not None:
+                current.shutdown(wait=False)
+            current = self.executors[name] = BoundedExecutor(name=name, **params)
+
+        return current
+
+    def get_deadline_guard(self, path):
+        """Get deadline guard of the method (guard statistics are kept when handlers are swapped).
+
+            :param path: full method path;
+            :type path: str;
+
+            :return: DeadlineGuard or None (drop_expired is off).
+
+        """
+
+        if not self.drop_expired:
+            return None
+
+        guard = self.deadline_guards.get(path)
+        if guard is None:
+            guard = self.deadline_guards[path] = DeadlineGuard(path)
+
+        return guard
+
+    def deadline_stats(self):
+        """Deadline guards statistics.
+
+            :return: dict like {full_method_path: {dropped, late, min_latency}}.
+
+        """
+
+        return {path: guard.stats() for path, guard in six.iteritems(self.deadline_guards)}
+
+    def executor_stats(self):
+        """Thread pools statistics.
+
+            :return: dict like {pool_name: pool statistics}.
+
+        """
+
+        return {name: executor.stats() for name, executor in six.iteritems(self.executors)}
+
+    def get_route(self, service_name, method_name):
+        """Find method route.
+
+            :param service_name: service name;
+            :type service_name: str;
+            :param method_name: proto method name;
+            :type method_name: str;
+
+            :return: MethodRoute or None.
+
+        """
+
+        for method_route in six.itervalues(self._routes):
+            if method_route.service_name == service_name and method_route.name == method_name:
+                return method_route
+
+        return None
+
+    def _get_handler(self, method_route, handler_call_details):
+        """Get method handler of the call: own thread pool, priority executor or server thread pool.
+
+            :param method_route: route of the called method;
+            :type method_route: MethodRoute;
+            :param handler_call_details: grpc call details;
+            :type handler_call_details: grpc.HandlerCallDetails;
+
+            :return: grpc.RpcMethodHandler.
+
+        """
+
+        if method_route.executor is not None:
+            if method_route.executor.is_full():
+                method_route.executor.reject()
+                return method_route.get_reject_handler()
+            return method_route.handler
+
+        # priority scheduling
+        scheduler = self.scheduler
+        if scheduler is not None:
+            priority = scheduler.get_priority(handler_call_details.invocation_metadata, method_route.priority)
+            quota = method_route.tenant_quota
+            if quota is not None and quota.deprioritize and not quota.check_rate(
+                    handler_call_details.invocation_metadata):
+                priority = len(scheduler.weights) - 1
+            if not scheduler.admit(priority):
+                return method_route.get_reject_handler()
+            return method_route.get_scheduled_handler(scheduler, priority)
+
+        return method_route.handler
+
+    def remove_service(self, name):
+        """Remove service handlers.
+
+            :param name: service name;
+            :type name: str.
+
+        """
+
+        self._swap(name, {})
+
+    def _swap(self, name, method_routes, fallback_handlers=()):
+        """Replace all handlers of the service: lookups in progress still use old dicts.
+
+            :param name: service name;
+            :type name: str;
+            :param method_routes: new method routes like {full_method_path: MethodRoute};
+            :type method_routes: dict;
+            :param fallback_handlers: generic handlers of the service without descriptor;
+            :type fallback_handlers: tuple.
+
+        """
+
+        with self._lock:
+            routes = {path: route for path, route in six.iteritems(self._routes) if route.service_name != name}
+            routes.update(method_routes)
+            fallback = {s_name: handlers for s_name, handlers in six.iteritems(self._fallback) if s_name != name}
+            if fallback_handlers:
+                fallback[name] = fallback_handlers
+
+            self._routes, self._fallback = routes, fallback
+
+    def service(self, handler_call_details):
+        """Find method handler (grpc.GenericRpcHandler interface).
+
+            :param handler_call_details: grpc call details;
+            :type handler_call_details: grpc.HandlerCallDetails;
+
+            :return: grpc.RpcMethodHandler or None.
+
+        """
+
+        method_route = self._routes.get(handler_call_details.method)
+        if method_route is not None:
+            handler = self._get_handler(method_route, handler_call_details)
+            tracer, calls = self.tracer, self.calls
+            if tracer is not None:
+                handler = tracer.trace_handler(handler, handler_call_details)
+
+            return handler if calls is None else calls.track_handler(handler, handler_call_details)
+
+        for handlers in six.itervalues(self._fallback):
+            for handler in handlers:
+                method_handler = handler.service(handler_call_details)
+                if method_handler is not None:
+                    return method_handler
+
+        return None
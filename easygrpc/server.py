@@ -2,18 +2,30 @@ import os
 import re
 import time
 import inspect
+import logging
 import operator
-from concurrent import futures
-from importlib import import_module
+from importlib import import_module, reload
 
 import six
 import grpc
 
+from .codec import PROTOBUF, PRESERIALIZED
+from .routing import RouteTable
+from .offload import ProcessOffload
+from .broadcast import BroadcastHub
+from .multiplex import MAX_CONCURRENCY, MAX_STREAMS, Multiplexer
+from .admin import AdminService, CallRegistry
+from .executors import BoundedExecutor
+from .inproc import InprocServer, is_inproc
+from .uds import UDS_PREFIX, get_uds_path, prepare_socket, remove_socket
+from .registry import MethodRegistry
+from .watcher import FileWatcher
+from .manifest import ROUTE_MANIFEST, LazyObject, RouteManifest
+
+logger = logging.getLogger(__name__)
+
 
 # TODO: Add load const from config
-# TODO: Add service methods map ("ops" --> "SendMessage")
-# TODO: Add special route class (can change server route after config)
-# TODO: Add config max_message_length
 class GRPCServer(object):
     """gRPC server class.
 
@@ -22,6 +34,13 @@ class GRPCServer(object):
         - Auto load all user define services class;
         - Parse proto_module method to find all add_service_function;
         - Auto load add_service_function and user define service class from project path;
+        - Route all calls through one route table (method aliases, overrides, swap handlers at runtime);
+        - In-process server with "inproc:name" address (easygrpc.inproc: clients in the same process);
+        - Unix domain socket alongside TCP address (uds_path): stale socket is removed, permissions are set;
+        - Broadcast hub of server streaming routes: message is serialized once for all subscribers;
+        - Multiplexed mode: logical unary calls of GRPCClient(multiplex=True) over one bidi stream;
+        - Elastic server thread pool (set_executor): number of workers follows queue wait and utilization;
+        - Admin service (enable_admin): routes, in-flight calls, statistics and live tuning without restart.
 
     """
 
@@ -31,16 +50,39 @@ class GRPCServer(object):
     PROTO_PY_FOLDER = "proto_py"
     HANDLER_SEARCH_PATTERN = "add_(?P<name>.*)Servicer_to_server"
     SERVER_TIMEOUT_SLEEP = 60 * 60 * 24
+    RELOAD_INTERVAL = 0.5
+    PROCESS_WORKERS = None
+    DROP_EXPIRED = True
+    PROPAGATE_DEADLINES = True
+    UDS_MODE = 0o660
+    ADMIN = False
+    ADMIN_TOKEN = None
 
     def __init__(self, proto_py_module=None, address="[::]:50051", max_workers=10, service_names=(),
-                 max_message_length=None):
+                 max_message_length=None, uds_path=None):
 
         # server instance
         self._route = {}
         self._server = None
+        self.port = None
+        self._modules = {}
+        self._watcher = None
+        self.codecs = MethodRegistry(PROTOBUF)
+        self.compression = MethodRegistry()
+        self.offload = ProcessOffload(self.PROCESS_WORKERS)
+        self.scheduler = None
+        self.executor = None
+        self.thread_pool = None
+        self.admin = None
+        self.hub = BroadcastHub()
+        self.multiplexer = None
+        self._route_table = RouteTable(codecs=self.codecs, compression=self.compression, offload=self.offload,
+                                       drop_expired=self.DROP_EXPIRED, propagate_deadlines=self.PROPAGATE_DEADLINES)
+        self._generic_handlers = []
         self.address = address
         self.max_workers = max_workers
         self.max_message_length = max_message_length or 4*1024*1024
+        self.uds_path = uds_path
 
         # find service add function
         if proto_py_module:
@@ -63,6 +105,16 @@ class GRPCServer(object):
         return {name: route for name, route in six.iteritems(self._route)
                 if route.get("add_function") and route.get("service")}
 
+    @property
+    def route_table(self):
+        """Server route table (one generic handler for all services).
+
+            :return: RouteTable instance.
+
+        """
+
+        return self._route_table
+
     @property
     def server(self):
         """Wrapped grpc server instance [from grpcio].
@@ -73,6 +125,16 @@ class GRPCServer(object):
 
         return self._server
 
+    @property
+    def socket_paths(self):
+        """Unix domain socket paths of the server: unix address and uds_path.
+
+            :return: tuple with str.
+
+        """
+
+        return tuple(path for path in (get_uds_path(self.address), self.uds_path) if path)
+
     @staticmethod
     def parse_proto_file(proto_py_module, pattern, *service_names):
         """Parse proto module to find Service add function use search pattern.
@@ -113,6 +175,7 @@ class GRPCServer(object):
             if s_name in self.route and self.route[s_name]["add_function"]:
                 raise grpc.RpcError("The same service name '{}' is already exists.".format(s_name))
             self._route.setdefault(s_name, {})["add_function"] = s_obj
+        self._modules[proto_py_module.__name__] = proto_py_module
 
     def from_proto_module(self, proto_py_module, *service_names):
         """Add service add function from proto pt module.
@@ -178,6 +241,7 @@ class GRPCServer(object):
 
         for s_name, s_obj in self.parser_service_file(service_module, *service_names):
             self._route.setdefault(s_name, {})["service"] = s_obj
+        self._modules[service_module.__name__] = service_module
 
     def from_module(self, service_module, *service_names):
         """Add service class from object service module.
@@ -266,6 +330,30 @@ class GRPCServer(object):
 
         return self
 
+    def from_manifest(self, path=None, *service_names):
+        """Load services from route manifest created by "grpc-admin routes".
+            Modules are not scanned: only modules of used services are imported on the first use.
+
+            :param path: manifest file path (default: "PROTO_PY_FOLDER/ROUTE_MANIFEST");
+            :type path: str;
+            :param service_names: added service names;
+            :type service_names: tuple with str;
+
+            :return: server instance.
+
+        """
+
+        manifest = RouteManifest.load(path or os.path.join(self.PROTO_PY_FOLDER, ROUTE_MANIFEST))
+        for s_name, params in manifest.filter(*service_names):
+            if s_name in self.route:
+                raise grpc.RpcError("The same service name '{}' is already exists.".format(s_name))
+            self._route.setdefault(s_name, {}).update(
+                add_function=LazyObject(params["grpc_module"], params["add_function"]),
+                service=LazyObject(params["route_module"], params["route_class"])
+            )
+
+        return self
+
     def filter(self, *service_names, include=True):
         """Change active server services.
 
@@ -282,6 +370,7 @@ class GRPCServer(object):
 
         for s_name in [operator.and_, operator.sub][include](set(self._route), set(service_names)):
             self._route.pop(s_name)
+            self._route_table.remove_service(s_name)
 
         return self
 
@@ -303,10 +392,11 @@ class GRPCServer(object):
         s_name = proto_name or service.__name__
 
         # check service name
-        if need_check and s_name in self._route and self.route[s_name]["service"]:
+        if need_check and self._route.get(s_name, {}).get("service"):
             raise grpc.RpcError("The same service name {} is already exists.".format(s_name))
 
-        self._route[s_name]["service"] = service
+        self._route.setdefault(s_name, {})["service"] = service
+        self._update_route(s_name)
 
     def add_services(self, *services, **services_param):
         """Add user define Service to the server.
@@ -328,13 +418,318 @@ class GRPCServer(object):
         for s_name, s_obj in six.iteritems(services_param):
             self.add_service(service=s_obj, proto_name=s_name)
 
-    def config_server(self, address=None, max_workers=None, max_message_length=None):
+    def config_route(self, service_name, **config):
+        """Change route configuration of the service (applied at once when server is configured).
+
+            Route configuration keys:
+                - aliases: dict like {proto_method_name: servicer_method_name};
+                - overrides: dict like {proto_method_name: callable object};
+                - raw_methods: proto method names (True for all methods) which receive and return bytes;
+                - codecs: dict like {proto_method_name: Codec} (server codec registry is used by default);
+                - compression: dict like {proto_method_name: CompressionPolicy} (set_compression is used by default);
+                - executor: service thread pool: BoundedExecutor or dict like {"max_workers": 4, "max_queue": 100};
+                - executors: method thread pools: dict like {proto_method_name: BoundedExecutor or dict};
+                - process_methods: unary proto method names (True for all methods) which run in the process pool
+                  of PROCESS_WORKERS processes (like methods decorated with easygrpc.offload.cpu_bound);
+                - priority: service default priority level of the server scheduler (0 is the highest);
+                - priorities: dict like {proto_method_name: priority level}.
+
+            :param service_name: service name;
+            :type service_name: str;
+            :param config: route configuration;
+            :type config: dict;
+
+            :return: server instance.
+
+        """
+
+        self._route.setdefault(service_name, {}).update(config)
+        self._update_route(service_name)
+
+        return self
+
+    def add_alias(self, service_name, method_name, handler_name):
+        """Implement proto method by the service method with other name (like "SendMessage" --> "ops").
+
+            :param service_name: service name;
+            :type service_name: str;
+            :param method_name: proto method name;
+            :type method_name: str;
+            :param handler_name: user define service method name;
+            :type handler_name: str;
+
+            :return: server instance.
+
+        """
+
+        aliases = dict(self._route.get(service_name, {}).get("aliases") or {}, **{method_name: handler_name})
+
+        return self.config_route(service_name, aliases=aliases)
+
+    def override(self, service_name, method_name, behavior):
+        """Override one proto method implementation (can be used when server is running).
+
+            :param service_name: service name;
+            :type service_name: str;
+            :param method_name: proto method name;
+            :type method_name: str;
+            :param behavior: method implementation with signature like service method: (request, context);
+            :type behavior: callable object;
+
+            :return: server instance.
+
+        """
+
+        overrides = dict(self._route.get(service_name, {}).get("overrides") or {}, **{method_name: behavior})
+        self._route.setdefault(service_name, {})["overrides"] = overrides
+        if self._server and self._route_table.get_route(service_name, method_name):
+            self._route_table.set_method(service_name, method_name, behavior)
+
+        return self
+
+    def register_codec(self, codec, service_name=None, method_name=None):
+        """Register message codec for all services, the service or the service method.
+
+            :param codec: message codec;
+            :type codec: easygrpc.codec.Codec;
+            :param service_name: service name (default codec when service_name is None);
+            :type service_name: str;
+            :param method_name: proto method name (codec for all service methods when method_name is None);
+            :type method_name: str;
+
+            :return: server instance.
+
+        """
+
+        self.codecs.register(codec, service_name, method_name)
+        for name in self.route if service_name is None else (service_name,):
+            self._update_route(name)
+
+        return self
+
+    def add_broadcast(self, service_name, method_name):
+        """Mark server streaming method as broadcast subscription: method sends messages serialized by the hub
+            (server.hub.subscribe) as is.
+
+            :param service_name: service name;
+            :type service_name: str;
+            :param method_name: proto method name;
+            :type method_name: str;
+
+            :return: server instance.
+
+        """
+
+        return self.register_codec(PRESERIALIZED, service_name, method_name)
+
+    def set_compression(self, policy, service_name=None, method_name=None):
+        """Set response compression policy for all services, the service or the service method.
+
+            :param policy: compression policy (None: no compression);
+            :type policy: easygrpc.compression.CompressionPolicy;
+            :param service_name: service name (default policy when service_name is None);
+            :type service_name: str;
+            :param method_name: proto method name (policy for all service methods when method_name is None);
+            :type method_name: str;
+
+            :return: server instance.
+
+        """
+
+        self.compression.register(policy, service_name, method_name)
+        for name in self.route if service_name is None else (service_name,):
+            self._update_route(name)
+
+        return self
+
+    def set_scheduler(self, scheduler):
+        """Set priority executor instead of FIFO server thread pool (set it before config_server).
+            Priority of the call comes from "x-easygrpc-priority" metadata or route configuration.
+
+            :param scheduler: priority executor like PriorityExecutor(max_workers=10, weights=(8, 4, 1));
+            :type scheduler: easygrpc.executors.PriorityExecutor;
+
+            :return: server instance.
+
+        """
+
+        if self._server:
+            raise grpc.RpcError("Scheduler must be set before the server is configured.")
+
+        self.scheduler = self._route_table.scheduler = scheduler
+
+        return self
+
+    def set_executor(self, executor):
+        """Set server thread pool instead of the fixed size pool of max_workers (set it before config_server).
+
+            :param executor: thread pool like ElasticExecutor(min_workers=4, max_workers=64);
+            :type executor: concurrent.futures.Executor;
+
+            :return: server instance.
+
+        """
+
+        if self._server:
+            raise grpc.RpcError("Executor must be set before the server is configured.")
+
+        self.executor = executor
+
+        return self
+
+    def set_tenant_quota(self, quota):
+        """Set per-tenant quota of all route calls (routes are rebuilt).
+
+            :param quota: tenant quota like TenantQuota("x-tenant", rate=100, max_concurrency=4) or None;
+            :type quota: easygrpc.limits.TenantQuota;
+
+            :return: server instance.
+
+        """
+
+        self._route_table.tenant_quota = quota
+        for name in self.route:
+            self._update_route(name)
+
+        return self
+
+    def tenant_stats(self):
+        """Per-tenant usage and throttling.
+
+            :return: dict like {tenant: {active, calls, rejected, deprioritized, tokens}}.
+
+        """
+
+        quota = self._route_table.tenant_quota
+
+        return quota.stats() if quota is not None else {}
+
+    def deadline_stats(self):
+        """Statistics of calls dropped because their deadline expired in the queue (DROP_EXPIRED mode).
+
+            :return: dict with total counts and methods like {"dropped": int, "late": int, "methods": {...}}.
+
+        """
+
+        methods = self._route_table.deadline_stats()
+
+        return dict(dropped=sum(stats["dropped"] for stats in six.itervalues(methods)),
+                    late=sum(stats["late"] for stats in six.itervalues(methods)),
+                    methods=methods)
+
+    def executor_stats(self):
+        """Statistics of service and method thread pools (calls without own pool use the server pool).
+            Server pool set by set_executor is reported as "server".
+
+            :return: dict like {pool_name: {max_workers, max_queue, active, queued, utilization, ...}}.
+
+        """
+
+        stats = self._route_table.executor_stats()
+        if hasattr(self.executor, "stats"):
+            stats.setdefault("server", self.executor.stats())
+
+        return stats
+
+    def set_tracer(self, tracer):
+        """Set tracer of the server calls: spans of sampled calls with queue, decode, handler and encode timings.
+            Flush thread of the tracer is started, GRPCClient with the same tracer continues server traces.
+
+            :param tracer: tracer like Tracer("orders", sample_rate=0.01, path="spans.jsonl") or None;
+            :type tracer: easygrpc.tracing.Tracer;
+
+            :return: server instance.
+
+        """
+
+        if self._route_table.tracer is not None:
+            self._route_table.tracer.stop()
+        self._route_table.tracer = tracer and tracer.start()
+
+        return self
+
+    def enable_multiplex(self, max_workers=None, max_concurrency=MAX_CONCURRENCY, max_streams=MAX_STREAMS):
+        """Enable multiplexed mode: unary calls sent over one bidi stream by GRPCClient(multiplex=True)
+            are run by the route handlers and responses are returned out of order.
+
+            :param max_workers: workers of the multiplexed calls (default: server max_workers);
+            :type max_workers: int;
+            :param max_concurrency: maximum calls in progress of one stream;
+            :type max_concurrency: int;
+            :param max_streams: maximum open streams (open stream takes a worker of the streams pool);
+            :type max_streams: int;
+
+            :return: server instance.
+
+        """
+
+        if self.multiplexer is not None:
+            return self
+
+        self.multiplexer = Multiplexer((self._route_table,), max_workers or self.max_workers, max_concurrency,
+                                       max_streams)
+
+        return self.add_generic_handler(self.multiplexer)
+
+    def enable_admin(self, token=None):
+        """Enable admin service "easygrpc.Admin" next to the routes: route table, in-flight calls, statistics
+            and live tuning of workers, queue limits, tenant quota, sampling rate and log level
+            (see easygrpc.admin.AdminService). In-flight calls of the route table are tracked from now on.
+
+            :param token: token of admin calls (metadata "x-easygrpc-admin-token"), None: no check;
+            :type token: str;
+
+            :return: server instance.
+
+        """
+
+        if self.admin is not None:
+            return self
+
+        self._route_table.calls = CallRegistry()
+        self.admin = AdminService(self, token)
+
+        return self.add_generic_handler(self.admin)
+
+    def add_generic_handler(self, generic_handler):
+        """Add generic handler (like GRPCProxy): it is used for methods not found in the route table.
+
+            :param generic_handler: generic rpc handler;
+            :type generic_handler: grpc.GenericRpcHandler;
+
+            :return: server instance.
+
+        """
+
+        self._generic_handlers.append(generic_handler)
+        if self._server:
+            self._server.add_generic_rpc_handlers((generic_handler,))
+
+        return self
+
+    def _update_route(self, service_name):
+        """Rebuild service handlers of the configured server.
+
+            :param service_name: service name;
+            :type service_name: str.
+
+        """
+
+        route = self.route.get(service_name)
+        if self._server and route:
+            self._route_table.set_service(service_name, route["add_function"], route["service"](), route)
+
+    def config_server(self, address=None, max_workers=None, max_message_length=None, reload=False):
         """Create server instance.
 
             :param address: server listen address;
             :type address: str;
             :param max_workers: workers count;
             :type max_workers: int;
+            :param max_message_length: maximum send and receive message length;
+            :type max_message_length: int;
+            :param reload: reload mode flag: watch service modules to reload changed services (see reload_routes);
+            :type reload: bool;
 
             :return: configured server instance.
 
@@ -343,22 +738,94 @@ class GRPCServer(object):
         # address and max workers
         self.address = address or self.address or self.DEFAULT_ADDRESS
         self.max_workers = max_workers or self.max_workers or self.DEFAULT_MAX_WORKERS
+        self.max_message_length = max_message_length or self.max_message_length
         if not all((self.address, self.max_workers)):
             msg = "To start server expected address and max_workers, but get address: '{}' and max_workers: '{}'"
             raise grpc.RpcError(msg.format(self.address, self.max_workers))
 
         # create server instance
         if not self._server:
-            self._server = grpc.server(futures.ThreadPoolExecutor(max_workers=self.max_workers))
-            self._server.add_insecure_port(address=self.address)
+            if self.ADMIN:
+                self.enable_admin(self.ADMIN_TOKEN)
+            self.thread_pool = self.scheduler or self.executor or BoundedExecutor(
+                self.max_workers, name="easygrpc-server")
+            if is_inproc(self.address):
+                self._server = InprocServer(self.thread_pool)
+            else:
+                self._server = grpc.server(self.thread_pool, options=[
+                    ("grpc.max_send_message_length", self.max_message_length),
+                    ("grpc.max_receive_message_length", self.max_message_length),
+                ])
+            for path in self.socket_paths:
+                prepare_socket(path)
+            self.port = self._server.add_insecure_port(address=self.address)
+            if self.uds_path:
+                self._server.add_insecure_port(address=UDS_PREFIX + os.path.abspath(self.uds_path))
+            for path in self.socket_paths:
+                os.chmod(path, self.UDS_MODE)
+            self._server.add_generic_rpc_handlers((self._route_table,) + tuple(self._generic_handlers))
 
         # add route
-        for name, route in six.iteritems(self.route):
-            route["add_function"](route["service"](), self._server)
+        for name in self.route:
+            self._update_route(name)
+
+        # watch modules of the routes
+        if reload:
+            self._modules.update({module.__name__: module for module in map(inspect.getmodule, (
+                LazyObject.unwrap(route[key]) for route in six.itervalues(self.route)
+                for key in ("service", "add_function")))})
+            self._watcher = FileWatcher(*{os.path.dirname(module.__file__) for module in six.itervalues(self._modules)
+                                          if getattr(module, "__file__", None)}, extensions=(".py",))
 
         return self
 
-    def start(self, address=None, max_workers=None, sleep_time=None, max_message_length=None):
+    def reload_routes(self):
+        """Reload changed proto_py and service modules and swap their services in the running server.
+            Listening socket and in-flight calls are not affected. Works only in reload mode.
+
+            :return: list of str, reloaded service names.
+
+        """
+
+        if not self._watcher:
+            return []
+
+        # reload changed modules: proto modules first
+        changed = {os.path.realpath(path) for path in self._watcher.changes()}
+        modules = [module for module in six.itervalues(self._modules)
+                   if getattr(module, "__file__", None) and os.path.realpath(module.__file__) in changed]
+        reloaded = set()
+        for module in sorted(modules, key=lambda mod: not mod.__name__.endswith("pb2")):
+            try:
+                module = reload(module)
+            except Exception as error:
+                logger.warning("Module %s has not reloaded: %s", module.__name__, error)
+                continue
+            self._modules[module.__name__] = module
+            reloaded.add(module.__name__)
+
+            # update known routes only
+            for s_name, s_obj in self.parse_proto_file(module, self.HANDLER_SEARCH_PATTERN):
+                if s_name in self._route:
+                    self._route[s_name]["add_function"] = s_obj
+            for s_name, s_obj in self.parser_service_file(module):
+                if s_name in self._route:
+                    self._route[s_name]["service"] = s_obj
+
+        # swap services (worker processes are restarted to import new modules)
+        names = [name for name, route in six.iteritems(self.route)
+                 if {LazyObject.unwrap(route[key]).__module__ for key in ("service", "add_function")} & reloaded]
+        if names:
+            self.offload.shutdown(wait=False)
+        for name in names:
+            try:
+                self._update_route(name)
+            except Exception as error:
+                logger.warning("Service %s has not reloaded: %s", name, error)
+
+        return names
+
+    def start(self, address=None, max_workers=None, sleep_time=None, max_message_length=None, reload=False):
         """Start server instance.
 
             :param sleep_time: sleep server time;
@@ -373,13 +840,27 @@ class GRPCServer(object):
             :param max_message_length: maximum message response length;
             :type max_message_length: int;
 
+            :param reload: reload mode flag: watch service modules and reload changed services;
+            :type reload: bool;
+
         """
 
-        self.config_server(address=address, max_workers=max_workers, max_message_length=max_message_length)
+        self.config_server(address=address, max_workers=max_workers, max_message_length=max_message_length,
+                           reload=reload)
         self._server.start()
 
         try:
             while True:
-                time.sleep(sleep_time or self.SERVER_TIMEOUT_SLEEP)  # one day in seconds
+                if reload:
+                    time.sleep(sleep_time or self.RELOAD_INTERVAL)
+                    self.reload_routes()
+                else:
+                    time.sleep(sleep_time or self.SERVER_TIMEOUT_SLEEP)  # one day in seconds
         except KeyboardInterrupt:
             self._server.stop(0)
+            self.offload.shutdown(wait=False)
+            self.hub.close()
+            for path in self.socket_paths:
+                remove_socket(path)
+            if self._route_table.tracer is not None:
+                self._route_table.tracer.stop()
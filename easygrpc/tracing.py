@@ -0,0 +1,427 @@
+import os
+import json
+import time
+import random
+import threading
+import contextvars
+import collections
+
+import grpc
+
+TRACE_METADATA = "traceparent"
+SERVER, CLIENT = 2, 3  # OTLP span kinds
+
+_current_span = contextvars.ContextVar("easygrpc_span", default=None)
+
+
+def current_span():
+    """Get span of the server call handled in the current thread (task).
+
+        :return: Span or None (call is not sampled).
+
+    """
+
+    return _current_span.get()
+
+
+def get_traceparent(metadata):
+    """Get W3C trace context from the call metadata.
+
+        :param metadata: invocation metadata;
+        :type metadata: tuple with (key, value);
+
+        :return: tuple (trace_id, parent span_id, sampled) or None.
+
+    """
+
+    for key, value in metadata or ():
+        if key == TRACE_METADATA:
+            parts = value.split("-")
+            if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+                return parts[1], parts[2], parts[3] == "01"
+            return None
+
+    return None
+
+
+class Span(object):
+    """RPC span: wall clock start and end, stage durations (seconds), status and attributes."""
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "kind", "start", "end", "stages", "status",
+                 "details", "_started")
+
+    def __init__(self, name, kind, trace_id=None, parent_id=None):
+        self.trace_id = trace_id or "%032x" % random.getrandbits(128)
+        self.span_id = "%016x" % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start = time.time()
+        self.end = None
+        self.stages = {}
+        self.status = None
+        self.details = None
+        self._started = time.perf_counter()
+
+    @property
+    def traceparent(self):
+        return "00-{}-{}-01".format(self.trace_id, self.span_id)
+
+    def enter(self, started):
+        """Call leaves the queue: the first stage of the call starts.
+
+            :param started: stage start time (time.perf_counter);
+            :type started: float.
+
+        """
+
+        if "queue" not in self.stages:
+            self.stages["queue"] = started - self._started
+
+    def add(self, stage, started):
+        """Add stage duration (stages of streaming calls are summed).
+
+            :param stage: stage name;
+            :type stage: str;
+            :param started: stage start time (time.perf_counter);
+            :type started: float.
+
+        """
+
+        self.stages[stage] = self.stages.get(stage, 0.0) + time.perf_counter() - started
+
+    def finish(self, status=None, details=None):
+        if self.end is None:
+            self.end = self.start + time.perf_counter() - self._started
+            self.status = status or self.status or "OK"
+            self.details = details or self.details
+
+    def to_otlp(self):
+        """Span in OTLP JSON format (stage durations are "easygrpc.stage.<name>_ms" attributes).
+
+            :return: dict.
+
+        """
+
+        attributes = [{"key": "rpc.system", "value": {"stringValue": "grpc"}},
+                      {"key": "rpc.method", "value": {"stringValue": self.name}},
+                      {"key": "rpc.grpc.status_code", "value": {"stringValue": self.status}}]
+        attributes.extend({"key": "easygrpc.stage.{}_ms".format(stage), "value": {"doubleValue": value * 1000}}
+                          for stage, value in sorted(self.stages.items()))
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(int(self.start * 1e9)),
+            "endTimeUnixNano": str(int(self.end * 1e9)),
+            "attributes": attributes,
+            "status": {"code": 1} if self.status == "OK" else {"code": 2, "message": self.details or self.status},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+
+        return span
+
+    def __repr__(self):
+        return "span: {} {} ({})".format(self.name, self.span_id, self.status)
+
+
+class Tracer(object):
+    """RPC tracer of the server and the client.
+
+        - Span per sampled RPC, trace context is propagated in "traceparent" metadata (W3C format);
+        - Sampling decision of the caller is kept, root calls are sampled with sample_rate;
+        - Server spans have stage durations: queue (executor queue wait), decode, handler, encode;
+        - Finished spans are kept in the ring buffer (oldest spans are dropped), background thread appends
+          them to the file as OTLP JSON lines (ExportTraceServiceRequest per flush);
+        - Calls which are not sampled only pay the metadata lookup.
+
+    """
+
+    def __init__(self, service_name="easygrpc", sample_rate=0.01, buffer_size=10000, path=None, flush_interval=5.0):
+        self.service_name = service_name
+        self.sample_rate = sample_rate
+        self.path = path
+        self.flush_interval = flush_interval
+        self._spans = collections.deque(maxlen=buffer_size)
+        self._thread = None
+        self._stopped = threading.Event()
+        self._file_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+        # statistics
+        self.finished = 0
+        self.dropped = 0
+        self.exported = 0
+
+    def sample(self, parent=None):
+        """Sampling decision of the call.
+
+            :param parent: trace context of the caller (see get_traceparent) or parent span;
+            :type parent: tuple or Span;
+
+            :return: bool.
+
+        """
+
+        if isinstance(parent, tuple):
+            return parent[2]
+        if parent is not None:
+            return True
+
+        return self.sample_rate >= 1 or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    def record(self, span):
+        """Put finished span into the ring buffer.
+
+            :param span: finished span;
+            :type span: Span.
+
+        """
+
+        with self._lock:
+            if len(self._spans) == self._spans.maxlen:
+                self.dropped += 1
+            self._spans.append(span)
+            self.finished += 1
+
+    def spans(self):
+        """Buffered spans (not flushed yet).
+
+            :return: list with Span.
+
+        """
+
+        return list(self._spans)
+
+    def trace_handler(self, handler, handler_call_details):
+        """Trace server call: method handler of the sampled call is wrapped with stage timers.
+
+            :param handler: method handler;
+            :type handler: grpc.RpcMethodHandler;
+            :param handler_call_details: grpc call details;
+            :type handler_call_details: grpc.HandlerCallDetails;
+
+            :return: grpc.RpcMethodHandler.
+
+        """
+
+        parent = get_traceparent(handler_call_details.invocation_metadata)
+        if not self.sample(parent):
+            return handler
+
+        span = Span(handler_call_details.method, SERVER, *(parent[:2] if parent else ()))
+        name = ("stream_" if handler.request_streaming else "unary_") + (
+            "stream" if handler.response_streaming else "unary")
+
+        return handler._replace(**{
+            name: self._trace_behavior(getattr(handler, name), span, handler.response_streaming),
+            "request_deserializer": self._timed(handler.request_deserializer, span, "decode"),
+            "response_serializer": self._timed(handler.response_serializer, span, "encode"),
+        })
+
+    @staticmethod
+    def _timed(function, span, stage):
+        if function is None:
+            return None
+
+        def timed_function(value):
+            started = time.perf_counter()
+            span.enter(started)
+            try:
+                return function(value)
+            finally:
+                span.add(stage, started)
+
+        return timed_function
+
+    def _trace_behavior(self, behavior, span, response_streaming):
+
+        def traced_behavior(request, context):
+            started = time.perf_counter()
+            span.enter(started)
+            if not context.add_callback(lambda: self._finish_call(span, context)):
+                self._finish_call(span, context)
+            token = _current_span.set(span)
+            try:
+                response = behavior(request, context)
+            except Exception as e:
+                span.details = repr(e)
+                raise
+            finally:
+                span.add("handler", started)
+                _current_span.reset(token)
+
+            return self._trace_stream(response, span) if response_streaming else response
+
+        # method thread pool (bulkhead or priority executor)
+        if hasattr(behavior, "experimental_thread_pool"):
+            traced_behavior.experimental_thread_pool = behavior.experimental_thread_pool
+
+        return traced_behavior
+
+    @staticmethod
+    def _trace_stream(responses, span):
+        # span is current only while the next response is produced (worker thread runs other calls later)
+        iterator = iter(responses)
+        while True:
+            started = time.perf_counter()
+            token = _current_span.set(span)
+            try:
+                response = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                _current_span.reset(token)
+                span.add("handler", started)
+            yield response
+
+    def _finish_call(self, span, context):
+        code = context.code() if hasattr(context, "code") else None
+        if code is None and span.details is not None:
+            code = grpc.StatusCode.UNKNOWN
+        details = context.details() if hasattr(context, "details") else None
+        if isinstance(details, bytes):
+            details = details.decode("utf-8", "replace")
+        span.finish(code and code.name, details)
+        self.record(span)
+
+    def wrap_callable(self, multi_callable, name):
+        """Trace client calls of the stub method.
+
+            :param multi_callable: stub method;
+            :type multi_callable: grpc multi-callable or its wrapper;
+            :param name: method name;
+            :type name: str;
+
+            :return: TracedCallable.
+
+        """
+
+        return TracedCallable(multi_callable, self, name)
+
+    def flush(self):
+        """Append buffered spans to the file (OTLP JSON line). Without path spans stay in the buffer.
+
+            :return: int, number of exported spans.
+
+        """
+
+        if not self.path:
+            return 0
+
+        with self._lock:
+            spans = list(self._spans)
+            self._spans.clear()
+        if not spans:
+            return 0
+
+        request = {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{"scope": {"name": "easygrpc"}, "spans": [span.to_otlp() for span in spans]}],
+        }]}
+        with self._file_lock:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(request, separators=(",", ":")) + os.linesep)
+            self.exported += len(spans)
+
+        return len(spans)
+
+    def start(self):
+        """Start background flush thread (spans are exported every flush_interval seconds).
+
+            :return: tracer instance.
+
+        """
+
+        if self.path and self._thread is None:
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._flush_loop, name="easygrpc-tracing", daemon=True)
+            self._thread.start()
+
+        return self
+
+    def _flush_loop(self):
+        while not self._stopped.wait(self.flush_interval):
+            self.flush()
+
+    def stop(self):
+        """Stop flush thread and export the rest of the spans."""
+
+        if self._thread is not None:
+            self._stopped.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def stats(self):
+        """Tracer statistics.
+
+            :return: dict with sample rate, buffered, finished, dropped (buffer overflow) and exported spans.
+
+        """
+
+        return dict(sample_rate=self.sample_rate, buffered=len(self._spans), finished=self.finished,
+                    dropped=self.dropped, exported=self.exported)
+
+    def __repr__(self):
+        return "tracer: {} (sample rate {})".format(self.service_name, self.sample_rate)
+
+
+class TracedCallable(object):
+    """Client multi-callable wrapper: span of the sampled call, trace context is sent in the metadata."""
+
+    def __init__(self, multi_callable, tracer, name):
+        self.multi_callable = multi_callable
+        self.tracer = tracer
+        self.name = name
+
+    def _start(self, kwargs):
+        parent = current_span()
+        if not self.tracer.sample(parent):
+            return None
+
+        span = Span(self.name, CLIENT, *((parent.trace_id, parent.span_id) if parent is not None else ()))
+        kwargs["metadata"] = tuple(kwargs.get("metadata") or ()) + ((TRACE_METADATA, span.traceparent),)
+
+        return span
+
+    def _finish(self, span, code, details=None):
+        span.finish(code.name, details)
+        self.tracer.record(span)
+
+    def _call(self, method, *args, **kwargs):
+        span = self._start(kwargs)
+        if span is None:
+            return method(*args, **kwargs)
+
+        started = time.perf_counter()
+        try:
+            result = method(*args, **kwargs)
+        except grpc.RpcError as error:
+            span.add("call", started)
+            self._finish(span, error.code(), error.details())
+            raise
+
+        # response stream or future: span is finished with the call
+        if isinstance(result, grpc.Future):
+            result.add_done_callback(lambda call: (span.add("call", started),
+                                                   self._finish(span, call.code(), call.details())))
+        else:
+            span.add("call", started)
+            self._finish(span, grpc.StatusCode.OK)
+
+        return result
+
+    def __call__(self, *args, **kwargs):
+        return self._call(self.multi_callable, *args, **kwargs)
+
+    def with_call(self, *args, **kwargs):
+        return self._call(self.multi_callable.with_call, *args, **kwargs)
+
+    def future(self, *args, **kwargs):
+        return self._call(self.multi_callable.future, *args, **kwargs)
+
+    def __getattr__(self, item):
+        return getattr(self.multi_callable, item)
@@ -0,0 +1,118 @@
+import os
+import stat
+import errno
+import socket
+
+import grpc
+
+UDS_PREFIX = "unix:"
+LOCAL_HOSTS = frozenset(("localhost", "127.0.0.1", "::1", "0.0.0.0", "::", ""))
+
+
+def get_uds_path(address):
+    """Get socket path of the unix domain socket address like "unix:/run/app.sock" or "unix:///run/app.sock".
+
+        :param address: server address;
+        :type address: str;
+
+        :return: str or None (not unix domain socket address).
+
+    """
+
+    if not address or not address.startswith(UDS_PREFIX):
+        return None
+
+    return address[len(UDS_PREFIX) + 2:] if address.startswith(UDS_PREFIX + "//") else address[len(UDS_PREFIX):]
+
+
+def is_socket(path):
+    """Check path is unix domain socket.
+
+        :param path: socket path;
+        :type path: str;
+
+        :return: bool.
+
+    """
+
+    try:
+        return stat.S_ISSOCK(os.stat(path).st_mode)
+    except OSError:
+        return False
+
+
+def is_local(address):
+    """Check address like "host:port" is the local host.
+
+        :param address: server address;
+        :type address: str;
+
+        :return: bool.
+
+    """
+
+    host = address.rsplit(":", 1)[0] if ":" in address and not address.endswith("]") else address
+    host = host.strip("[]")
+
+    return host in LOCAL_HOSTS or host == socket.gethostname()
+
+
+def prefer_uds(address, uds_path):
+    """Client target: unix domain socket of the local server when the socket exists, otherwise the address.
+
+        :param address: server address like "localhost:50051";
+        :type address: str;
+        :param uds_path: socket path of the server (None: address is used);
+        :type uds_path: str;
+
+        :return: str.
+
+    """
+
+    if uds_path and is_local(address) and is_socket(uds_path):
+        return UDS_PREFIX + os.path.abspath(uds_path)
+
+    return address
+
+
+def prepare_socket(path):
+    """Prepare socket path before server listens on it: create directory and remove stale socket.
+        Path of other file type or socket of the running server is not removed.
+
+        :param path: socket path;
+        :type path: str.
+
+    """
+
+    directory = os.path.dirname(os.path.abspath(path))
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    if not os.path.lexists(path):
+        return
+    if not is_socket(path):
+        raise grpc.RpcError("Can't listen on '{}': path exists and isn't a socket.".format(path))
+
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except socket.error as e:
+        if e.errno not in (errno.ECONNREFUSED, errno.ENOENT):
+            raise
+        os.remove(path)
+    else:
+        raise grpc.RpcError("Can't listen on '{}': socket is used by other server.".format(path))
+    finally:
+        probe.close()
+
+
+def remove_socket(path):
+    """Remove socket file of the stopped server.
+
+        :param path: socket path;
+        :type path: str.
+
+    """
+
+    if is_socket(path):
+        os.remove(path)
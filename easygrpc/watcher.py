@@ -0,0 +1,68 @@
+import os
+import time
+
+
+class FileWatcher(object):
+    """File watcher class (cheap mtime poller).
+
+        - Watch files with fixed extensions in directories;
+        - Find changed, added and removed files;
+        - Call callback function with every batch of changes.
+
+    """
+
+    DEFAULT_INTERVAL = 0.5
+
+    def __init__(self, *directories, extensions=(), interval=None):
+        self.directories = directories
+        self.extensions = tuple(extensions)
+        self.interval = interval or self.DEFAULT_INTERVAL
+        self._snapshot = self.snapshot()
+
+    def snapshot(self):
+        """Get modification state of watched files.
+
+            :return: dict like {file_path: (mtime in ns, file size)}.
+
+        """
+
+        files = {}
+        for directory in filter(os.path.isdir, self.directories):
+            for name in os.listdir(directory):
+                path = os.path.join(directory, name)
+                if self.extensions and not name.endswith(self.extensions):
+                    continue
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files[path] = (stat.st_mtime_ns, stat.st_size)
+
+        return files
+
+    def changes(self):
+        """Find files changed since the last check.
+
+            :return: set of str, changed, added and removed file paths.
+
+        """
+
+        snapshot = self.snapshot()
+        changed = {path for path in set(snapshot) | set(self._snapshot) if snapshot.get(path) != self._snapshot.get(path)}
+        self._snapshot = snapshot
+
+        return changed
+
+    def watch(self, callback):
+        """Watch files forever and call callback function when files are changed.
+
+            :param callback: callback function with signature: callback(changed_file_paths);
+            :type callback: callable object.
+
+        """
+
+        while True:
+            time.sleep(self.interval)
+            changed = self.changes()
+            if changed:
+                callback(changed)
@@ -27,7 +27,13 @@ def create(name):
                    "If the option is missed all services will be compiled.")
 @click.option('--exclude', '-e', multiple=True, type=click.STRING,
               help="Name of service won't be compiled. It's multiple option.")
-def compile(include, exclude):
+@click.option('--force', '-f', is_flag=True, default=False,
+              help="Compile all proto files even if they haven't changed since the last compilation.")
+@click.option('--jobs', '-j', default=1, type=click.IntRange(min=1),
+              help="Number of parallel protoc processes.")
+@click.option('--watch', '-w', is_flag=True, default=False,
+              help="Watch proto_buf directory and recompile changed proto files.")
+def compile(include, exclude, force, jobs, watch):
     """Compile proto files to python.
     The command compiles *.py files by proto files from directory: /proto_buf/<service_name>.proto
     You can explicitly include necessary files for compilation,
@@ -46,10 +52,35 @@ def compile(include, exclude):
     \b
     Example3:
         $grpc-admin compile -i service1 -i service2
-        This command will compile only two services: service1 and service2"""
+        This command will compile only two services: service1 and service2
+
+    \b
+    Example4:
+        $grpc-admin compile -f
+        This command will compile all proto files even if they haven't changed since the last compilation
+
+    \b
+    Example5:
+        $grpc-admin compile -j 8
+        This command will compile changed proto files in 8 parallel processes
+
+    \b
+    Example6:
+        $grpc-admin compile -w
+        This command will compile changed proto files and then recompile them on every change"""
 
     builder = ServiceBuilder.create_builder()
-    builder.compile_proto_files(include, exclude)
+    if watch:
+        try:
+            builder.watch_proto_files(include, exclude, force, jobs)
+        except KeyboardInterrupt:
+            pass
+    else:
+        # per-file errors are already printed: exit with status 1 without traceback
+        try:
+            builder.compile_proto_files(include, exclude, force, jobs)
+        except RuntimeError as error:
+            raise click.ClickException(str(error))
 
 
 # TODO: Change server environment
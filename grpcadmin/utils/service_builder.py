@@ -1,9 +1,17 @@
 import os
+import re
 import sys
+import json
+import hashlib
 import inspect
+import tempfile
 import importlib
+import py_compile
+from concurrent import futures
 
 from easygrpc.parser import GRPCParser
+from easygrpc.watcher import FileWatcher
+from easygrpc.manifest import ROUTE_MANIFEST, RouteManifest
 from grpc.tools import protoc
 from grpcadmin.utils.service_info import ServiceInfo
 from grpcadmin.utils.service_template import ServiceTemplate
@@ -14,10 +22,36 @@ PROTO_PY_DIR = 'proto_py'
 ROUTES_DIR = 'routes'
 INIT_FILE = '__init__.py'
 PROTO_FORMAT = '.proto'
+COMPILE_MANIFEST = '.compile_manifest.json'
+PROTO_IMPORT_PATTERN = re.compile(r'^\s*import\s+(?:public\s+|weak\s+)?"(?P<path>[^"]+)"\s*;', re.MULTILINE)
 PROTO_TEMPLATE = 'syntax="proto3";\n\npackage {};\n'
 SERVICE_HEADER = """"""
 
 
+def _compile_proto_file(protoc_args):
+    """Run protoc for one proto file and capture its error output (used as process pool task).
+
+        :param protoc_args: protoc command line arguments;
+        :type protoc_args: tuple of str;
+
+        :return: tuple (protoc exit code, protoc error output).
+
+    """
+
+    sys.stderr.flush()
+    stderr_fd = os.dup(2)
+    with tempfile.TemporaryFile() as f:
+        os.dup2(f.fileno(), 2)
+        try:
+            code = protoc.main(protoc_args)
+        finally:
+            sys.stderr.flush()
+            os.dup2(stderr_fd, 2)
+            os.close(stderr_fd)
+        f.seek(0)
+        return code, f.read().decode(ENCODING, 'replace').strip()
+
+
 class ServiceBuilder(object):
     """Service builder class.
 
@@ -78,37 +112,100 @@ class ServiceBuilder(object):
         os.makedirs(os.path.join(name_path, ROUTES_DIR))
         open(os.path.join(name_path, ROUTES_DIR, INIT_FILE), 'w').close()
 
-    def compile_proto_files(self, include, exclude):
+    def compile_proto_files(self, include, exclude, force=False, jobs=1):
         """Compile proto files to python.
             If "include" and "exclude" arguments are empty all services will be compiled.
+            Only proto files changed since the last compilation (or with changed imports) are compiled,
+            the content hashes are stored in the COMPILE_MANIFEST file of the proto_py directory.
+
+            :param include: proto files will be included;
+            :type include: tuple;
+            :param exclude: proto files will be excluded;
+            :type exclude: tuple;
+            :param force: compile all necessary proto files and ignore the manifest;
+            :type force: bool;
+            :param jobs: number of parallel protoc processes;
+            :type jobs: int;
+
+            :return: list of str, list of compiled proto files.
+
+        """
+
+        proto_files = self._get_necessary_proto_files(include, exclude, self._get_all_proto_files())
+
+        # find changed proto files
+        manifest = {} if force else self._load_compile_manifest()
+        hashes = self._get_proto_hashes(proto_files)
+        changed = [name for name in proto_files if manifest.get(name) != hashes[name] or not self._is_compiled(name)]
+        if not changed:
+            return changed
+
+        # compile and save hashes of successful compiled files
+        errors = self._run_code_generator(changed, jobs)
+        compiled = [name for name in changed if name not in errors]
+        self._byte_compile(compiled)
+        manifest = self._load_compile_manifest()
+        manifest.update({name: hashes[name] for name in compiled})
+        self._save_compile_manifest(manifest)
+
+        # report all errors at the end
+        if errors:
+            for name in sorted(errors):
+                print('ERROR. Proto file {}.proto has not compiled:\n{}'.format(name, errors[name]))
+            raise RuntimeError('Proto files have not compiled: {}'.format(', '.join(sorted(errors))))
+
+        return compiled
+
+    def watch_proto_files(self, include, exclude, force=False, jobs=1, interval=None):
+        """Compile changed proto files and then watch proto_buf directory and recompile proto files on change.
 
             :param include: proto files will be included;
             :type include: tuple;
             :param exclude: proto files will be excluded;
-            :type exclude: tuple.
+            :type exclude: tuple;
+            :param force: compile all necessary proto files at start and ignore the manifest;
+            :type force: bool;
+            :param jobs: number of parallel protoc processes;
+            :type jobs: int;
+            :param interval: poll interval in seconds;
+            :type interval: float.
 
         """
 
-        self._run_code_generator(self._get_necessary_proto_files(include, exclude, self._get_all_proto_files()))
+        def compile_changed(changed=None):
+            try:
+                compiled = self.compile_proto_files(include, exclude, force=force and changed is None, jobs=jobs)
+            except (RuntimeError, FileNotFoundError, NameError) as error:
+                print('ERROR. {}'.format(error))
+            else:
+                if compiled:
+                    print('Compiled: {}'.format(', '.join(compiled)))
+
+        compile_changed()
+        FileWatcher(self.proto_buf_dir, extensions=(PROTO_FORMAT,), interval=interval).watch(compile_changed)
 
     def create_or_update_routes(self):
-        """Create or update services in routes directory."""
+        """Create or update services in routes directory and save route manifest to proto_py directory."""
 
         # find pb_2 names
         pb2_names = [os.path.splitext(f)[0] for f in os.listdir(self.proto_py_dir) if
-                     os.path.isfile(os.path.join(self.proto_py_dir, f)) and not f.endswith('__.py')]
+                     os.path.isfile(os.path.join(self.proto_py_dir, f)) and f.endswith('.py') and not f.endswith('__.py')]
 
         # Parse current pb2 modules and Fill ListServiceInfo
         sys.path.insert(1, os.getcwd())
         list_service_info = []
+        pb2_modules = {}
         for pb2_name in pb2_names:
             pb2_module = importlib.import_module("{}.{}".format(self.proto_py_dir.replace('/', '.'), str(pb2_name)))
             pb2_info = GRPCParser.parse_module('service', pb2_module)
+            pb2_modules[pb2_name] = pb2_module
             list_service_info.extend(
                 [ServiceInfo(pb2_name, s_name, info['methods']) for s_name, info in pb2_info.items()])
 
         # create or update files
+        manifest = RouteManifest()
         for service_info in list_service_info:
+            self._add_manifest_service(manifest, pb2_modules[service_info.pb2_name], service_info)
             service_py_file = os.path.join(self.routes_dir, "{}.py".format(service_info.service_name_lower))
             if os.path.isfile(service_py_file):
                 service_module = importlib.import_module("{}.{}".format(self.routes_dir.replace('/', '.'),
@@ -124,6 +221,7 @@ class ServiceBuilder(object):
                     print('WARNING. Service {1} has not created. '
                           'Module {0} exists but class {1} is not presented. Remove file "routes/{0}.py" and try again'.
                           format(service_info.service_name_lower, service_info.service_name))
+                    manifest.services.pop(service_info.service_name, None)
                     continue
 
                 # class is presented - so append methods if necessary
@@ -141,6 +239,29 @@ class ServiceBuilder(object):
             with open(service_py_file, 'w') as f:
                 f.write(ServiceTemplate.generate(service_info))
 
+        manifest.dump(os.path.join(self.proto_py_dir, ROUTE_MANIFEST))
+
+    def _add_manifest_service(self, manifest, pb2_module, service_info):
+        """Add service to the route manifest.
+
+            :param manifest: route manifest;
+            :type manifest: instance of RouteManifest;
+            :param pb2_module: pb2 module of the service;
+            :type pb2_module: import module instance;
+            :param service_info: information about service;
+            :type service_info: instance of ServiceInfo.
+
+        """
+
+        # add function and stub are in pb2 module (old grpcio-tools) or in pb2_grpc module
+        grpc_module = pb2_module.__name__
+        if not hasattr(pb2_module, 'add_{}Servicer_to_server'.format(service_info.service_name)):
+            grpc_module = '{}_grpc'.format(grpc_module)
+
+        route_module = '{}.{}'.format(self.routes_dir.replace('/', '.'), service_info.service_name_lower)
+        manifest.add_service(service_info.service_name, pb2_module.__name__, grpc_module, route_module,
+                             service_info.service_name, service_info.methods)
+
     def _get_all_proto_files(self):
         """ Get all names of the services from proto_buf directory.
 
@@ -189,19 +310,146 @@ class ServiceBuilder(object):
 
         return services
 
-    def _run_code_generator(self, proto_files):
+    def _run_code_generator(self, proto_files, jobs=1):
         """Compile proto files to python.
+            Every proto file is compiled by its own protoc run with the same arguments,
+            so generated files don't depend on the number of jobs.
 
             :param proto_files: proto files;
+            :type proto_files: list of str;
+            :param jobs: number of parallel protoc processes;
+            :type jobs: int;
+
+            :return: dict like {proto_file: error message} for not compiled proto files.
+
+        """
+
+        protoc_args = [(
+            '',
+            '-I./{}'.format(self.proto_buf_dir),
+            '--python_out=./{}'.format(self.proto_py_dir),
+            '--grpc_python_out=./{}'.format(self.proto_py_dir),
+            './{}/{}.proto'.format(self.proto_buf_dir, name),
+        ) for name in proto_files]
+
+        # run protoc in the current process or in the process pool
+        if jobs > 1 and len(proto_files) > 1:
+            with futures.ProcessPoolExecutor(max_workers=min(jobs, len(proto_files))) as executor:
+                results = list(executor.map(_compile_proto_file, protoc_args))
+        else:
+            results = [_compile_proto_file(args) for args in protoc_args]
+
+        return {name: output or 'protoc exit code {}'.format(code)
+                for name, (code, output) in zip(proto_files, results) if code}
+
+    def _get_generated_files(self, name):
+        """Get python files generated from proto file.
+
+            :param name: proto file name;
+            :type name: str;
+
+            :return: list of str, list of paths to generated python files.
+
+        """
+
+        return [os.path.join(self.proto_py_dir, '{}{}.py'.format(name, postfix)) for postfix in ('_pb2', '_pb2_grpc')]
+
+    def _is_compiled(self, name):
+        """Check proto file has generated python module.
+
+            :param name: proto file name;
+            :type name: str;
+
+            :return: bool (True: python module exists, False: python module is missing).
+
+        """
+
+        return os.path.isfile(self._get_generated_files(name)[0])
+
+    def _byte_compile(self, proto_files):
+        """Byte-compile (.pyc) python modules generated from proto files.
+
+            :param proto_files: compiled proto files;
             :type proto_files: list of str.
 
         """
 
         for name in proto_files:
-            protoc.main((
-                '',
-                '-I./{}'.format(self.proto_buf_dir),
-                '--python_out=./{}'.format(self.proto_py_dir),
-                '--grpc_python_out=./{}'.format(self.proto_py_dir),
-                './{}/{}.proto'.format(self.proto_buf_dir, name),
-            ))
+            for py_file in filter(os.path.isfile, self._get_generated_files(name)):
+                py_compile.compile(py_file, doraise=True)
+
+    def _get_proto_imports(self, path):
+        """Get imports of proto file located in proto_buf directory.
+
+            :param path: proto file path relative to proto_buf directory;
+            :type path: str;
+
+            :return: list of str, list of imported proto paths relative to proto_buf directory.
+
+        """
+
+        with open(os.path.join(self.proto_buf_dir, path), 'rb') as f:
+            content = f.read().decode(ENCODING)
+
+        return [match.group('path') for match in PROTO_IMPORT_PATTERN.finditer(content)
+                if os.path.isfile(os.path.join(self.proto_buf_dir, match.group('path')))]
+
+    def _get_proto_hashes(self, proto_files):
+        """Get content hashes of proto files together with all their (transitive) imports.
+
+            :param proto_files: proto files;
+            :type proto_files: list of str;
+
+            :return: dict like {proto_file: hex digest}.
+
+        """
+
+        # find all local proto files used by proto_files
+        imports, stack = {}, ['{}{}'.format(name, PROTO_FORMAT) for name in proto_files]
+        while stack:
+            path = stack.pop()
+            if path not in imports:
+                imports[path] = self._get_proto_imports(path)
+                stack.extend(imports[path])
+
+        # hash file content with content of all imports
+        hashes = {}
+        for name in proto_files:
+            path = '{}{}'.format(name, PROTO_FORMAT)
+            digest, used, stack = hashlib.sha256(), set(), [path]
+            while stack:
+                path = stack.pop()
+                if path not in used:
+                    used.add(path)
+                    stack.extend(imports[path])
+            for path in sorted(used):
+                with open(os.path.join(self.proto_buf_dir, path), 'rb') as f:
+                    digest.update(path.encode(ENCODING))
+                    digest.update(hashlib.sha256(f.read()).digest())
+            hashes[name] = digest.hexdigest()
+
+        return hashes
+
+    def _load_compile_manifest(self):
+        """Load compile manifest from proto_py directory.
+
+            :return: dict like {proto_file: hex digest}.
+
+        """
+
+        try:
+            with open(os.path.join(self.proto_py_dir, COMPILE_MANIFEST), encoding=ENCODING) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def _save_compile_manifest(self, manifest):
+        """Save compile manifest to proto_py directory.
+
+            :param manifest: dict like {proto_file: hex digest};
+            :type manifest: dict.
+
+        """
+
+        with open(os.path.join(self.proto_py_dir, COMPILE_MANIFEST), 'w', encoding=ENCODING) as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)